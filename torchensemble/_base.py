@@ -5,10 +5,18 @@ import logging
 import warnings
 import numpy as np
 import torch.nn as nn
+import torch.nn.functional as F
 
 from . import _constants as const
-from .utils.io import split_data_target
+from .utils import set_module
+from .utils import operator as op
+from .utils.io import split_data_target, _drop_fingerprints
+from .utils.set_module import autocast
+from .utils.cache import ValidationCache
 from .utils.logging import get_tb_logger
+from .utils.parallel import available_backends, _check_backend_args
+from .utils.stacking import StackedEstimators, StackedTrees
+from .utils.stacking import TrainableStackedEstimators
 
 
 def torchensemble_model_doc(header="", item="model"):
@@ -32,13 +40,26 @@ def torchensemble_model_doc(header="", item="model"):
             "tree_ensmeble_model": const.__tree_ensemble_doc,
             "fit": const.__fit_doc,
             "predict": const.__predict_doc,
+            "predict_cascade": const.__predict_cascade_doc,
             "set_optimizer": const.__set_optimizer_doc,
             "set_scheduler": const.__set_scheduler_doc,
             "set_criterion": const.__set_criterion_doc,
+            "set_checkpoint_format": const.__set_checkpoint_format_doc,
+            "set_precision": const.__set_precision_doc,
+            "set_validation_cache": const.__set_validation_cache_doc,
+            "set_forward_mode": const.__set_forward_mode_doc,
+            "set_parallel_backend": const.__set_parallel_backend_doc,
             "classifier_forward": const.__classification_forward_doc,
             "classifier_evaluate": const.__classification_evaluate_doc,
             "regressor_forward": const.__regression_forward_doc,
             "regressor_evaluate": const.__regression_evaluate_doc,
+            "staged_predict": const.__staged_predict_doc,
+            "classifier_staged_evaluate": (
+                const.__classification_staged_evaluate_doc
+            ),
+            "regressor_staged_evaluate": (
+                const.__regression_staged_evaluate_doc
+            ),
         }
         return __doc[item]
 
@@ -58,6 +79,9 @@ class BaseModule(nn.Module):
     Please use the derived classes instead.
     """
 
+    # Whether base estimators can be fitted in a batched forward
+    _supports_stacked_training = False
+
     def __init__(
         self,
         estimator,
@@ -85,6 +109,11 @@ class BaseModule(nn.Module):
 
         self.estimators_ = nn.ModuleList()
         self.use_scheduler_ = False
+        self.parallel_backend_ = "joblib"
+        self.parallel_backend_args_ = {}
+        self.checkpoint_format_ = "file"
+        self.precision_ = "fp32"
+        self._validation_cache = ValidationCache()
 
     def __len__(self):
         """
@@ -119,6 +148,101 @@ class BaseModule(nn.Module):
 
         return estimator.to(self.device)
 
+    def _make_optimizers(self, estimators, joint=False):
+        """
+        Make the optimizers of base estimators. If ``joint`` is ``True``, the
+        returned list contains a single optimizer with one parameter group
+        for each base estimator.
+        """
+        if joint:
+            return [
+                set_module.set_joint_optimizer(
+                    estimators, self.optimizer_name, **self.optimizer_args
+                )
+            ]
+
+        return [
+            set_module.set_optimizer(
+                estimator, self.optimizer_name, **self.optimizer_args
+            )
+            for estimator in estimators
+        ]
+
+    def _clear_caches(self):
+        """
+        Clear the states cached on the version counters of base estimators,
+        called after each training epoch of parallel ensembles. Parallel
+        backends such as ``shared_memory`` update base estimators in place in
+        other processes, which leaves the version counters in the current
+        process unchanged.
+        """
+        _drop_fingerprints(self)
+        self._validation_cache.clear()
+        if hasattr(self, "_stacked_estimators"):
+            self._stacked_estimators.clear()
+
+    def _add_snapshot(self, estimator, average_weights=False):
+        """
+        Add a copy of `estimator` into the ensemble. If `average_weights` is
+        `True`, the ensemble keeps one base estimator with the running
+        average over weights of all snapshots instead.
+        """
+        if not average_weights or len(self.estimators_) == 0:
+            snapshot = self._make_estimator()
+            snapshot.load_state_dict(estimator.state_dict())
+            self.estimators_.append(snapshot)
+        else:
+            op.moving_average_(
+                self.estimators_[0], estimator, self.n_snapshots_
+            )
+            # Statistics of batch normalization are recomputed on demand
+            self._stale_bn = True
+        self.n_snapshots_ += 1
+
+    @torch.no_grad()
+    def _update_bn(self, estimator, train_loader):
+        """
+        Recompute statistics of batch normalization layers in `estimator`
+        with a forward pass over `train_loader`, which is required after
+        averaging weights of snapshots.
+        """
+        bn_layers = [
+            module
+            for module in estimator.modules()
+            if isinstance(module, nn.modules.batchnorm._BatchNorm)
+        ]
+        if not bn_layers:
+            return
+
+        momenta = {}
+        for module in bn_layers:
+            module.reset_running_stats()
+            momenta[module] = module.momentum
+            # Cumulative moving average over all batches
+            module.momentum = None
+
+        training = estimator.training
+        estimator.train()
+        for _, elem in enumerate(train_loader):
+            data, _ = split_data_target(elem, self.device)
+            estimator(*data)
+
+        for module in bn_layers:
+            module.momentum = momenta[module]
+        estimator.train(training)
+
+    def _refresh_bn(self, train_loader):
+        """
+        Recompute statistics of batch normalization layers in the averaged
+        base estimator if weights of snapshots were averaged since the last
+        call. It is deferred until the ensemble is evaluated or the training
+        stage ends, so that the extra pass over `train_loader` is not paid
+        for every snapshot.
+        """
+        if getattr(self, "_stale_bn", False):
+            self._update_bn(self.estimators_[0], train_loader)
+            self._stale_bn = False
+
     def _validate_parameters(self, epochs, log_interval):
         """Validate hyper-parameters on training the ensemble."""
 
@@ -154,6 +278,119 @@ class BaseModule(nn.Module):
         self.scheduler_args = kwargs
         self.use_scheduler_ = True
 
+    def set_parallel_backend(self, backend, **kwargs):
+        """Set the backend on fitting base estimators in parallel."""
+        if backend not in available_backends():
+            msg = (
+                "The parallel backend should be one of {{{}}}, but got {}"
+                " instead."
+            )
+            raise ValueError(
+                msg.format(", ".join(available_backends()), backend)
+            )
+        _check_backend_args(backend, kwargs)
+
+        self.parallel_backend_ = backend
+        self.parallel_backend_args_ = kwargs
+
+    @torchensemble_model_doc(
+        """Set the format of checkpoints saved during training.""",
+        "set_checkpoint_format",
+    )
+    def set_checkpoint_format(self, checkpoint_format):
+        if checkpoint_format not in ("file", "sharded"):
+            msg = (
+                "The checkpoint format should be one of {{file, sharded}},"
+                " but got {} instead."
+            )
+            raise ValueError(msg.format(checkpoint_format))
+
+        self.checkpoint_format_ = checkpoint_format
+
+    @torchensemble_model_doc(
+        """Set the numerical precision used in training and prediction.""",
+        "set_precision",
+    )
+    def set_precision(self, precision):
+        if precision not in ("fp32", "bf16"):
+            msg = (
+                "The precision should be one of {{fp32, bf16}}, but got {}"
+                " instead."
+            )
+            raise ValueError(msg.format(precision))
+
+        self.precision_ = precision
+
+    @torchensemble_model_doc(
+        """Set the size limit of the cache on validation outputs.""",
+        "set_validation_cache",
+    )
+    def set_validation_cache(self, max_size):
+        if not max_size >= 0:
+            msg = (
+                "The maximum size of the validation cache should be"
+                " non-negative, but got {} instead."
+            )
+            raise ValueError(msg.format(max_size))
+
+        self._validation_cache = ValidationCache(max_size)
+
+    def set_forward_mode(self, mode, training=False):
+        """Set the execution mode of the data forwarding."""
+        if mode not in ("sequential", "stacked"):
+            msg = (
+                "The forward mode should be one of {{sequential, stacked}},"
+                " but got {} instead."
+            )
+            raise ValueError(msg.format(mode))
+
+        if training and mode != "stacked":
+            msg = (
+                "Fitting base estimators in a batched forward requires the"
+                " forward mode `stacked`, but got {} instead."
+            )
+            raise ValueError(msg.format(mode))
+
+        if training and not self._supports_stacked_training:
+            msg = (
+                "Fitting base estimators in a batched forward is not"
+                " supported by {}, since its base estimators are not fitted"
+                " jointly."
+            )
+            raise ValueError(msg.format(type(self).__name__))
+
+        self.forward_mode_ = mode
+        self.stacked_training_ = training
+        self._stacked_estimators = StackedEstimators()
+        self._trainable_stacked_estimators = TrainableStackedEstimators()
+
+    def _use_stacked_forward(self):
+        """Check whether to evaluate base estimators in a batched forward."""
+        return (
+            getattr(self, "forward_mode_", "sequential") == "stacked"
+            and getattr(self, "quantization_", None) is None
+            and not self.training
+        )
+
+    def _stacked_forward(self, *x):
+        """
+        Return the outputs of all base estimators stacked into a tensor of
+        shape (n_estimators, batch_size, ...), using one batched forward.
+        """
+        return self._stacked_estimators(self.estimators_, *x)
+
+    def _use_stacked_training(self):
+        """Check whether to fit base estimators in a batched forward."""
+        return getattr(self, "stacked_training_", False) and self.training
+
+    def _stacked_training_forward(self, *x):
+        """
+        Return the outputs of all base estimators stacked into a tensor of
+        shape (n_estimators, batch_size, ...), using one batched forward
+        that propagates gradients to the parameters of each base estimator.
+        """
+        return self._trainable_stacked_estimators(self.estimators_, *x)
+
     @abc.abstractmethod
     def forward(self, *x):
         """
@@ -176,28 +413,205 @@ class BaseModule(nn.Module):
         Implementation on the training stage of the ensemble.
         """
 
+    def _collect_outputs(self, estimators, test_loader):
+        """
+        Return the ``(outputs, target)`` on all batches in ``test_loader``,
+        where ``outputs`` stacks the outputs of all base estimators into a
+        tensor of shape (n_estimators, batch_size, ...). The outputs are kept
+        on CPU, and reused until any base estimator is updated or a different
+        ``test_loader`` is used. Outputs exceeding the size limit of the
+        cache, or all outputs if the cache is disabled, are streamed over
+        batches instead, which should be iterated only once.
+        """
+        batches = self._validation_cache.get(estimators, test_loader)
+        if batches is not None:
+            return batches
+
+        return self._iter_outputs(estimators, test_loader)
+
     @torch.no_grad()
-    def predict(self, *x):
-        """Docstrings decorated by downstream ensembles."""
+    def _iter_outputs(self, estimators, test_loader):
+        """
+        Yield the ``(outputs, target)`` on each batch in ``test_loader``, and
+        cache all of them once the iteration completes if their size is
+        within the limit of the cache.
+        """
+        # Base estimators are switched back to their modes after evaluation
+        modes = [estimator.training for estimator in estimators]
+        for estimator in estimators:
+            estimator.eval()
+
+        # Outputs are only copied to CPU when the cache is enabled
+        batches = [] if self._validation_cache.max_size > 0 else None
+        size = 0
+        try:
+            for _, elem in enumerate(test_loader):
+                data, target = split_data_target(elem, self.device)
+                if self._use_stacked_forward():
+                    outputs = self._stacked_estimators(estimators, *data)
+                else:
+                    outputs = torch.stack(
+                        [estimator(*data) for estimator in estimators]
+                    )
+
+                if batches is not None:
+                    size += outputs.numel() * outputs.element_size()
+                    if size > self._validation_cache.max_size:
+                        batches = None
+                    else:
+                        outputs, target = outputs.cpu(), target.cpu()
+                        batches.append((outputs, target))
+
+                yield outputs, target
+        finally:
+            for estimator, mode in zip(estimators, modes):
+                estimator.train(mode)
+
+        if batches is not None:
+            self._validation_cache.set(estimators, test_loader, batches)
+
+    def _staged_predict(self, *x):
+        """
+        Yield the predictions of the ensemble after each base estimator,
+        where ``_staged_output`` computes the output of the ensemble from the
+        running sum over outputs of base estimators evaluated so far.
+        """
         self.eval()
+        data = self._get_predict_batch(x)
 
-        # Copy data
-        x_device = []
-        for data in x:
+        accumulated = 0
+        for idx, estimator in enumerate(self.estimators_):
+            with torch.no_grad():
+                accumulated = accumulated + estimator(*data)
+                pred = self._staged_output(accumulated, idx + 1).cpu()
+            yield pred
+
+    def _iter_predict_batches(self, x, batch_size):
+        """
+        Return the number of samples in ``x`` (``None`` if unknown) and a
+        generator over data batches of ``x`` on the device of the ensemble.
+        """
+        type_msg = (
+            "The type of input X should be one of {torch.Tensor,"
+            " np.ndarray}, or an iterable over data batches."
+        )
+
+        def to_device(data):
             if isinstance(data, torch.Tensor):
-                x_device.append(data.to(self.device))
+                return data.to(self.device)
             elif isinstance(data, np.ndarray):
-                x_device.append(torch.Tensor(data).to(self.device))
+                data = np.asarray(data, dtype=np.float32)
+                # Read-only arrays (e.g., memmaps) cannot be shared
+                if not data.flags.writeable:
+                    data = np.array(data)
+                return torch.from_numpy(data).to(self.device)
             else:
+                raise ValueError(type_msg)
+
+        def from_iterable(iterable):
+            for elem in iterable:
+                if not isinstance(elem, (list, tuple)):
+                    elem = [elem]
+                data = [to_device(data) for data in elem]
+                # Batches with several elements are in the same format as in
+                # `evaluate`, where the last element is the target
+                if len(data) > 1:
+                    data, _ = split_data_target(data, self.device)
+                yield data
+
+        def from_arrays(n_samples, batch_size):
+            batch_size = batch_size if batch_size else max(n_samples, 1)
+            for start in range(0, max(n_samples, 1), batch_size):
+                end = start + batch_size
+                yield [to_device(data[start:end]) for data in x]
+
+        # Iterables over data batches, such as data loaders and generators
+        if len(x) == 1 and not isinstance(x[0], (torch.Tensor, np.ndarray)):
+            if isinstance(x[0], (list, tuple)) or not hasattr(
+                x[0], "__iter__"
+            ):
+                raise ValueError(type_msg)
+            return None, from_iterable(x[0])
+
+        for data in x:
+            if not isinstance(data, (torch.Tensor, np.ndarray)):
+                raise ValueError(type_msg)
+
+        n_samples = x[0].shape[0]
+        if any(data.shape[0] != n_samples for data in x):
+            msg = (
+                "All inputs X should have the same number of samples, but"
+                " got {} instead."
+            )
+            raise ValueError(msg.format([data.shape[0] for data in x]))
+
+        return n_samples, from_arrays(n_samples, batch_size)
+
+    def _get_predict_batch(self, x):
+        """Return the whole input ``x`` as one data batch on the device."""
+        n_samples, batches = self._iter_predict_batches(x, None)
+        if n_samples is None:
+            msg = (
+                "The type of input X should be one of {torch.Tensor,"
+                " np.ndarray}."
+            )
+            self.logger.error(msg)
+            raise ValueError(msg)
+
+        return next(batches)
+
+    @torch.no_grad()
+    def predict(self, *x, batch_size=None, out=None):
+        """Docstrings decorated by downstream ensembles."""
+        self.eval()
+
+        if batch_size is not None and not batch_size > 0:
+            msg = (
+                "The number of samples in each chunk should be strictly"
+                " positive, but got {} instead."
+            )
+            raise ValueError(msg.format(batch_size))
+
+        n_samples, batches = self._iter_predict_batches(x, batch_size)
+
+        preds = []
+        offset = 0
+        for x_device in batches:
+            with autocast(self.precision_, self.device):
+                pred = self.forward(*x_device)
+            if pred.dtype == torch.bfloat16:
+                pred = pred.float()
+            pred = pred.cpu()
+
+            # Unknown number of samples, concatenate predictions at the end
+            if out is None and n_samples is None:
+                preds.append(pred)
+                continue
+
+            # Allocate the output once the shape of predictions is known
+            if out is None:
+                out = torch.empty(
+                    (n_samples,) + tuple(pred.size()[1:]), dtype=pred.dtype
+                )
+
+            end = offset + pred.size(0)
+            if end > out.shape[0]:
                 msg = (
-                    "The type of input X should be one of {{torch.Tensor,"
-                    " np.ndarray}}."
+                    "The output with {} rows is too small to hold the"
+                    " predictions."
                 )
-                raise ValueError(msg)
+                raise ValueError(msg.format(out.shape[0]))
 
-        pred = self.forward(*x_device)
-        pred = pred.cpu()
-        return pred
+            if isinstance(out, np.ndarray):
+                out[offset:end] = pred.numpy()
+            else:
+                out[offset:end] = pred.to(out.device)
+            offset = end
+
+        if out is None:
+            return torch.cat(preds)
+
+        return out
 
 
 class BaseTreeEnsemble(BaseModule):
@@ -222,6 +636,19 @@ class BaseTreeEnsemble(BaseModule):
 
         self.estimators_ = nn.ModuleList()
         self.use_scheduler_ = False
+        self.parallel_backend_ = "joblib"
+        self.parallel_backend_args_ = {}
+        self.checkpoint_format_ = "file"
+        self.precision_ = "fp32"
+        self._validation_cache = ValidationCache()
+
+    @torchensemble_model_doc(
+        """Set the execution mode of the data forwarding.""",
+        "set_forward_mode",
+    )
+    def set_forward_mode(self, mode, training=False):
+        super().set_forward_mode(mode, training)
+        self._stacked_estimators = StackedTrees()
 
     def _decidce_n_inputs(self, train_loader):
         """Decide the input dimension according to the `train_loader`."""
@@ -294,6 +721,170 @@ class BaseClassifier(BaseModule):
 
         return acc
 
+    @torch.no_grad()
+    def _evaluate_outputs(self, batches, return_loss=False):
+        """
+        Evaluate the ensemble on the outputs of base estimators returned by
+        ``_collect_outputs``, where ``_aggregate_outputs`` combines outputs
+        of base estimators into the output of the ensemble.
+        """
+        correct = 0
+        total = 0
+        loss = 0.0
+        n_batches = 0
+
+        for outputs, target in batches:
+            outputs, target = outputs.to(self.device), target.to(self.device)
+            output = self._aggregate_outputs(outputs)
+            _, predicted = torch.max(output.data, 1)
+            correct += (predicted == target).sum().item()
+            total += target.size(0)
+            loss += self._criterion(output, target)
+            n_batches += 1
+
+        acc = 100 * correct / total
+        loss /= n_batches
+
+        if return_loss:
+            return acc, float(loss)
+
+        return acc
+
+    @torch.no_grad()
+    def _predict_cascade(
+        self, x, threshold, criterion, min_estimators, average_proba
+    ):
+        """
+        Evaluate base estimators in order, and stop the evaluation on samples
+        whose running prediction is confident. If ``average_proba`` is
+        ``True``, the running prediction averages over class distributions
+        from base estimators, otherwise it is the class distribution of the
+        averaged outputs from base estimators.
+        """
+        self.eval()
+
+        if criterion not in ("margin", "agreement"):
+            msg = (
+                "The criterion on the cascade prediction should be one of"
+                " {{margin, agreement}}, but got {} instead."
+            )
+            self.logger.error(msg.format(criterion))
+            raise ValueError(msg.format(criterion))
+
+        if not 0 <= threshold <= 1:
+            msg = (
+                "The threshold on the cascade prediction should be in the"
+                " range [0, 1], but got {} instead."
+            )
+            self.logger.error(msg.format(threshold))
+            raise ValueError(msg.format(threshold))
+
+        if not min_estimators >= 1:
+            msg = (
+                "The minimum number of base estimators should be strictly"
+                " positive, but got {} instead."
+            )
+            self.logger.error(msg.format(min_estimators))
+            raise ValueError(msg.format(min_estimators))
+
+        x_active = self._get_predict_batch(x)
+        batch_size = x_active[0].size(0)
+
+        active = torch.arange(batch_size, device=self.device)
+        n_used = torch.zeros(batch_size, dtype=torch.long, device=self.device)
+        accumulated = None
+
+        for idx, estimator in enumerate(self.estimators_):
+            output = estimator(*x_active)
+            if average_proba:
+                output = F.softmax(output, dim=1)
+
+            if accumulated is None:
+                accumulated = output.new_zeros((batch_size, output.size(1)))
+                votes = output.new_zeros((batch_size, output.size(1)))
+
+            accumulated[active] += output
+            votes[active, output.argmax(dim=1)] += 1
+            n_used[active] += 1
+
+            if idx + 1 < min_estimators:
+                continue
+
+            proba = accumulated[active] / (idx + 1)
+            if not average_proba:
+                proba = F.softmax(proba, dim=1)
+
+            if criterion == "margin":
+                top2 = torch.topk(proba, min(2, proba.size(1)), dim=1)[0]
+                confidence = top2[:, 0] - top2[:, -1]
+            else:
+                predicted = proba.argmax(dim=1, keepdim=True)
+                confidence = votes[active].gather(1, predicted).squeeze(1)
+                confidence = confidence / (idx + 1)
+
+            decided = confidence >= threshold
+            if decided.any():
+                x_active = [data[~decided] for data in x_active]
+                active = active[~decided]
+            if active.size(0) == 0:
+                break
+
+        proba = accumulated / n_used.view(-1, 1).to(accumulated.dtype)
+        if not average_proba:
+            proba = F.softmax(proba, dim=1)
+
+        return proba.cpu(), n_used.cpu()
+
+    @torch.no_grad()
+    def _staged_evaluate(self, test_loader, return_loss=False):
+        """
+        Evaluate the ensemble after each base estimator, using the running
+        sum over outputs of base estimators on each batch.
+        """
+        self.eval()
+        n_estimators = len(self.estimators_)
+        correct = [0] * n_estimators
+        total = 0
+        loss = [0.0] * n_estimators
+
+        for _, elem in enumerate(test_loader):
+            data, target = split_data_target(elem, self.device)
+            accumulated = 0
+            for idx, estimator in enumerate(self.estimators_):
+                accumulated = accumulated + estimator(*data)
+                output = self._staged_output(accumulated, idx + 1)
+                _, predicted = torch.max(output.data, 1)
+                correct[idx] += (predicted == target).sum().item()
+                loss[idx] += float(self._criterion(output, target))
+            total += target.size(0)
+
+        acc = [100 * c / total for c in correct]
+        loss = [value / len(test_loader) for value in loss]
+
+        if return_loss:
+            return acc, loss
+
+        return acc
+
+    @torch.no_grad()
+    def evaluate_estimators(self, test_loader):
+        """
+        Return the list of testing accuracy of each base estimator on
+        ``test_loader``. Outputs of base estimators are shared with
+        :meth:`evaluate` and the validation in :meth:`fit` when possible.
+        """
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+
+        correct = torch.zeros(len(self.estimators_), dtype=torch.long)
+        total = 0
+        for outputs, target in batches:
+            _, predicted = torch.max(outputs, 2)
+            correct += (predicted == target.unsqueeze(0)).sum(1)
+            total += target.size(0)
+
+        return [100 * c / total for c in correct.tolist()]
+
 
 class BaseRegressor(BaseModule):
     """Base class for all ensemble regressors.
@@ -331,6 +922,63 @@ class BaseRegressor(BaseModule):
 
         return float(loss) / len(test_loader)
 
+    @torch.no_grad()
+    def _evaluate_outputs(self, batches):
+        """
+        Evaluate the ensemble on the outputs of base estimators returned by
+        ``_collect_outputs``, where ``_aggregate_outputs`` combines outputs
+        of base estimators into the output of the ensemble.
+        """
+        loss = 0.0
+        n_batches = 0
+
+        for outputs, target in batches:
+            outputs, target = outputs.to(self.device), target.to(self.device)
+            output = self._aggregate_outputs(outputs)
+            loss += self._criterion(output, target)
+            n_batches += 1
+
+        return float(loss) / n_batches
+
+    @torch.no_grad()
+    def _staged_evaluate(self, test_loader):
+        """
+        Evaluate the ensemble after each base estimator, using the running
+        sum over outputs of base estimators on each batch.
+        """
+        self.eval()
+        loss = [0.0] * len(self.estimators_)
+
+        for _, elem in enumerate(test_loader):
+            data, target = split_data_target(elem, self.device)
+            accumulated = 0
+            for idx, estimator in enumerate(self.estimators_):
+                accumulated = accumulated + estimator(*data)
+                output = self._staged_output(accumulated, idx + 1)
+                loss[idx] += float(self._criterion(output, target))
+
+        return [value / len(test_loader) for value in loss]
+
+    @torch.no_grad()
+    def evaluate_estimators(self, test_loader):
+        """
+        Return the list of testing loss of each base estimator on
+        ``test_loader``. Outputs of base estimators are shared with
+        :meth:`evaluate` and the validation in :meth:`fit` when possible.
+        """
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+
+        losses = [0.0] * len(self.estimators_)
+        n_batches = 0
+        for outputs, target in batches:
+            outputs, target = outputs.to(self.device), target.to(self.device)
+            for idx, output in enumerate(outputs):
+                losses[idx] += float(self._criterion(output, target))
+            n_batches += 1
+
+        return [loss / n_batches for loss in losses]
+
 
 class BaseTree(nn.Module):
     """Fast implementation of soft decision tree in PyTorch, copied from:
@@ -389,8 +1037,10 @@ class BaseTree(nn.Module):
         path_prob = torch.unsqueeze(path_prob, dim=2)
         path_prob = torch.cat((path_prob, 1 - path_prob), dim=2)
 
-        _mu = X.data.new(batch_size, 1, 1).fill_(1.0)
-        _penalty = torch.tensor(0.0).to(self.device)
+        # Created from the batch size of `X`, which is kept dynamic in the
+        # traced graph
+        _mu = X.new_ones(batch_size, 1, 1)
+        _penalty = X.new_zeros(())
 
         # Iterate through internal odes in each layer to compute the final path
         # probabilities and the regularization term.
@@ -400,10 +1050,13 @@ class BaseTree(nn.Module):
         for layer_idx in range(0, self.depth):
             _path_prob = path_prob[:, begin_idx:end_idx, :]
 
+            # Path probabilities of parent nodes for all nodes in the next
+            # layer, with shape (batch_size, n_nodes, 2)
+            _mu = _mu.view(batch_size, -1, 1).repeat(1, 1, 2)
+
             # Extract internal nodes in the current layer to compute the
             # regularization term
             _penalty = _penalty + self._cal_penalty(layer_idx, _mu, _path_prob)
-            _mu = _mu.view(batch_size, -1, 1).repeat(1, 1, 2)
 
             _mu = _mu * _path_prob  # update path probabilities
 
@@ -415,22 +1068,16 @@ class BaseTree(nn.Module):
         return mu, _penalty
 
     def _cal_penalty(self, layer_idx, _mu, _path_prob):
-        """Compute the regularization term for internal nodes"""
-
-        penalty = torch.tensor(0.0).to(self.device)
-
-        batch_size = _mu.size()[0]
-        _mu = _mu.view(batch_size, 2 ** layer_idx)
-        _path_prob = _path_prob.view(batch_size, 2 ** (layer_idx + 1))
-
-        for node in range(0, 2 ** (layer_idx + 1)):
-            alpha = torch.sum(
-                _path_prob[:, node] * _mu[:, node // 2], dim=0
-            ) / torch.sum(_mu[:, node // 2], dim=0)
-
-            coeff = self.penalty_list[layer_idx]
+        """
+        Compute the regularization term for internal nodes in a layer, where
+        `_mu` and `_path_prob` are of shape (batch_size, n_nodes, 2).
+        """
+        coeff = self.penalty_list[layer_idx]
 
-            penalty -= 0.5 * coeff * (torch.log(alpha) + torch.log(1 - alpha))
+        alpha = torch.sum(_path_prob * _mu, dim=0) / torch.sum(_mu, dim=0)
+        penalty = -torch.sum(
+            0.5 * coeff * (torch.log(alpha) + torch.log(1 - alpha))
+        )
 
         return penalty
 
@@ -438,7 +1085,7 @@ class BaseTree(nn.Module):
         """Add a constant input `1` onto the front of each sample."""
         batch_size = X.size()[0]
         X = X.view(batch_size, -1)
-        bias = torch.ones(batch_size, 1).to(self.device)
+        bias = X.new_ones(batch_size, 1)
         X = torch.cat((bias, X), 1)
 
         return X
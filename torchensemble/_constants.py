@@ -123,6 +123,124 @@ __set_criterion_doc = """
 """
 
 
+__set_parallel_backend_doc = """
+    Parameters
+    ----------
+    backend : string
+        The backend on fitting base estimators in parallel, should be one of
+        {``joblib``, ``shared_memory``, ``threading``}. The number of workers
+        is specified by ``n_jobs``.
+
+        - If ``joblib``, base estimators and optimizers are sent to the
+          workers of :mod:`joblib` and returned at each training epoch.
+        - If ``shared_memory``, a persistent pool of worker processes from
+          :mod:`torch.multiprocessing` is used during the whole training
+          stage. Parameters of base estimators are placed in shared memory
+          and updated in place by the worker owning them, so that only the
+          learning rate is sent to workers at each training epoch. This
+          backend only supports training on CPU.
+        - If ``threading``, a persistent pool of threads in the current
+          process is used during the whole training stage, and nothing is
+          serialized. The number of intra-op threads of PyTorch is shared
+          by all threads in the process, and is divided by the number of
+          workers during the training stage, so that concurrent base
+          estimators do not oversubscribe the CPUs. It is restored after
+          the training stage.
+
+        All backends fit each base estimator with its own optimizer, and do
+        not support the ``joint_optimizer`` option of :meth:`fit`.
+    **kwargs : keyword arguments
+        Additional arguments specific to the backend.
+
+        - ``pin_cpus`` (bool, default=False): only for ``threading``.
+          Whether to pin the Python thread of each worker to a disjoint
+          subset of the CPUs available to the process. The pinning is
+          best-effort, and intra-op threads of PyTorch are not pinned.
+"""
+
+
+__set_checkpoint_format_doc = """
+    Parameters
+    ----------
+    checkpoint_format : string
+        The format of checkpoints saved by :meth:`fit`, should be one of
+        {``file``, ``sharded``}.
+
+        - If ``file``, the ensemble is saved into a single ``.pth`` file.
+        - If ``sharded``, the ensemble is saved into a directory with one
+          shard for each base estimator and a manifest. Only shards of base
+          estimators updated since the last saving are rewritten, and base
+          estimators can be loaded on first use via
+          ``torchensemble.utils.io.load(model, save_dir, lazy=True)``.
+
+        Checkpoints in both formats can be loaded by
+        :meth:`torchensemble.utils.io.load`.
+"""
+
+
+__set_validation_cache_doc = """
+    Parameters
+    ----------
+    max_size : int
+        The maximum size in bytes of the outputs of base estimators cached on
+        a validation dataloader, which are shared between the validation in
+        :meth:`fit` and :meth:`evaluate`. The cache is disabled by default,
+        and is only enabled by calling this method.
+
+        - If the outputs on all batches are within ``max_size``, they are
+          kept on CPU until any base estimator is updated.
+        - Otherwise, the outputs are streamed over batches without caching
+          or copying them to CPU. Setting ``max_size`` to ``0`` disables the
+          cache.
+"""
+
+
+__set_precision_doc = """
+    Parameters
+    ----------
+    precision : string
+        The numerical precision used by :meth:`fit` and :meth:`predict`,
+        should be one of {``fp32``, ``bf16``}.
+
+        - If ``fp32``, all computations are executed in float32.
+        - If ``bf16``, the data forwarding and loss computation are executed
+          under :class:`torch.autocast` with bfloat16, while parameters of
+          base estimators are kept in float32. Predictions are returned in
+          float32. Requires PyTorch >= 1.10.
+"""
+
+
+__set_forward_mode_doc = """
+    Parameters
+    ----------
+    mode : string
+        The execution mode of the data forwarding, should be one of
+        {``sequential``, ``stacked``}.
+
+        - If ``sequential``, base estimators are evaluated one by one.
+        - If ``stacked``, parameters of all base estimators are stacked and
+          evaluated in one batched forward with :mod:`torch.func`, which
+          requires PyTorch >= 2.0 and base estimators with the same
+          architecture. This mode takes effect when the ensemble is in
+          evaluating mode (e.g., in :meth:`predict` and :meth:`evaluate`),
+          and in the training stage if ``training`` is ``True``.
+
+        For neural tree ensembles, the ``stacked`` mode fuses all soft
+        decision trees into one forest without :mod:`torch.func`. Outputs of
+        the fused forest are detached from parameters of base estimators.
+    training : bool, default=False
+        Whether to also use the ``stacked`` mode in the training stage of
+        ensembles that fit all base estimators jointly, i.e.,
+        :class:`FusionClassifier`, :class:`FusionRegressor`, and soft
+        gradient boosting. Parameters of all base estimators are stacked at
+        each training step, and the forward and backward of all base
+        estimators are computed in one batched call, producing the same
+        gradients as the sequential mode. Dropout masks are drawn
+        independently for each base estimator. Other ensembles raise a
+        ``ValueError`` if ``training`` is ``True``.
+"""
+
+
 __fit_doc = """
     Parameters
     ----------
@@ -160,16 +278,70 @@ __fit_doc = """
 __predict_doc = """
     Return the predictions of the ensemble given the testing data.
 
+    Parameters
+    ----------
+    X : {tensor, numpy array, iterable}
+        A data batch in the form of tensor or numpy array (including
+        :class:`numpy.memmap`), or an iterable over data batches such as
+        a :mod:`torch.utils.data.DataLoader` or a generator. Each element of
+        the iterable should be either the input as a tensor or numpy array
+        (or a list with this single input), or a list ``(X_1, ..., X_n, y)``
+        in the same format as the data loaders in :meth:`evaluate`, where
+        the last element ``y`` is the target and is ignored.
+    batch_size : int, default=None
+        The number of samples in each chunk forwarded through the ensemble.
+
+        - If ``None``, tensors and numpy arrays are forwarded as a whole.
+        - If not ``None``, tensors and numpy arrays are split into chunks of
+          ``batch_size`` samples, and only one chunk is moved to the device
+          of the ensemble at a time. Data batches from an iterable are
+          always forwarded as they are.
+    out : {tensor, numpy array}, default=None
+        A preallocated container of shape (n_samples, n_outputs) that
+        receives the predictions chunk by chunk, for example, a memory-mapped
+        array created by :func:`numpy.lib.format.open_memmap`. If ``None``, a
+        new tensor is allocated.
+
+    Returns
+    -------
+    pred : {tensor, numpy array} of shape (n_samples, n_outputs)
+        For classifiers, ``n_outputs`` is the number of distinct classes. For
+        regressors, ``n_output`` is the number of target variables. If
+        ``out`` is not ``None``, ``out`` is returned.
+"""
+
+
+__predict_cascade_doc = """
+    Return the predictions of the ensemble given the testing data, where
+    base estimators are evaluated in order and the evaluation on each sample
+    stops once the running prediction from base estimators evaluated so far
+    is confident.
+
     Parameters
     ----------
     X : {tensor, numpy array}
         A data batch in the form of tensor or numpy array.
+    threshold : float
+        The threshold on the confidence of the running prediction, which
+        should be in the range [0, 1].
+    criterion : {"margin", "agreement"}, default="margin"
+        The confidence of the running prediction.
+
+        - If ``margin``, the confidence is the margin between the largest
+          and the second largest class probability.
+        - If ``agreement``, the confidence is the fraction of base estimators
+          evaluated so far that predict the same class as the running
+          prediction.
+    min_estimators : int, default=2
+        The minimum number of base estimators evaluated on each sample.
 
     Returns
     -------
-    pred : tensor of shape (n_samples, n_outputs)
-        For classifiers, ``n_outputs`` is the number of distinct classes. For
-        regressors, ``n_output`` is the number of target variables.
+    proba : tensor of shape (n_samples, n_classes)
+        The class distributions predicted by the ensemble, the same as
+        :meth:`predict` for samples evaluated by all base estimators.
+    n_estimators : tensor of shape (n_samples,)
+        The number of base estimators evaluated on each sample.
 """
 
 
@@ -209,6 +381,69 @@ __classification_evaluate_doc = """
 """
 
 
+__staged_predict_doc = """
+    Return a generator over the predictions of the ensemble given the testing
+    data, after each base estimator is added to the ensemble in order. The
+    outputs of base estimators are accumulated across stages, so that each
+    base estimator is only evaluated once.
+
+    Parameters
+    ----------
+    X : {tensor, numpy array}
+        A data batch in the form of tensor or numpy array.
+
+    Yields
+    ------
+    pred : tensor of shape (n_samples, n_outputs)
+        The predictions of the ensemble with the first ``i + 1`` base
+        estimators at the ``i``-th stage.
+"""
+
+
+__classification_staged_evaluate_doc = """
+    Compute the classification accuracy of the ensemble after each base
+    estimator is added to the ensemble in order, and optionally the average
+    cross-entropy loss. Each base estimator is only evaluated once on each
+    batch of the testing dataloader.
+
+    Parameters
+    ----------
+    test_loader : torch.utils.data.DataLoader
+        A data loader that contains the testing data.
+    return_loss : bool, default=False
+        Whether to return the average cross-entropy loss over all batches
+        in the ``test_loader``.
+
+    Returns
+    -------
+    accuracy : list of float
+        The classification accuracy of the ensemble with the first ``i + 1``
+        base estimators on ``test_loader`` at index ``i``.
+    loss : list of float
+        The average cross-entropy loss of the ensemble with the first
+        ``i + 1`` base estimators on ``test_loader`` at index ``i``, only
+        available when ``return_loss`` is True.
+"""
+
+
+__regression_staged_evaluate_doc = """
+    Compute the mean squared error (MSE) of the ensemble after each base
+    estimator is added to the ensemble in order. Each base estimator is
+    only evaluated once on each batch of the testing dataloader.
+
+    Parameters
+    ----------
+    test_loader : torch.utils.data.DataLoader
+        A data loader that contains the testing data.
+
+    Returns
+    -------
+    mse : list of float
+        The testing mean squared error of the ensemble with the first
+        ``i + 1`` base estimators on ``test_loader`` at index ``i``.
+"""
+
+
 __regression_forward_doc = """
     Parameters
     ----------
@@ -14,13 +14,13 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 import warnings
-from joblib import Parallel, delayed
 
 from ._base import BaseModule, BaseClassifier, BaseRegressor
 from ._base import torchensemble_model_doc
 from .utils import io
 from .utils import set_module
 from .utils import operator as op
+from .utils.parallel import get_trainer, LockstepTrainer
 
 
 __all__ = ["AdversarialTrainingClassifier", "AdversarialTrainingRegressor"]
@@ -60,6 +60,27 @@ __fit_doc = """
         - If ``None``, the model will be saved in the current directory.
         - If not ``None``, the model will be saved in the specified
           directory: ``save_dir``.
+    lockstep : bool, default=False
+        Specify how base estimators iterate over the training data.
+
+        - If ``False``, each base estimator iterates over ``train_loader``
+          on its own, using the parallel backend set by
+          :meth:`set_parallel_backend`.
+        - If ``True``, each data batch is loaded only once and fed to all
+          base estimators before loading the next one. Base estimators are
+          fitted on each data batch concurrently by a pool of ``n_jobs``
+          threads in the current process.
+    joint_optimizer : bool, default=False
+        Specify whether to update all base estimators with a single
+        multi-tensor optimizer, which has one parameter group for each base
+        estimator, instead of one optimizer per base estimator. It reduces
+        the overhead of the optimizer when fitting many small base
+        estimators, and requires ``lockstep=True``, where all base
+        estimators are updated on each data batch in the current process.
+        It is not supported by the parallel backends set by
+        :meth:`set_parallel_backend`, including ``threading`` and
+        ``shared_memory``, where each worker fits its own base estimators
+        over the whole training epoch.
 """
 
 
@@ -95,6 +116,7 @@ def _parallel_fit_per_epoch(
     log_interval,
     device,
     is_classification,
+    precision="fp32",
 ):
     """
     Private function used to fit base estimators in parallel.
@@ -115,17 +137,21 @@ def _parallel_fit_per_epoch(
             tensor.requires_grad = True
 
         # Get adversarial samples
-        _output = estimator(*data)
-        _loss = criterion(_output, target)
+        with set_module.autocast(precision, device):
+            _output = estimator(*data)
+            _loss = criterion(_output, target)
         _loss.backward()
         data_grad = [tensor.grad.data for tensor in data]
         adv_data = _get_fgsm_samples(data, epsilon, data_grad)
 
         # Compute the training loss
         optimizer.zero_grad()
-        org_output = estimator(*data)
-        adv_output = estimator(*adv_data)
-        loss = criterion(org_output, target) + criterion(adv_output, target)
+        with set_module.autocast(precision, device):
+            org_output = estimator(*data)
+            adv_output = estimator(*adv_data)
+            loss = criterion(org_output, target) + criterion(
+                adv_output, target
+            )
         loss.backward()
         optimizer.step()
 
@@ -157,6 +183,71 @@ def _parallel_fit_per_epoch(
     return estimator, optimizer
 
 
+def _parallel_fit_per_batch(
+    data,
+    target,
+    epsilon,
+    estimator,
+    optimizer,
+    criterion,
+    idx,
+    epoch,
+    batch_idx,
+    log_interval,
+    device,
+    is_classification,
+    precision="fp32",
+):
+    """
+    Private function used to fit a base estimator on a data batch shared by
+    all base estimators. If ``optimizer`` is ``None``, only the gradients
+    are computed, and the base estimator is updated by the caller.
+    """
+    batch_size = data[0].size(0)
+
+    # Each base estimator takes the gradients on its own copy of the batch
+    data = [tensor.detach().requires_grad_() for tensor in data]
+
+    # Get adversarial samples
+    with set_module.autocast(precision, device):
+        _output = estimator(*data)
+        _loss = criterion(_output, target)
+    data_grad = torch.autograd.grad(_loss, data)
+    adv_data = _get_fgsm_samples(data, epsilon, data_grad)
+
+    # Compute the training loss
+    if optimizer is not None:
+        optimizer.zero_grad()
+    with set_module.autocast(precision, device):
+        org_output = estimator(*data)
+        adv_output = estimator(*adv_data)
+        loss = criterion(org_output, target) + criterion(adv_output, target)
+    loss.backward()
+    if optimizer is not None:
+        optimizer.step()
+
+    # Print training status
+    if batch_idx % log_interval == 0:
+
+        # Classification
+        if is_classification:
+            _, predicted = torch.max(org_output.data, 1)
+            correct = (predicted == target).sum().item()
+
+            msg = (
+                "Estimator: {:03d} | Epoch: {:03d} | Batch: {:03d}"
+                " | Loss: {:.5f} | Correct: {:d}/{:d}"
+            )
+            print(msg.format(idx, epoch, batch_idx, loss, correct, batch_size))
+        # Regression
+        else:
+            msg = (
+                "Estimator: {:03d} | Epoch: {:03d} | Batch: {:03d}"
+                " | Loss: {:.5f}"
+            )
+            print(msg.format(idx, epoch, batch_idx, loss))
+
+
 def _get_fgsm_samples(sample_list, epsilon, sample_grad_list):
     """
     Private functions used to generate adversarial samples with fast gradient
@@ -253,6 +344,13 @@ class AdversarialTrainingClassifier(_BaseAdversarialTraining, BaseClassifier):
     def set_criterion(self, criterion):
         super().set_criterion(criterion)
 
+    @torchensemble_model_doc(
+        """Set the parallel backend for AdversarialTrainingClassifier.""",
+        "set_parallel_backend",
+    )
+    def set_parallel_backend(self, backend, **kwargs):
+        super().set_parallel_backend(backend, **kwargs)
+
     @_adversarial_training_model_doc(
         """Implementation on the training stage of AdversarialTrainingClassifier.""",  # noqa: E501
         "fit",
@@ -266,9 +364,14 @@ class AdversarialTrainingClassifier(_BaseAdversarialTraining, BaseClassifier):
         test_loader=None,
         save_model=True,
         save_dir=None,
+        lockstep=False,
+        joint_optimizer=False,
     ):
 
         self._validate_parameters(epochs, epsilon, log_interval)
+        set_module.check_joint_optimizer(
+            joint_optimizer, lockstep, "lockstep=True", self.logger
+        )
         self.n_outputs = self._decide_n_outputs(train_loader)
 
         # Instantiate a pool of base estimators, optimizers, and schedulers.
@@ -276,13 +379,7 @@ class AdversarialTrainingClassifier(_BaseAdversarialTraining, BaseClassifier):
         for _ in range(self.n_estimators):
             estimators.append(self._make_estimator())
 
-        optimizers = []
-        for i in range(self.n_estimators):
-            optimizers.append(
-                set_module.set_optimizer(
-                    estimators[i], self.optimizer_name, **self.optimizer_args
-                )
-            )
+        optimizers = self._make_optimizers(estimators, joint_optimizer)
 
         if self.use_scheduler_:
             scheduler_ = set_module.set_scheduler(
@@ -296,17 +393,40 @@ class AdversarialTrainingClassifier(_BaseAdversarialTraining, BaseClassifier):
         # Utils
         best_acc = 0.0
 
-        # Internal helper function on pesudo forward
-        def _forward(estimators, *x):
-            outputs = [
-                F.softmax(estimator(*x), dim=1) for estimator in estimators
-            ]
-            proba = op.average(outputs)
-
-            return proba
-
-        # Maintain a pool of workers
-        with Parallel(n_jobs=self.n_jobs) as parallel:
+        # Each data batch is shared among all base estimators in lockstep
+        if lockstep:
+            trainer = LockstepTrainer(
+                _parallel_fit_per_batch,
+                estimators,
+                optimizers,
+                [train_loader],
+                n_jobs=self.n_jobs,
+                backend_args={"joint_optimizer": joint_optimizer},
+                epsilon=epsilon,
+                criterion=self._criterion,
+                log_interval=log_interval,
+                device=self.device,
+                is_classification=False,
+                precision=self.precision_,
+            )
+        else:
+            # Maintain a pool of workers
+            trainer = get_trainer(
+                self.parallel_backend_,
+                _parallel_fit_per_epoch,
+                estimators,
+                optimizers,
+                [train_loader] * self.n_estimators,
+                n_jobs=self.n_jobs,
+                backend_args=self.parallel_backend_args_,
+                epsilon=epsilon,
+                criterion=self._criterion,
+                log_interval=log_interval,
+                device=self.device,
+                is_classification=False,
+                precision=self.precision_,
+            )
+        with trainer:
 
             # Training loop
             for epoch in range(epochs):
@@ -321,45 +441,18 @@ class AdversarialTrainingClassifier(_BaseAdversarialTraining, BaseClassifier):
                     msg = "Parallelization on the training epoch: {:03d}"
                     self.logger.info(msg.format(epoch))
 
-                rets = parallel(
-                    delayed(_parallel_fit_per_epoch)(
-                        train_loader,
-                        epsilon,
-                        estimator,
-                        cur_lr,
-                        optimizer,
-                        self._criterion,
-                        idx,
-                        epoch,
-                        log_interval,
-                        self.device,
-                        False,
-                    )
-                    for idx, (estimator, optimizer) in enumerate(
-                        zip(estimators, optimizers)
-                    )
-                )
-
-                estimators, optimizers = [], []
-                for estimator, optimizer in rets:
-                    estimators.append(estimator)
-                    optimizers.append(optimizer)
+                trainer.fit_per_epoch(epoch, cur_lr)
+                self._clear_caches()
+                estimators = trainer.estimators
 
                 # Validation
                 if test_loader:
                     self.eval()
                     with torch.no_grad():
-                        correct = 0
-                        total = 0
-                        for _, elem in enumerate(test_loader):
-                            data, target = io.split_data_target(
-                                elem, self.device
-                            )
-                            output = _forward(estimators, *data)
-                            _, predicted = torch.max(output.data, 1)
-                            correct += (predicted == target).sum().item()
-                            total += target.size(0)
-                        acc = 100 * correct / total
+                        batches = self._collect_outputs(
+                            estimators, test_loader
+                        )
+                        acc = self._evaluate_outputs(batches)
 
                         if acc > best_acc:
                             best_acc = acc
@@ -395,13 +488,19 @@ class AdversarialTrainingClassifier(_BaseAdversarialTraining, BaseClassifier):
         if save_model and not test_loader:
             io.save(self, save_dir, self.logger)
 
+    def _aggregate_outputs(self, outputs):
+        """Average over class distributions from all base estimators."""
+        return F.softmax(outputs, dim=2).mean(0)
+
     @torchensemble_model_doc(item="classifier_evaluate")
     def evaluate(self, test_loader, return_loss=False):
-        return super().evaluate(test_loader, return_loss)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches, return_loss)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
 
 
 @torchensemble_model_doc(
@@ -441,6 +540,13 @@ class AdversarialTrainingRegressor(_BaseAdversarialTraining, BaseRegressor):
     def set_criterion(self, criterion):
         super().set_criterion(criterion)
 
+    @torchensemble_model_doc(
+        """Set the parallel backend for AdversarialTrainingRegressor.""",
+        "set_parallel_backend",
+    )
+    def set_parallel_backend(self, backend, **kwargs):
+        super().set_parallel_backend(backend, **kwargs)
+
     @_adversarial_training_model_doc(
         """Implementation on the training stage of AdversarialTrainingRegressor.""",  # noqa: E501
         "fit",
@@ -454,9 +560,14 @@ class AdversarialTrainingRegressor(_BaseAdversarialTraining, BaseRegressor):
         test_loader=None,
         save_model=True,
         save_dir=None,
+        lockstep=False,
+        joint_optimizer=False,
     ):
 
         self._validate_parameters(epochs, epsilon, log_interval)
+        set_module.check_joint_optimizer(
+            joint_optimizer, lockstep, "lockstep=True", self.logger
+        )
         self.n_outputs = self._decide_n_outputs(train_loader)
 
         # Instantiate a pool of base estimators, optimizers, and schedulers.
@@ -464,13 +575,7 @@ class AdversarialTrainingRegressor(_BaseAdversarialTraining, BaseRegressor):
         for _ in range(self.n_estimators):
             estimators.append(self._make_estimator())
 
-        optimizers = []
-        for i in range(self.n_estimators):
-            optimizers.append(
-                set_module.set_optimizer(
-                    estimators[i], self.optimizer_name, **self.optimizer_args
-                )
-            )
+        optimizers = self._make_optimizers(estimators, joint_optimizer)
 
         if self.use_scheduler_:
             scheduler_ = set_module.set_scheduler(
@@ -484,15 +589,40 @@ class AdversarialTrainingRegressor(_BaseAdversarialTraining, BaseRegressor):
         # Utils
         best_loss = float("inf")
 
-        # Internal helper function on pesudo forward
-        def _forward(estimators, *x):
-            outputs = [estimator(*x) for estimator in estimators]
-            pred = op.average(outputs)
-
-            return pred
-
-        # Maintain a pool of workers
-        with Parallel(n_jobs=self.n_jobs) as parallel:
+        # Each data batch is shared among all base estimators in lockstep
+        if lockstep:
+            trainer = LockstepTrainer(
+                _parallel_fit_per_batch,
+                estimators,
+                optimizers,
+                [train_loader],
+                n_jobs=self.n_jobs,
+                backend_args={"joint_optimizer": joint_optimizer},
+                epsilon=epsilon,
+                criterion=self._criterion,
+                log_interval=log_interval,
+                device=self.device,
+                is_classification=True,
+                precision=self.precision_,
+            )
+        else:
+            # Maintain a pool of workers
+            trainer = get_trainer(
+                self.parallel_backend_,
+                _parallel_fit_per_epoch,
+                estimators,
+                optimizers,
+                [train_loader] * self.n_estimators,
+                n_jobs=self.n_jobs,
+                backend_args=self.parallel_backend_args_,
+                epsilon=epsilon,
+                criterion=self._criterion,
+                log_interval=log_interval,
+                device=self.device,
+                is_classification=True,
+                precision=self.precision_,
+            )
+        with trainer:
 
             # Training loop
             for epoch in range(epochs):
@@ -507,42 +637,18 @@ class AdversarialTrainingRegressor(_BaseAdversarialTraining, BaseRegressor):
                     msg = "Parallelization on the training epoch: {:03d}"
                     self.logger.info(msg.format(epoch))
 
-                rets = parallel(
-                    delayed(_parallel_fit_per_epoch)(
-                        train_loader,
-                        epsilon,
-                        estimator,
-                        cur_lr,
-                        optimizer,
-                        self._criterion,
-                        idx,
-                        epoch,
-                        log_interval,
-                        self.device,
-                        True,
-                    )
-                    for idx, (estimator, optimizer) in enumerate(
-                        zip(estimators, optimizers)
-                    )
-                )
-
-                estimators, optimizers = [], []
-                for estimator, optimizer in rets:
-                    estimators.append(estimator)
-                    optimizers.append(optimizer)
+                trainer.fit_per_epoch(epoch, cur_lr)
+                self._clear_caches()
+                estimators = trainer.estimators
 
                 # Validation
                 if test_loader:
                     self.eval()
                     with torch.no_grad():
-                        val_loss = 0.0
-                        for _, elem in enumerate(test_loader):
-                            data, target = io.split_data_target(
-                                elem, self.device
-                            )
-                            output = _forward(estimators, *data)
-                            val_loss += self._criterion(output, target)
-                        val_loss /= len(test_loader)
+                        batches = self._collect_outputs(
+                            estimators, test_loader
+                        )
+                        val_loss = self._evaluate_outputs(batches)
 
                         if val_loss < best_loss:
                             best_loss = val_loss
@@ -577,10 +683,16 @@ class AdversarialTrainingRegressor(_BaseAdversarialTraining, BaseRegressor):
         if save_model and not test_loader:
             io.save(self, save_dir, self.logger)
 
+    def _aggregate_outputs(self, outputs):
+        """Average over predictions from all base estimators."""
+        return outputs.mean(0)
+
     @torchensemble_model_doc(item="regressor_evaluate")
     def evaluate(self, test_loader):
-        return super().evaluate(test_loader)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
@@ -11,18 +11,95 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 import warnings
-from joblib import Parallel, delayed
 
 from ._base import BaseClassifier, BaseRegressor
 from ._base import torchensemble_model_doc
 from .utils import io
 from .utils import set_module
 from .utils import operator as op
+from .utils.parallel import get_trainer, LockstepTrainer
 
 
 __all__ = ["BaggingClassifier", "BaggingRegressor"]
 
 
+__fit_doc = """
+    Parameters
+    ----------
+    train_loader : torch.utils.data.DataLoader
+        A :mod:`torch.utils.data.DataLoader` container that contains the
+        training data.
+    epochs : int, default=100
+        The number of training epochs.
+    log_interval : int, default=100
+        The number of batches to wait before logging the training status.
+    test_loader : torch.utils.data.DataLoader, default=None
+        A :mod:`torch.utils.data.DataLoader` container that contains the
+        evaluating data.
+
+        - If ``None``, no validation is conducted during the training
+          stage.
+        - If not ``None``, the ensemble will be evaluated on this
+          dataloader after each training epoch.
+    save_model : bool, default=True
+        Specify whether to save the model parameters.
+
+        - If test_loader is ``None``, the ensemble fully trained will be
+          saved.
+        - If test_loader is not ``None``, the ensemble with the best
+          validation performance will be saved.
+    save_dir : string, default=None
+        Specify where to save the model parameters.
+
+        - If ``None``, the model will be saved in the current directory.
+        - If not ``None``, the model will be saved in the specified
+          directory: ``save_dir``.
+    sampling : string, default="bootstrap"
+        Specify how to sample the training data for each base estimator,
+        should be one of {``bootstrap``, ``poisson``}.
+
+        - If ``bootstrap``, a bootstrap replicate of the training dataset
+          is drawn for each base estimator, and each base estimator is
+          fitted on its own dataloader.
+        - If ``poisson``, each data batch is loaded only once and shared by
+          all base estimators. For each base estimator, the number of
+          occurrences of each sample in the batch is drawn from a Poisson
+          distribution with mean 1 (i.e., online bagging). Base estimators
+          are fitted on each data batch concurrently by a pool of ``n_jobs``
+          threads in the current process.
+    joint_optimizer : bool, default=False
+        Specify whether to update all base estimators with a single
+        multi-tensor optimizer, which has one parameter group for each base
+        estimator, instead of one optimizer per base estimator. It reduces
+        the overhead of the optimizer when fitting many small base
+        estimators, and requires ``sampling="poisson"``, where all base
+        estimators are updated on each data batch in the current process.
+        It is not supported by the parallel backends set by
+        :meth:`set_parallel_backend`, including ``threading`` and
+        ``shared_memory``, where each worker fits its own base estimators
+        over the whole training epoch.
+"""
+
+
+def _bagging_model_doc(header, item="fit"):
+    """
+    Decorator on obtaining documentation for different bagging models.
+    """
+
+    def get_doc(item):
+        """Return selected item"""
+        __doc = {"fit": __fit_doc}
+        return __doc[item]
+
+    def adddoc(cls):
+        doc = [header + "\n\n"]
+        doc.extend(get_doc(item))
+        cls.__doc__ = "".join(doc)
+        return cls
+
+    return adddoc
+
+
 def _parallel_fit_per_epoch(
     train_loader,
     estimator,
@@ -34,6 +111,7 @@ def _parallel_fit_per_epoch(
     log_interval,
     device,
     is_classification,
+    precision="fp32",
 ):
     """
     Private function used to fit base estimators in parallel.
@@ -51,8 +129,9 @@ def _parallel_fit_per_epoch(
         batch_size = data[0].size(0)
 
         optimizer.zero_grad()
-        output = estimator(*data)
-        loss = criterion(output, target)
+        with set_module.autocast(precision, device):
+            output = estimator(*data)
+            loss = criterion(output, target)
         loss.backward()
         optimizer.step()
 
@@ -83,6 +162,84 @@ def _parallel_fit_per_epoch(
     return estimator, optimizer
 
 
+def _poisson_fit_per_batch(
+    data,
+    target,
+    estimator,
+    optimizer,
+    criterion,
+    idx,
+    epoch,
+    batch_idx,
+    log_interval,
+    device,
+    is_classification,
+    precision="fp32",
+):
+    """
+    Private function used to fit a base estimator on a data batch with online
+    bagging, where the number of occurrences of each sample is drawn from a
+    Poisson distribution with mean 1. If ``optimizer`` is ``None``, only the
+    gradients are computed, and the base estimator is updated by the caller.
+    """
+    batch_size = data[0].size(0)
+    counts = torch.poisson(torch.ones(batch_size, device=device)).long()
+    indices = torch.repeat_interleave(
+        torch.arange(batch_size, device=device), counts
+    )
+
+    # Skip the batch if no sample is drawn
+    if indices.size(0) == 0:
+        return
+
+    data = [tensor[indices] for tensor in data]
+    target = target[indices]
+
+    if optimizer is not None:
+        optimizer.zero_grad()
+    with set_module.autocast(precision, device):
+        output = estimator(*data)
+        loss = criterion(output, target)
+    loss.backward()
+    if optimizer is not None:
+        optimizer.step()
+
+    # Print training status
+    if batch_idx % log_interval == 0:
+
+        # Classification
+        if is_classification:
+            _, predicted = torch.max(output.data, 1)
+            correct = (predicted == target).sum().item()
+
+            msg = (
+                "Estimator: {:03d} | Epoch: {:03d} | Batch: {:03d}"
+                " | Loss: {:.5f} | Correct: {:d}/{:d}"
+            )
+            print(
+                msg.format(
+                    idx, epoch, batch_idx, loss, correct, indices.size(0)
+                )
+            )
+        else:
+            msg = (
+                "Estimator: {:03d} | Epoch: {:03d} | Batch: {:03d}"
+                " | Loss: {:.5f}"
+            )
+            print(msg.format(idx, epoch, batch_idx, loss))
+
+
+def _validate_sampling(sampling, logger):
+    """Validate the sampling strategy on training the ensemble."""
+    if sampling not in ("bootstrap", "poisson"):
+        msg = (
+            "The sampling strategy should be one of {{bootstrap, poisson}},"
+            " but got {} instead."
+        )
+        logger.error(msg.format(sampling))
+        raise ValueError(msg.format(sampling))
+
+
 @torchensemble_model_doc(
     """Implementation on the BaggingClassifier.""", "model"
 )
@@ -93,6 +250,10 @@ class BaggingClassifier(BaseClassifier):
     )
     def forward(self, *x):
         # Average over class distributions from all base estimators.
+        if self._use_stacked_forward():
+            outputs = F.softmax(self._stacked_forward(*x), dim=2)
+            return outputs.mean(dim=0)
+
         outputs = [
             F.softmax(estimator(*x), dim=1) for estimator in self.estimators_
         ]
@@ -122,6 +283,20 @@ class BaggingClassifier(BaseClassifier):
         super().set_criterion(criterion)
 
     @torchensemble_model_doc(
+        """Set the parallel backend for BaggingClassifier.""",
+        "set_parallel_backend",
+    )
+    def set_parallel_backend(self, backend, **kwargs):
+        super().set_parallel_backend(backend, **kwargs)
+
+    @torchensemble_model_doc(
+        """Set the forward mode for BaggingClassifier.""",
+        "set_forward_mode",
+    )
+    def set_forward_mode(self, mode, training=False):
+        super().set_forward_mode(mode, training)
+
+    @_bagging_model_doc(
         """Implementation on the training stage of BaggingClassifier.""", "fit"
     )
     def fit(
@@ -132,9 +307,18 @@ class BaggingClassifier(BaseClassifier):
         test_loader=None,
         save_model=True,
         save_dir=None,
+        sampling="bootstrap",
+        joint_optimizer=False,
     ):
 
         self._validate_parameters(epochs, log_interval)
+        _validate_sampling(sampling, self.logger)
+        set_module.check_joint_optimizer(
+            joint_optimizer,
+            sampling == "poisson",
+            'sampling="poisson"',
+            self.logger,
+        )
         self.n_outputs = self._decide_n_outputs(train_loader)
 
         # Instantiate a pool of base estimators, optimizers, and schedulers.
@@ -142,13 +326,7 @@ class BaggingClassifier(BaseClassifier):
         for _ in range(self.n_estimators):
             estimators.append(self._make_estimator())
 
-        optimizers = []
-        for i in range(self.n_estimators):
-            optimizers.append(
-                set_module.set_optimizer(
-                    estimators[i], self.optimizer_name, **self.optimizer_args
-                )
-            )
+        optimizers = self._make_optimizers(estimators, joint_optimizer)
 
         if self.use_scheduler_:
             scheduler_ = set_module.set_scheduler(
@@ -162,23 +340,44 @@ class BaggingClassifier(BaseClassifier):
         # Utils
         best_acc = 0.0
 
-        # Internal helper function on pesudo forward
-        def _forward(estimators, *x):
-            outputs = [
-                F.softmax(estimator(*x), dim=1) for estimator in estimators
-            ]
-            proba = op.average(outputs)
-
-            return proba
-
-        # Turn train_loader into a list of train_loaders,
-        # sampling with replacement
-        train_loader = _get_bagging_dataloaders(
-            train_loader, self.n_estimators
-        )
+        # Online bagging shares each data batch among all base estimators
+        if sampling == "poisson":
+            trainer = LockstepTrainer(
+                _poisson_fit_per_batch,
+                estimators,
+                optimizers,
+                [train_loader],
+                n_jobs=self.n_jobs,
+                backend_args={"joint_optimizer": joint_optimizer},
+                criterion=self._criterion,
+                log_interval=log_interval,
+                device=self.device,
+                is_classification=True,
+                precision=self.precision_,
+            )
+        else:
+            # Turn train_loader into a list of train_loaders,
+            # sampling with replacement
+            train_loader = _get_bagging_dataloaders(
+                train_loader, self.n_estimators
+            )
 
-        # Maintain a pool of workers
-        with Parallel(n_jobs=self.n_jobs) as parallel:
+            # Maintain a pool of workers
+            trainer = get_trainer(
+                self.parallel_backend_,
+                _parallel_fit_per_epoch,
+                estimators,
+                optimizers,
+                train_loader,
+                n_jobs=self.n_jobs,
+                backend_args=self.parallel_backend_args_,
+                criterion=self._criterion,
+                log_interval=log_interval,
+                device=self.device,
+                is_classification=True,
+                precision=self.precision_,
+            )
+        with trainer, io.CheckpointWriter(self.logger) as writer:
 
             # Training loop
             for epoch in range(epochs):
@@ -193,51 +392,27 @@ class BaggingClassifier(BaseClassifier):
                     msg = "Parallelization on the training epoch: {:03d}"
                     self.logger.info(msg.format(epoch))
 
-                rets = parallel(
-                    delayed(_parallel_fit_per_epoch)(
-                        dataloader,
-                        estimator,
-                        cur_lr,
-                        optimizer,
-                        self._criterion,
-                        idx,
-                        epoch,
-                        log_interval,
-                        self.device,
-                        True,
-                    )
-                    for idx, (estimator, optimizer, dataloader) in enumerate(
-                        zip(estimators, optimizers, train_loader)
-                    )
-                )
-
-                estimators, optimizers = [], []
-                for estimator, optimizer in rets:
-                    estimators.append(estimator)
-                    optimizers.append(optimizer)
+                trainer.fit_per_epoch(epoch, cur_lr)
+                self._clear_caches()
+                estimators = trainer.estimators
 
                 # Validation
                 if test_loader:
                     self.eval()
                     with torch.no_grad():
-                        correct = 0
-                        total = 0
-                        for _, elem in enumerate(test_loader):
-                            data, target = io.split_data_target(
-                                elem, self.device
-                            )
-                            output = _forward(estimators, *data)
-                            _, predicted = torch.max(output.data, 1)
-                            correct += (predicted == target).sum().item()
-                            total += target.size(0)
-                        acc = 100 * correct / total
+                        batches = self._collect_outputs(
+                            estimators, test_loader
+                        )
+                        acc = self._evaluate_outputs(batches)
 
                         if acc > best_acc:
                             best_acc = acc
                             self.estimators_ = nn.ModuleList()
                             self.estimators_.extend(estimators)
                             if save_model:
-                                io.save(self, save_dir, self.logger)
+                                writer.save(
+                                    self, save_dir, copy=trainer.in_place
+                                )
 
                         msg = (
                             "Epoch: {:03d} | Validation Acc: {:.3f}"
@@ -264,13 +439,29 @@ class BaggingClassifier(BaseClassifier):
         if save_model and not test_loader:
             io.save(self, save_dir, self.logger)
 
+    def _aggregate_outputs(self, outputs):
+        """Average over class distributions from all base estimators."""
+        return F.softmax(outputs, dim=2).mean(0)
+
     @torchensemble_model_doc(item="classifier_evaluate")
     def evaluate(self, test_loader, return_loss=False):
-        return super().evaluate(test_loader, return_loss)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches, return_loss)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
+
+    @torchensemble_model_doc(
+        """Cascade prediction of BaggingClassifier.""", "predict_cascade"
+    )
+    def predict_cascade(
+        self, *x, threshold, criterion="margin", min_estimators=2
+    ):
+        return self._predict_cascade(
+            x, threshold, criterion, min_estimators, average_proba=True
+        )
 
 
 @torchensemble_model_doc(
@@ -283,6 +474,9 @@ class BaggingRegressor(BaseRegressor):
     )
     def forward(self, *x):
         # Average over predictions from all base estimators.
+        if self._use_stacked_forward():
+            return self._stacked_forward(*x).mean(dim=0)
+
         outputs = [estimator(*x) for estimator in self.estimators_]
         pred = op.average(outputs)
 
@@ -310,6 +504,20 @@ class BaggingRegressor(BaseRegressor):
         super().set_criterion(criterion)
 
     @torchensemble_model_doc(
+        """Set the parallel backend for BaggingRegressor.""",
+        "set_parallel_backend",
+    )
+    def set_parallel_backend(self, backend, **kwargs):
+        super().set_parallel_backend(backend, **kwargs)
+
+    @torchensemble_model_doc(
+        """Set the forward mode for BaggingRegressor.""",
+        "set_forward_mode",
+    )
+    def set_forward_mode(self, mode, training=False):
+        super().set_forward_mode(mode, training)
+
+    @_bagging_model_doc(
         """Implementation on the training stage of BaggingRegressor.""", "fit"
     )
     def fit(
@@ -320,9 +528,18 @@ class BaggingRegressor(BaseRegressor):
         test_loader=None,
         save_model=True,
         save_dir=None,
+        sampling="bootstrap",
+        joint_optimizer=False,
     ):
 
         self._validate_parameters(epochs, log_interval)
+        _validate_sampling(sampling, self.logger)
+        set_module.check_joint_optimizer(
+            joint_optimizer,
+            sampling == "poisson",
+            'sampling="poisson"',
+            self.logger,
+        )
         self.n_outputs = self._decide_n_outputs(train_loader)
 
         # Instantiate a pool of base estimators, optimizers, and schedulers.
@@ -330,13 +547,7 @@ class BaggingRegressor(BaseRegressor):
         for _ in range(self.n_estimators):
             estimators.append(self._make_estimator())
 
-        optimizers = []
-        for i in range(self.n_estimators):
-            optimizers.append(
-                set_module.set_optimizer(
-                    estimators[i], self.optimizer_name, **self.optimizer_args
-                )
-            )
+        optimizers = self._make_optimizers(estimators, joint_optimizer)
 
         if self.use_scheduler_:
             scheduler_ = set_module.set_scheduler(
@@ -350,21 +561,44 @@ class BaggingRegressor(BaseRegressor):
         # Utils
         best_loss = float("inf")
 
-        # Internal helper function on pesudo forward
-        def _forward(estimators, *x):
-            outputs = [estimator(*x) for estimator in estimators]
-            pred = op.average(outputs)
-
-            return pred
-
-        # Turn train_loader into a list of train_loaders,
-        # sampling with replacement
-        train_loader = _get_bagging_dataloaders(
-            train_loader, self.n_estimators
-        )
+        # Online bagging shares each data batch among all base estimators
+        if sampling == "poisson":
+            trainer = LockstepTrainer(
+                _poisson_fit_per_batch,
+                estimators,
+                optimizers,
+                [train_loader],
+                n_jobs=self.n_jobs,
+                backend_args={"joint_optimizer": joint_optimizer},
+                criterion=self._criterion,
+                log_interval=log_interval,
+                device=self.device,
+                is_classification=False,
+                precision=self.precision_,
+            )
+        else:
+            # Turn train_loader into a list of train_loaders,
+            # sampling with replacement
+            train_loader = _get_bagging_dataloaders(
+                train_loader, self.n_estimators
+            )
 
-        # Maintain a pool of workers
-        with Parallel(n_jobs=self.n_jobs) as parallel:
+            # Maintain a pool of workers
+            trainer = get_trainer(
+                self.parallel_backend_,
+                _parallel_fit_per_epoch,
+                estimators,
+                optimizers,
+                train_loader,
+                n_jobs=self.n_jobs,
+                backend_args=self.parallel_backend_args_,
+                criterion=self._criterion,
+                log_interval=log_interval,
+                device=self.device,
+                is_classification=False,
+                precision=self.precision_,
+            )
+        with trainer, io.CheckpointWriter(self.logger) as writer:
 
             # Training loop
             for epoch in range(epochs):
@@ -379,48 +613,27 @@ class BaggingRegressor(BaseRegressor):
                     msg = "Parallelization on the training epoch: {:03d}"
                     self.logger.info(msg.format(epoch))
 
-                rets = parallel(
-                    delayed(_parallel_fit_per_epoch)(
-                        dataloader,
-                        estimator,
-                        cur_lr,
-                        optimizer,
-                        self._criterion,
-                        idx,
-                        epoch,
-                        log_interval,
-                        self.device,
-                        False,
-                    )
-                    for idx, (estimator, optimizer, dataloader) in enumerate(
-                        zip(estimators, optimizers, train_loader)
-                    )
-                )
-
-                estimators, optimizers = [], []
-                for estimator, optimizer in rets:
-                    estimators.append(estimator)
-                    optimizers.append(optimizer)
+                trainer.fit_per_epoch(epoch, cur_lr)
+                self._clear_caches()
+                estimators = trainer.estimators
 
                 # Validation
                 if test_loader:
                     self.eval()
                     with torch.no_grad():
-                        val_loss = 0.0
-                        for _, elem in enumerate(test_loader):
-                            data, target = io.split_data_target(
-                                elem, self.device
-                            )
-                            output = _forward(estimators, *data)
-                            val_loss += self._criterion(output, target)
-                        val_loss /= len(test_loader)
+                        batches = self._collect_outputs(
+                            estimators, test_loader
+                        )
+                        val_loss = self._evaluate_outputs(batches)
 
                         if val_loss < best_loss:
                             best_loss = val_loss
                             self.estimators_ = nn.ModuleList()
                             self.estimators_.extend(estimators)
                             if save_model:
-                                io.save(self, save_dir, self.logger)
+                                writer.save(
+                                    self, save_dir, copy=trainer.in_place
+                                )
 
                         msg = (
                             "Epoch: {:03d} | Validation Loss:"
@@ -446,13 +659,19 @@ class BaggingRegressor(BaseRegressor):
         if save_model and not test_loader:
             io.save(self, save_dir, self.logger)
 
+    def _aggregate_outputs(self, outputs):
+        """Average over predictions from all base estimators."""
+        return outputs.mean(0)
+
     @torchensemble_model_doc(item="regressor_evaluate")
     def evaluate(self, test_loader):
-        return super().evaluate(test_loader)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
 
 
 def _get_bagging_dataloaders(original_dataloader, n_estimators):
@@ -21,6 +21,7 @@ from ._base import torchensemble_model_doc
 from .utils import io
 from .utils import set_module
 from .utils import operator as op
+from .utils.cache import ValidationCache
 from .utils.logging import get_tb_logger
 
 
@@ -64,6 +65,16 @@ __fit_doc = """
         - If ``None``, the model will be saved in the current directory.
         - If not ``None``, the model will be saved in the specified
           directory: ``save_dir``.
+    average_weights : bool, default=False
+        Specify how snapshots are combined into the ensemble.
+
+        - If ``False``, each snapshot is kept as a base estimator, and the
+          outputs of all snapshots are averaged at inference.
+        - If ``True``, the ensemble keeps one base estimator with the running
+          average over weights of all snapshots, and statistics of batch
+          normalization layers are recomputed on ``train_loader`` before
+          each validation and at the end of the training stage. Only one
+          base estimator is evaluated at inference.
 """
 
 
@@ -109,6 +120,9 @@ class _BaseFastGeometric(BaseModule):
 
         self.estimators_ = nn.ModuleList()
         self.use_scheduler_ = False
+        self.checkpoint_format_ = "file"
+        self.precision_ = "fp32"
+        self._validation_cache = ValidationCache()
 
     def _forward(self, *x):
         """
@@ -224,9 +238,11 @@ class FastGeometricClassifier(_BaseFastGeometric, BaseClassifier):
         test_loader=None,
         save_model=True,
         save_dir=None,
+        average_weights=False,
     ):
         self._validate_parameters(epochs, log_interval)
         self.n_outputs = self._decide_n_outputs(train_loader)
+        self.n_snapshots_ = len(self.estimators_)
 
         # ====================================================================
         #                Train the dummy estimator (estimator_)
@@ -261,8 +277,9 @@ class FastGeometricClassifier(_BaseFastGeometric, BaseClassifier):
                 batch_size = data[0].size(0)
 
                 optimizer.zero_grad()
-                output = estimator_(*data)
-                loss = self._criterion(output, target)
+                with set_module.autocast(self.precision_, self.device):
+                    output = estimator_(*data)
+                    loss = self._criterion(output, target)
                 loss.backward()
                 optimizer.step()
 
@@ -312,7 +329,7 @@ class FastGeometricClassifier(_BaseFastGeometric, BaseClassifier):
         updated = False
         epoch = 0
 
-        while len(self.estimators_) < self.n_estimators:
+        while self.n_snapshots_ < self.n_estimators:
 
             # Training
             estimator_.train()
@@ -327,8 +344,9 @@ class FastGeometricClassifier(_BaseFastGeometric, BaseClassifier):
                 batch_size = data[0].size(0)
 
                 optimizer.zero_grad()
-                output = estimator_(*data)
-                loss = self._criterion(output, target)
+                with set_module.autocast(self.precision_, self.device):
+                    output = estimator_(*data)
+                    loss = self._criterion(output, target)
                 loss.backward()
                 optimizer.step()
 
@@ -355,7 +373,7 @@ class FastGeometricClassifier(_BaseFastGeometric, BaseClassifier):
                         if self.tb_logger:
                             self.tb_logger.add_scalar(
                                 "fast_geometric/Ensemble-Est_{}".format(
-                                    len(self.estimators_)
+                                    self.n_snapshots_
                                 )
                                 + "/Train_Loss",
                                 loss,
@@ -365,28 +383,22 @@ class FastGeometricClassifier(_BaseFastGeometric, BaseClassifier):
 
             # Update the ensemble
             if (epoch % cycle + 1) == cycle // 2:
-                base_estimator = self._make_estimator()
-                base_estimator.load_state_dict(estimator_.state_dict())
-                self.estimators_.append(base_estimator)
+                self._add_snapshot(estimator_, average_weights)
                 updated = True
                 total_iters = 0
 
                 msg = "Save the base estimator with index: {}"
-                self.logger.info(msg.format(len(self.estimators_) - 1))
+                self.logger.info(msg.format(self.n_snapshots_ - 1))
 
             # Validation after each base estimator being added
             if test_loader and updated:
+                self._refresh_bn(train_loader)
                 self.eval()
                 with torch.no_grad():
-                    correct = 0
-                    total = 0
-                    for _, elem in enumerate(test_loader):
-                        data, target = io.split_data_target(elem, self.device)
-                        output = self.forward(*data)
-                        _, predicted = torch.max(output.data, 1)
-                        correct += (predicted == target).sum().item()
-                        total += target.size(0)
-                    acc = 100 * correct / total
+                    batches = self._collect_outputs(
+                        self.estimators_, test_loader
+                    )
+                    acc = self._evaluate_outputs(batches)
 
                     if acc > best_acc:
                         best_acc = acc
@@ -398,27 +410,55 @@ class FastGeometricClassifier(_BaseFastGeometric, BaseClassifier):
                         " | Historical Best: {:.3f} %"
                     )
                     self.logger.info(
-                        msg.format(len(self.estimators_), acc, best_acc)
+                        msg.format(self.n_snapshots_, acc, best_acc)
                     )
                     if self.tb_logger:
                         self.tb_logger.add_scalar(
                             "fast_geometric/Ensemble_Est/Validation_Acc",
                             acc,
-                            len(self.estimators_),
+                            self.n_snapshots_,
                         )
                 updated = False  # reset the updating flag
             epoch += 1
 
+        self._refresh_bn(train_loader)
         if save_model and not test_loader:
             io.save(self, save_dir, self.logger)
 
+    def _aggregate_outputs(self, outputs):
+        """Average over outputs from all base estimators before softmax."""
+        return F.softmax(outputs.mean(0), dim=1)
+
     @torchensemble_model_doc(item="classifier_evaluate")
     def evaluate(self, test_loader, return_loss=False):
-        return super().evaluate(test_loader, return_loss)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches, return_loss)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
+
+    def _staged_output(self, accumulated, n_estimators):
+        return F.softmax(accumulated / n_estimators, dim=1)
+
+    @torchensemble_model_doc(item="staged_predict")
+    def staged_predict(self, *x):
+        return self._staged_predict(*x)
+
+    @torchensemble_model_doc(item="classifier_staged_evaluate")
+    def staged_evaluate(self, test_loader, return_loss=False):
+        return self._staged_evaluate(test_loader, return_loss)
+
+    @torchensemble_model_doc(
+        """Cascade prediction of FastGeometricClassifier.""", "predict_cascade"
+    )
+    def predict_cascade(
+        self, *x, threshold, criterion="margin", min_estimators=2
+    ):
+        return self._predict_cascade(
+            x, threshold, criterion, min_estimators, average_proba=False
+        )
 
 
 @torchensemble_model_doc(
@@ -477,9 +517,11 @@ class FastGeometricRegressor(_BaseFastGeometric, BaseRegressor):
         test_loader=None,
         save_model=True,
         save_dir=None,
+        average_weights=False,
     ):
         self._validate_parameters(epochs, log_interval)
         self.n_outputs = self._decide_n_outputs(train_loader)
+        self.n_snapshots_ = len(self.estimators_)
 
         # ====================================================================
         #                Train the dummy estimator (estimator_)
@@ -513,8 +555,9 @@ class FastGeometricRegressor(_BaseFastGeometric, BaseRegressor):
                 data, target = io.split_data_target(elem, self.device)
 
                 optimizer.zero_grad()
-                output = estimator_(*data)
-                loss = self._criterion(output, target)
+                with set_module.autocast(self.precision_, self.device):
+                    output = estimator_(*data)
+                    loss = self._criterion(output, target)
                 loss.backward()
                 optimizer.step()
 
@@ -550,7 +593,7 @@ class FastGeometricRegressor(_BaseFastGeometric, BaseRegressor):
         updated = False
         epoch = 0
 
-        while len(self.estimators_) < self.n_estimators:
+        while self.n_snapshots_ < self.n_estimators:
 
             # Training
             estimator_.train()
@@ -564,8 +607,9 @@ class FastGeometricRegressor(_BaseFastGeometric, BaseRegressor):
                 data, target = io.split_data_target(elem, self.device)
 
                 optimizer.zero_grad()
-                output = estimator_(*data)
-                loss = self._criterion(output, target)
+                with set_module.autocast(self.precision_, self.device):
+                    output = estimator_(*data)
+                    loss = self._criterion(output, target)
                 loss.backward()
                 optimizer.step()
 
@@ -577,7 +621,7 @@ class FastGeometricRegressor(_BaseFastGeometric, BaseRegressor):
                         if self.tb_logger:
                             self.tb_logger.add_scalar(
                                 "fast_geometric/Ensemble-Est_{}".format(
-                                    len(self.estimators_)
+                                    self.n_snapshots_
                                 )
                                 + "/Train_Loss",
                                 loss,
@@ -587,25 +631,22 @@ class FastGeometricRegressor(_BaseFastGeometric, BaseRegressor):
 
             # Update the ensemble
             if (epoch % cycle + 1) == cycle // 2:
-                base_estimator = self._make_estimator()
-                base_estimator.load_state_dict(estimator_.state_dict())
-                self.estimators_.append(base_estimator)
+                self._add_snapshot(estimator_, average_weights)
                 updated = True
                 total_iters = 0
 
                 msg = "Save the base estimator with index: {}"
-                self.logger.info(msg.format(len(self.estimators_) - 1))
+                self.logger.info(msg.format(self.n_snapshots_ - 1))
 
             # Validation after each base estimator being added
             if test_loader and updated:
+                self._refresh_bn(train_loader)
                 self.eval()
                 with torch.no_grad():
-                    val_loss = 0.0
-                    for _, elem in enumerate(test_loader):
-                        data, target = io.split_data_target(elem, self.device)
-                        output = self.forward(*data)
-                        val_loss += self._criterion(output, target)
-                    val_loss /= len(test_loader)
+                    batches = self._collect_outputs(
+                        self.estimators_, test_loader
+                    )
+                    val_loss = self._evaluate_outputs(batches)
 
                     if val_loss < best_loss:
                         best_loss = val_loss
@@ -621,18 +662,36 @@ class FastGeometricRegressor(_BaseFastGeometric, BaseRegressor):
                         self.tb_logger.add_scalar(
                             "fast_geometric/Ensemble_Est/Validation_Loss",
                             val_loss,
-                            len(self.estimators_),
+                            self.n_snapshots_,
                         )
                 updated = False  # reset the updating flag
             epoch += 1
 
+        self._refresh_bn(train_loader)
         if save_model and not test_loader:
             io.save(self, save_dir, self.logger)
 
+    def _aggregate_outputs(self, outputs):
+        """Average over predictions from all base estimators."""
+        return outputs.mean(0)
+
     @torchensemble_model_doc(item="regressor_evaluate")
     def evaluate(self, test_loader):
-        return super().evaluate(test_loader)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
+
+    def _staged_output(self, accumulated, n_estimators):
+        return accumulated / n_estimators
+
+    @torchensemble_model_doc(item="staged_predict")
+    def staged_predict(self, *x):
+        return self._staged_predict(*x)
+
+    @torchensemble_model_doc(item="regressor_staged_evaluate")
+    def staged_evaluate(self, test_loader):
+        return self._staged_evaluate(test_loader)
@@ -24,11 +24,18 @@ __all__ = ["FusionClassifier", "FusionRegressor"]
     """Implementation on the FusionClassifier.""", "model"
 )
 class FusionClassifier(BaseClassifier):
+    _supports_stacked_training = True
+
     def _forward(self, *x):
         """
         Implementation on the internal data forwarding in FusionClassifier.
         """
         # Average
+        if self._use_stacked_training():
+            return self._stacked_training_forward(*x).mean(dim=0)
+        if self._use_stacked_forward():
+            return self._stacked_forward(*x).mean(dim=0)
+
         outputs = [estimator(*x) for estimator in self.estimators_]
         output = op.average(outputs)
 
@@ -65,6 +72,13 @@ class FusionClassifier(BaseClassifier):
     def set_criterion(self, criterion):
         super().set_criterion(criterion)
 
+    @torchensemble_model_doc(
+        """Set the forward mode for FusionClassifier.""",
+        "set_forward_mode",
+    )
+    def set_forward_mode(self, mode, training=False):
+        super().set_forward_mode(mode, training)
+
     @torchensemble_model_doc(
         """Implementation on the training stage of FusionClassifier.""", "fit"
     )
@@ -110,8 +124,9 @@ class FusionClassifier(BaseClassifier):
                 batch_size = data[0].size(0)
 
                 optimizer.zero_grad()
-                output = self._forward(*data)
-                loss = self._criterion(output, target)
+                with set_module.autocast(self.precision_, self.device):
+                    output = self._forward(*data)
+                    loss = self._criterion(output, target)
                 loss.backward()
                 optimizer.step()
 
@@ -140,15 +155,10 @@ class FusionClassifier(BaseClassifier):
             if test_loader:
                 self.eval()
                 with torch.no_grad():
-                    correct = 0
-                    total = 0
-                    for _, elem in enumerate(test_loader):
-                        data, target = io.split_data_target(elem, self.device)
-                        output = self.forward(*data)
-                        _, predicted = torch.max(output.data, 1)
-                        correct += (predicted == target).sum().item()
-                        total += target.size(0)
-                    acc = 100 * correct / total
+                    batches = self._collect_outputs(
+                        self.estimators_, test_loader
+                    )
+                    acc = self._evaluate_outputs(batches)
 
                     if acc > best_acc:
                         best_acc = acc
@@ -172,23 +182,36 @@ class FusionClassifier(BaseClassifier):
         if save_model and not test_loader:
             io.save(self, save_dir, self.logger)
 
+    def _aggregate_outputs(self, outputs):
+        """Average over outputs from all base estimators before softmax."""
+        return F.softmax(outputs.mean(0), dim=1)
+
     @torchensemble_model_doc(item="classifier_evaluate")
     def evaluate(self, test_loader, return_loss=False):
-        return super().evaluate(test_loader, return_loss)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches, return_loss)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
 
 
 @torchensemble_model_doc("""Implementation on the FusionRegressor.""", "model")
 class FusionRegressor(BaseRegressor):
+    _supports_stacked_training = True
+
     @torchensemble_model_doc(
         """Implementation on the data forwarding in FusionRegressor.""",
         "regressor_forward",
     )
     def forward(self, *x):
         # Average
+        if self._use_stacked_training():
+            return self._stacked_training_forward(*x).mean(dim=0)
+        if self._use_stacked_forward():
+            return self._stacked_forward(*x).mean(dim=0)
+
         outputs = [estimator(*x) for estimator in self.estimators_]
         pred = op.average(outputs)
 
@@ -215,6 +238,13 @@ class FusionRegressor(BaseRegressor):
     def set_criterion(self, criterion):
         super().set_criterion(criterion)
 
+    @torchensemble_model_doc(
+        """Set the forward mode for FusionRegressor.""",
+        "set_forward_mode",
+    )
+    def set_forward_mode(self, mode, training=False):
+        super().set_forward_mode(mode, training)
+
     @torchensemble_model_doc(
         """Implementation on the training stage of FusionRegressor.""", "fit"
     )
@@ -258,8 +288,9 @@ class FusionRegressor(BaseRegressor):
                 data, target = io.split_data_target(elem, self.device)
 
                 optimizer.zero_grad()
-                output = self.forward(*data)
-                loss = self._criterion(output, target)
+                with set_module.autocast(self.precision_, self.device):
+                    output = self.forward(*data)
+                    loss = self._criterion(output, target)
                 loss.backward()
                 optimizer.step()
 
@@ -278,12 +309,10 @@ class FusionRegressor(BaseRegressor):
             if test_loader:
                 self.eval()
                 with torch.no_grad():
-                    val_loss = 0.0
-                    for _, elem in enumerate(test_loader):
-                        data, target = io.split_data_target(elem, self.device)
-                        output = self.forward(*data)
-                        val_loss += self._criterion(output, target)
-                    val_loss /= len(test_loader)
+                    batches = self._collect_outputs(
+                        self.estimators_, test_loader
+                    )
+                    val_loss = self._evaluate_outputs(batches)
 
                     if val_loss < best_loss:
                         best_loss = val_loss
@@ -307,10 +336,16 @@ class FusionRegressor(BaseRegressor):
         if save_model and not test_loader:
             io.save(self, save_dir, self.logger)
 
+    def _aggregate_outputs(self, outputs):
+        """Average over predictions from all base estimators."""
+        return outputs.mean(0)
+
     @torchensemble_model_doc(item="regressor_evaluate")
     def evaluate(self, test_loader):
-        return super().evaluate(test_loader)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
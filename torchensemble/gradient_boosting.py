@@ -12,12 +12,16 @@ import logging
 import warnings
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.utils.data import SequentialSampler
 
 from ._base import BaseModule, BaseClassifier, BaseRegressor
 from ._base import torchensemble_model_doc
 from .utils import io
 from .utils import set_module
 from .utils import operator as op
+from .utils.cache import OutputCache, ValidationCache
+from .utils.dataloder import IndexedDataLoader, is_indexable
+from .utils.dataloder import make_sequential_dataloader
 from .utils.logging import get_tb_logger
 
 
@@ -92,6 +96,54 @@ __fit_doc = """
         - If ``None``, the model will be saved in the current directory.
         - If not ``None``, the model will be saved in the specified
           directory: ``save_dir``.
+    use_cache : bool, default=False
+        Whether to cache the accumulated outputs of base estimators fitted
+        before on each training sample. When enabled, each fitted base
+        estimator is evaluated once on the training data after it is
+        fitted, instead of being re-evaluated on every training batch of
+        all subsequent base estimators. The cache is only available when
+        ``train_loader`` is a :mod:`DataLoader` with a map-style dataset.
+        Since the outputs on each sample are computed only once, the cache
+        assumes that samples in the dataset and outputs of fitted base
+        estimators are deterministic, e.g., without random data
+        augmentation or dropout in training mode. Enable it only when this
+        holds, otherwise the cached outputs differ from the outputs that
+        would be recomputed on each training batch.
+    cache_dir : string, default=None
+        Specify where to store the cached outputs.
+
+        - If ``None``, the cached outputs are kept in memory.
+        - If not ``None``, the cached outputs are stored in a memory-mapped
+          file under the specified directory: ``cache_dir``.
+"""
+
+
+__predict_early_exit_doc = """
+    Return the predictions of the ensemble given the testing data, where
+    base estimators are evaluated in order and the evaluation on each sample
+    stops once its prediction is decided.
+
+    Parameters
+    ----------
+    X : {tensor, numpy array}
+        A data batch in the form of tensor or numpy array.
+    threshold : float
+        The threshold on deciding the prediction of a sample.
+
+        - For classifiers, a sample is decided once the margin between the
+          largest and the second largest class probability is no less than
+          ``threshold``, which should be in the range [0, 1].
+        - For regressors, a sample is decided once the largest absolute
+          value of the update from the latest base estimator is no larger
+          than ``threshold``, which should be non-negative.
+
+    Returns
+    -------
+    pred : tensor of shape (n_samples, n_outputs)
+        The predictions of the ensemble, the same as :meth:`predict` for
+        samples that are not decided before the last base estimator.
+    n_stages : tensor of shape (n_samples,)
+        The number of base estimators evaluated on each sample.
 """
 
 
@@ -103,7 +155,11 @@ def _gradient_boosting_model_doc(header, item="model"):
 
     def get_doc(item):
         """Return the selected item"""
-        __doc = {"model": __model_doc, "fit": __fit_doc}
+        __doc = {
+            "model": __model_doc,
+            "fit": __fit_doc,
+            "predict_early_exit": __predict_early_exit_doc,
+        }
         return __doc[item]
 
     def adddoc(cls):
@@ -143,6 +199,9 @@ class _BaseGradientBoosting(BaseModule):
 
         self.estimators_ = nn.ModuleList()
         self.use_scheduler_ = False
+        self.checkpoint_format_ = "file"
+        self.precision_ = "fp32"
+        self._validation_cache = ValidationCache()
 
     def _validate_parameters(
         self, epochs, log_interval, early_stopping_rounds
@@ -183,9 +242,35 @@ class _BaseGradientBoosting(BaseModule):
             raise ValueError(msg.format(self.shrinkage_rate))
 
     @abc.abstractmethod
-    def _handle_early_stopping(self, test_loader, est_idx):
+    def _handle_early_stopping(self, test_loader, est_idx, accumulated=None):
         """Decide whether to trigger the internal counter on early stopping."""
 
+    def _validation_outputs(self, test_loader, est_idx, accumulated=None):
+        """
+        Yield the accumulated outputs from the first `est_idx+1` base
+        estimators and the target on each validation batch.
+
+        When `accumulated` is a list, it stores the accumulated outputs on
+        each validation batch across stages, and only the base estimator just
+        fitted is evaluated. Otherwise, all fitted base estimators are
+        evaluated on each validation batch.
+        """
+        self.eval()
+        estimator = self.estimators_[est_idx]
+        for batch_idx, elem in enumerate(test_loader):
+            data, target = io.split_data_target(elem, self.device)
+            with torch.no_grad():
+                if accumulated is None:
+                    output = self._staged_forward(est_idx, *data)
+                else:
+                    output = self.shrinkage_rate * estimator(*data)
+                    if batch_idx < len(accumulated):
+                        accumulated[batch_idx] += output
+                    else:
+                        accumulated.append(output)
+                    output = accumulated[batch_idx]
+            yield output, target
+
     def _staged_forward(self, est_idx, *x):
         """
         Return the accumulated outputs from the first `est_idx+1` base
@@ -206,6 +291,74 @@ class _BaseGradientBoosting(BaseModule):
 
         return out
 
+    @abc.abstractmethod
+    def _validate_early_exit_threshold(self, threshold):
+        """Validate the threshold on the early-exit prediction."""
+
+    @abc.abstractmethod
+    def _is_decided(self, output, update, threshold):
+        """
+        Return a boolean mask on samples whose predictions are decided, given
+        the accumulated outputs and the update from the latest base estimator.
+        """
+
+    @torch.no_grad()
+    def _predict_early_exit(self, threshold, *x):
+        """
+        Return the accumulated outputs and the number of base estimators
+        evaluated on each sample. Decided samples are removed from the active
+        batch forwarded to the remaining base estimators.
+        """
+        self.eval()
+        self._validate_early_exit_threshold(threshold)
+
+        x_active = self._get_predict_batch(x)
+        batch_size = x_active[0].size(0)
+
+        active = torch.arange(batch_size, device=self.device)
+        n_stages = torch.zeros(batch_size, dtype=torch.long)
+        accumulated = None
+
+        for estimator in self.estimators_:
+            output = estimator(*x_active)
+            if accumulated is None:
+                accumulated = torch.zeros(
+                    (batch_size,) + tuple(output.size()[1:]),
+                    dtype=output.dtype,
+                    device=output.device,
+                )
+
+            # Outputs are accumulated before the multiplication with the
+            # shrinkage rate, the same as in `forward`
+            accumulated[active] += output
+            n_stages[active.cpu()] += 1
+
+            decided = self._is_decided(
+                self.shrinkage_rate * accumulated[active],
+                self.shrinkage_rate * output,
+                threshold,
+            )
+            if decided.any():
+                x_active = [data[~decided] for data in x_active]
+                active = active[~decided]
+            if active.size(0) == 0:
+                break
+
+        return self.shrinkage_rate * accumulated, n_stages
+
+    @torch.no_grad()
+    def _update_cache(self, cache, cache_loader, estimator):
+        """
+        Accumulate the outputs of a fitted base estimator into the cache. The
+        base estimator is kept in its current mode, which is the mode used to
+        compute the learning targets of subsequent base estimators without
+        the cache.
+        """
+        for _, (indices, elem) in enumerate(cache_loader):
+            data, _ = io.split_data_target(elem, self.device)
+            output = self.shrinkage_rate * estimator(*data)
+            cache.update(indices, output)
+
     def fit(
         self,
         train_loader,
@@ -216,6 +369,8 @@ class _BaseGradientBoosting(BaseModule):
         early_stopping_rounds=2,
         save_model=True,
         save_dir=None,
+        use_cache=False,
+        cache_dir=None,
     ):
 
         # Instantiate base estimators and set attributes
@@ -230,6 +385,39 @@ class _BaseGradientBoosting(BaseModule):
         )
         n_counter = 0  # a counter on early stopping
 
+        # Cache the accumulated outputs of base estimators fitted before
+        if use_cache and not is_indexable(train_loader):
+            msg = (
+                "The cache on outputs of fitted base estimators is disabled"
+                " since the indices of training samples cannot be recovered"
+                " from `train_loader`."
+            )
+            warnings.warn(msg, RuntimeWarning)
+            use_cache = False
+
+        if use_cache:
+            cache = OutputCache(
+                len(train_loader.dataset), self.device, cache_dir
+            )
+            cache_loader = make_sequential_dataloader(train_loader)
+            train_loader = IndexedDataLoader(train_loader)
+
+        # Keep the accumulated outputs on the validation data across stages,
+        # which requires validation batches to be loaded in the same order
+        val_accumulated = None
+        if test_loader:
+            if isinstance(
+                getattr(test_loader, "sampler", None), SequentialSampler
+            ):
+                val_accumulated = []
+            else:
+                msg = (
+                    "The accumulated outputs on the validation data are not"
+                    " kept across base estimators since `test_loader` does"
+                    " not load data sequentially."
+                )
+                warnings.warn(msg, RuntimeWarning)
+
         for est_idx, estimator in enumerate(self.estimators_):
 
             # Initialize a optimizer and scheduler for each base estimator to
@@ -251,13 +439,23 @@ class _BaseGradientBoosting(BaseModule):
             for epoch in range(epochs):
                 for batch_idx, elem in enumerate(train_loader):
 
+                    if use_cache:
+                        indices, elem = elem
                     data, target = io.split_data_target(elem, self.device)
 
                     # Compute the learning target of the current estimator
-                    residual = self._pseudo_residual(est_idx, target, *data)
+                    if use_cache and not cache.is_empty():
+                        residual = self._pseudo_residual(
+                            est_idx, target, *data, accumulated=cache[indices]
+                        )
+                    else:
+                        residual = self._pseudo_residual(
+                            est_idx, target, *data
+                        )
 
-                    output = estimator(*data)
-                    loss = criterion(output, residual)
+                    with set_module.autocast(self.precision_, self.device):
+                        output = estimator(*data)
+                        loss = criterion(output, residual)
 
                     learner_optimizer.zero_grad()
                     loss.backward()
@@ -287,7 +485,9 @@ class _BaseGradientBoosting(BaseModule):
 
             # Validation
             if test_loader:
-                flag = self._handle_early_stopping(test_loader, est_idx)
+                flag = self._handle_early_stopping(
+                    test_loader, est_idx, val_accumulated
+                )
 
                 if flag:
                     n_counter += 1
@@ -309,6 +509,14 @@ class _BaseGradientBoosting(BaseModule):
                     # Reset the counter if the performance improves
                     n_counter = 0
 
+            # Update the cache with the base estimator just fitted, after
+            # the validation which may switch it into the evaluating mode
+            if use_cache and est_idx < len(self.estimators_) - 1:
+                self._update_cache(cache, cache_loader, estimator)
+
+        if use_cache:
+            cache.clear()
+
         # Post-processing
         msg = "The optimal number of base estimators: {}"
         self.logger.info(msg.format(len(self.estimators_)))
@@ -320,13 +528,19 @@ class _BaseGradientBoosting(BaseModule):
     """Implementation on the GradientBoostingClassifier.""", "model"
 )
 class GradientBoostingClassifier(_BaseGradientBoosting, BaseClassifier):
-    def _pseudo_residual(self, est_idx, y, *x):
-        """Compute pseudo residuals in classification."""
+    def _pseudo_residual(self, est_idx, y, *x, accumulated=None):
+        """
+        Compute pseudo residuals in classification. When ``accumulated`` is
+        given, it is used as the accumulated outputs of the first `est_idx`
+        base estimators instead of running them on ``x``.
+        """
         output = torch.zeros(y.size(0), self.n_outputs).to(self.device)
 
         # Before fitting the first estimator, we simply assume that GBM
         # outputs 0 for any input (i.e., a null output).
-        if est_idx > 0:
+        if accumulated is not None:
+            output += accumulated
+        elif est_idx > 0:
             results = [
                 estimator(*x) for estimator in self.estimators_[:est_idx]
             ]
@@ -337,19 +551,17 @@ class GradientBoostingClassifier(_BaseGradientBoosting, BaseClassifier):
 
         return pseudo_residual
 
-    def _handle_early_stopping(self, test_loader, est_idx):
+    def _handle_early_stopping(self, test_loader, est_idx, accumulated=None):
         # Compute the validation accuracy of base estimators fitted so far
-        self.eval()
         correct = 0
         total = 0
         flag = False
-        with torch.no_grad():
-            for _, elem in enumerate(test_loader):
-                data, target = io.split_data_target(elem, self.device)
-                output = F.softmax(self._staged_forward(est_idx, *data), dim=1)
-                _, predicted = torch.max(output.data, 1)
-                correct += (predicted == target).sum().item()
-                total += target.size(0)
+        for output, target in self._validation_outputs(
+            test_loader, est_idx, accumulated
+        ):
+            _, predicted = torch.max(output.data, 1)
+            correct += (predicted == target).sum().item()
+            total += target.size(0)
         acc = 100 * correct / total
 
         if est_idx == 0:
@@ -369,6 +581,22 @@ class GradientBoostingClassifier(_BaseGradientBoosting, BaseClassifier):
 
         return flag
 
+    def _validate_early_exit_threshold(self, threshold):
+        if not 0 <= threshold <= 1:
+            msg = (
+                "The threshold on the margin of class probabilities should be"
+                " in the range [0, 1], but got {} instead."
+            )
+            self.logger.error(msg.format(threshold))
+            raise ValueError(msg.format(threshold))
+
+    def _is_decided(self, output, update, threshold):
+        proba = F.softmax(output, dim=1)
+        top2 = torch.topk(proba, min(2, proba.size(1)), dim=1)[0]
+        margin = top2[:, 0] - top2[:, -1]
+
+        return margin >= threshold
+
     @torchensemble_model_doc(
         """Set the attributes on optimizer for GradientBoostingClassifier.""",
         "set_optimizer",
@@ -397,6 +625,8 @@ class GradientBoostingClassifier(_BaseGradientBoosting, BaseClassifier):
         early_stopping_rounds=2,
         save_model=True,
         save_dir=None,
+        use_cache=False,
+        cache_dir=None,
     ):
         self._criterion = nn.CrossEntropyLoss()
         super().fit(
@@ -408,6 +638,8 @@ class GradientBoostingClassifier(_BaseGradientBoosting, BaseClassifier):
             early_stopping_rounds=early_stopping_rounds,
             save_model=save_model,
             save_dir=save_dir,
+            use_cache=use_cache,
+            cache_dir=cache_dir,
         )
 
     @torchensemble_model_doc(
@@ -421,24 +653,57 @@ class GradientBoostingClassifier(_BaseGradientBoosting, BaseClassifier):
 
         return proba
 
+    def _aggregate_outputs(self, outputs):
+        """Sum over outputs from all base estimators before softmax."""
+        return F.softmax(self.shrinkage_rate * outputs.sum(0), dim=1)
+
     @torchensemble_model_doc(item="classifier_evaluate")
     def evaluate(self, test_loader, return_loss=False):
-        return super().evaluate(test_loader, return_loss)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches, return_loss)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
+
+    def _staged_output(self, accumulated, n_estimators):
+        return F.softmax(self.shrinkage_rate * accumulated, dim=1)
+
+    @torchensemble_model_doc(item="staged_predict")
+    def staged_predict(self, *x):
+        return self._staged_predict(*x)
+
+    @torchensemble_model_doc(item="classifier_staged_evaluate")
+    def staged_evaluate(self, test_loader, return_loss=False):
+        return self._staged_evaluate(test_loader, return_loss)
+
+    @_gradient_boosting_model_doc(
+        """Early-exit prediction of GradientBoostingClassifier.""",
+        "predict_early_exit",
+    )
+    def predict_early_exit(self, *x, threshold):
+        output, n_stages = self._predict_early_exit(threshold, *x)
+        proba = F.softmax(output, dim=1)
+
+        return proba.cpu(), n_stages
 
 
 @_gradient_boosting_model_doc(
     """Implementation on the GradientBoostingRegressor.""", "model"
 )
 class GradientBoostingRegressor(_BaseGradientBoosting, BaseRegressor):
-    def _pseudo_residual(self, est_idx, y, *x):
-        """Compute pseudo residuals in regression."""
+    def _pseudo_residual(self, est_idx, y, *x, accumulated=None):
+        """
+        Compute pseudo residuals in regression. When ``accumulated`` is
+        given, it is used as the accumulated outputs of the first `est_idx`
+        base estimators instead of running them on ``x``.
+        """
         output = torch.zeros_like(y).to(self.device)
 
-        if est_idx > 0:
+        if accumulated is not None:
+            output = accumulated
+        elif est_idx > 0:
             results = [
                 estimator(*x) for estimator in self.estimators_[:est_idx]
             ]
@@ -447,17 +712,15 @@ class GradientBoostingRegressor(_BaseGradientBoosting, BaseRegressor):
 
         return pseudo_residual
 
-    def _handle_early_stopping(self, test_loader, est_idx):
+    def _handle_early_stopping(self, test_loader, est_idx, accumulated=None):
         # Compute the validation MSE of base estimators fitted so far
-        self.eval()
         mse = 0.0
         flag = False
         criterion = nn.MSELoss()
-        with torch.no_grad():
-            for _, elem in enumerate(test_loader):
-                data, target = io.split_data_target(elem, self.device)
-                output = self._staged_forward(est_idx, *data)
-                mse += criterion(output, target)
+        for output, target in self._validation_outputs(
+            test_loader, est_idx, accumulated
+        ):
+            mse += criterion(output, target)
         mse /= len(test_loader)
 
         if est_idx == 0:
@@ -478,6 +741,20 @@ class GradientBoostingRegressor(_BaseGradientBoosting, BaseRegressor):
 
         return flag
 
+    def _validate_early_exit_threshold(self, threshold):
+        if not threshold >= 0:
+            msg = (
+                "The threshold on the magnitude of updates should not be"
+                " negative, but got {} instead."
+            )
+            self.logger.error(msg.format(threshold))
+            raise ValueError(msg.format(threshold))
+
+    def _is_decided(self, output, update, threshold):
+        magnitude = update.abs().view(update.size(0), -1).max(dim=1)[0]
+
+        return magnitude <= threshold
+
     @torchensemble_model_doc(
         """Set the attributes on optimizer for GradientBoostingRegressor.""",
         "set_optimizer",
@@ -506,6 +783,8 @@ class GradientBoostingRegressor(_BaseGradientBoosting, BaseRegressor):
         early_stopping_rounds=2,
         save_model=True,
         save_dir=None,
+        use_cache=False,
+        cache_dir=None,
     ):
         self._criterion = nn.MSELoss()
         super().fit(
@@ -517,6 +796,8 @@ class GradientBoostingRegressor(_BaseGradientBoosting, BaseRegressor):
             early_stopping_rounds=early_stopping_rounds,
             save_model=save_model,
             save_dir=save_dir,
+            use_cache=use_cache,
+            cache_dir=cache_dir,
         )
 
     @torchensemble_model_doc(
@@ -529,10 +810,36 @@ class GradientBoostingRegressor(_BaseGradientBoosting, BaseRegressor):
 
         return pred
 
+    def _aggregate_outputs(self, outputs):
+        """Sum over predictions from all base estimators."""
+        return self.shrinkage_rate * outputs.sum(0)
+
     @torchensemble_model_doc(item="regressor_evaluate")
     def evaluate(self, test_loader):
-        return super().evaluate(test_loader)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
+
+    def _staged_output(self, accumulated, n_estimators):
+        return self.shrinkage_rate * accumulated
+
+    @torchensemble_model_doc(item="staged_predict")
+    def staged_predict(self, *x):
+        return self._staged_predict(*x)
+
+    @torchensemble_model_doc(item="regressor_staged_evaluate")
+    def staged_evaluate(self, test_loader):
+        return self._staged_evaluate(test_loader)
+
+    @_gradient_boosting_model_doc(
+        """Early-exit prediction of GradientBoostingRegressor.""",
+        "predict_early_exit",
+    )
+    def predict_early_exit(self, *x, threshold):
+        pred, n_stages = self._predict_early_exit(threshold, *x)
+
+        return pred.cpu(), n_stages
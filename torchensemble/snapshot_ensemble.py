@@ -23,6 +23,7 @@ from ._base import torchensemble_model_doc
 from .utils import io
 from .utils import set_module
 from .utils import operator as op
+from .utils.cache import ValidationCache
 from .utils.logging import get_tb_logger
 
 
@@ -64,6 +65,16 @@ __fit_doc = """
         - If ``None``, the model will be saved in the current directory.
         - If not ``None``, the model will be saved in the specified
           directory: ``save_dir``.
+    average_weights : bool, default=False
+        Specify how snapshots are combined into the ensemble.
+
+        - If ``False``, each snapshot is kept as a base estimator, and the
+          outputs of all snapshots are averaged at inference.
+        - If ``True``, the ensemble keeps one base estimator with the running
+          average over weights of all snapshots, and statistics of batch
+          normalization layers are recomputed on ``train_loader`` before
+          each validation and at the end of the training stage. Only one
+          base estimator is evaluated at inference.
 """
 
 
@@ -109,6 +120,9 @@ class _BaseSnapshotEnsemble(BaseModule):
         self.tb_logger = get_tb_logger()
 
         self.estimators_ = nn.ModuleList()
+        self.checkpoint_format_ = "file"
+        self.precision_ = "fp32"
+        self._validation_cache = ValidationCache()
 
     def _validate_parameters(self, lr_clip, epochs, log_interval):
         """Validate hyper-parameters on training the ensemble."""
@@ -245,9 +259,11 @@ class SnapshotEnsembleClassifier(_BaseSnapshotEnsemble, BaseClassifier):
         test_loader=None,
         save_model=True,
         save_dir=None,
+        average_weights=False,
     ):
         self._validate_parameters(lr_clip, epochs, log_interval)
         self.n_outputs = self._decide_n_outputs(train_loader)
+        self.n_snapshots_ = len(self.estimators_)
 
         estimator = self._make_estimator()
 
@@ -280,8 +296,9 @@ class SnapshotEnsembleClassifier(_BaseSnapshotEnsemble, BaseClassifier):
                 optimizer = self._clip_lr(optimizer, lr_clip)
 
                 optimizer.zero_grad()
-                output = estimator(*data)
-                loss = self._criterion(output, target)
+                with set_module.autocast(self.precision_, self.device):
+                    output = estimator(*data)
+                    loss = self._criterion(output, target)
                 loss.backward()
                 optimizer.step()
 
@@ -323,26 +340,20 @@ class SnapshotEnsembleClassifier(_BaseSnapshotEnsemble, BaseClassifier):
             if counter % n_iters_per_estimator == 0:
 
                 # Generate and save the snapshot
-                snapshot = self._make_estimator()
-                snapshot.load_state_dict(estimator.state_dict())
-                self.estimators_.append(snapshot)
+                self._add_snapshot(estimator, average_weights)
 
                 msg = "Save the snapshot model with index: {}"
-                self.logger.info(msg.format(len(self.estimators_) - 1))
+                self.logger.info(msg.format(self.n_snapshots_ - 1))
 
             # Validation after each snapshot model being generated
             if test_loader and counter % n_iters_per_estimator == 0:
+                self._refresh_bn(train_loader)
                 self.eval()
                 with torch.no_grad():
-                    correct = 0
-                    total = 0
-                    for _, elem in enumerate(test_loader):
-                        data, target = io.split_data_target(elem, self.device)
-                        output = self.forward(*data)
-                        _, predicted = torch.max(output.data, 1)
-                        correct += (predicted == target).sum().item()
-                        total += target.size(0)
-                    acc = 100 * correct / total
+                    batches = self._collect_outputs(
+                        self.estimators_, test_loader
+                    )
+                    acc = self._evaluate_outputs(batches)
 
                     if acc > best_acc:
                         best_acc = acc
@@ -354,25 +365,54 @@ class SnapshotEnsembleClassifier(_BaseSnapshotEnsemble, BaseClassifier):
                         " | Historical Best: {:.3f} %"
                     )
                     self.logger.info(
-                        msg.format(len(self.estimators_), acc, best_acc)
+                        msg.format(self.n_snapshots_, acc, best_acc)
                     )
                     if self.tb_logger:
                         self.tb_logger.add_scalar(
                             "snapshot_ensemble/Validation_Acc",
                             acc,
-                            len(self.estimators_),
+                            self.n_snapshots_,
                         )
 
+        self._refresh_bn(train_loader)
         if save_model and not test_loader:
             io.save(self, save_dir, self.logger)
 
+    def _aggregate_outputs(self, outputs):
+        """Average over outputs from all base estimators before softmax."""
+        return F.softmax(outputs.mean(0), dim=1)
+
     @torchensemble_model_doc(item="classifier_evaluate")
     def evaluate(self, test_loader, return_loss=False):
-        return super().evaluate(test_loader, return_loss)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches, return_loss)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
+
+    def _staged_output(self, accumulated, n_estimators):
+        return F.softmax(accumulated / n_estimators, dim=1)
+
+    @torchensemble_model_doc(item="staged_predict")
+    def staged_predict(self, *x):
+        return self._staged_predict(*x)
+
+    @torchensemble_model_doc(item="classifier_staged_evaluate")
+    def staged_evaluate(self, test_loader, return_loss=False):
+        return self._staged_evaluate(test_loader, return_loss)
+
+    @torchensemble_model_doc(
+        """Cascade prediction of SnapshotEnsembleClassifier.""",
+        "predict_cascade",
+    )
+    def predict_cascade(
+        self, *x, threshold, criterion="margin", min_estimators=2
+    ):
+        return self._predict_cascade(
+            x, threshold, criterion, min_estimators, average_proba=False
+        )
 
 
 @torchensemble_model_doc(
@@ -414,9 +454,11 @@ class SnapshotEnsembleRegressor(_BaseSnapshotEnsemble, BaseRegressor):
         test_loader=None,
         save_model=True,
         save_dir=None,
+        average_weights=False,
     ):
         self._validate_parameters(lr_clip, epochs, log_interval)
         self.n_outputs = self._decide_n_outputs(train_loader)
+        self.n_snapshots_ = len(self.estimators_)
 
         estimator = self._make_estimator()
 
@@ -448,8 +490,9 @@ class SnapshotEnsembleRegressor(_BaseSnapshotEnsemble, BaseRegressor):
                 optimizer = self._clip_lr(optimizer, lr_clip)
 
                 optimizer.zero_grad()
-                output = estimator(*data)
-                loss = self._criterion(output, target)
+                with set_module.autocast(self.precision_, self.device):
+                    output = estimator(*data)
+                    loss = self._criterion(output, target)
                 loss.backward()
                 optimizer.step()
 
@@ -483,23 +526,20 @@ class SnapshotEnsembleRegressor(_BaseSnapshotEnsemble, BaseRegressor):
 
             if counter % n_iters_per_estimator == 0:
                 # Generate and save the snapshot
-                snapshot = self._make_estimator()
-                snapshot.load_state_dict(estimator.state_dict())
-                self.estimators_.append(snapshot)
+                self._add_snapshot(estimator, average_weights)
 
                 msg = "Save the snapshot model with index: {}"
-                self.logger.info(msg.format(len(self.estimators_) - 1))
+                self.logger.info(msg.format(self.n_snapshots_ - 1))
 
             # Validation after each snapshot model being generated
             if test_loader and counter % n_iters_per_estimator == 0:
+                self._refresh_bn(train_loader)
                 self.eval()
                 with torch.no_grad():
-                    val_loss = 0.0
-                    for _, elem in enumerate(test_loader):
-                        data, target = io.split_data_target(elem, self.device)
-                        output = self.forward(*data)
-                        val_loss += self._criterion(output, target)
-                    val_loss /= len(test_loader)
+                    batches = self._collect_outputs(
+                        self.estimators_, test_loader
+                    )
+                    val_loss = self._evaluate_outputs(batches)
 
                     if val_loss < best_loss:
                         best_loss = val_loss
@@ -511,22 +551,40 @@ class SnapshotEnsembleRegressor(_BaseSnapshotEnsemble, BaseRegressor):
                         " Historical Best: {:.5f}"
                     )
                     self.logger.info(
-                        msg.format(len(self.estimators_), val_loss, best_loss)
+                        msg.format(self.n_snapshots_, val_loss, best_loss)
                     )
                     if self.tb_logger:
                         self.tb_logger.add_scalar(
                             "snapshot_ensemble/Validation_Loss",
                             val_loss,
-                            len(self.estimators_),
+                            self.n_snapshots_,
                         )
 
+        self._refresh_bn(train_loader)
         if save_model and not test_loader:
             io.save(self, save_dir, self.logger)
 
+    def _aggregate_outputs(self, outputs):
+        """Average over predictions from all base estimators."""
+        return outputs.mean(0)
+
     @torchensemble_model_doc(item="regressor_evaluate")
     def evaluate(self, test_loader):
-        return super().evaluate(test_loader)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
+
+    def _staged_output(self, accumulated, n_estimators):
+        return accumulated / n_estimators
+
+    @torchensemble_model_doc(item="staged_predict")
+    def staged_predict(self, *x):
+        return self._staged_predict(*x)
+
+    @torchensemble_model_doc(item="regressor_staged_evaluate")
+    def staged_evaluate(self, test_loader):
+        return self._staged_evaluate(test_loader)
@@ -11,13 +11,13 @@ import logging
 import warnings
 import torch.nn as nn
 import torch.nn.functional as F
-from joblib import Parallel, delayed
 
 from ._base import BaseModule, BaseClassifier, BaseRegressor
 from ._base import torchensemble_model_doc
 from .utils import io
 from .utils import set_module
 from .utils import operator as op
+from .utils.cache import ValidationCache
 from .utils.logging import get_tb_logger
 
 
@@ -46,11 +46,11 @@ __model_doc = """
         - If ``True``, use GPU to train and evaluate the ensemble.
         - If ``False``, use CPU to train and evaluate the ensemble.
     n_jobs : int, default=None
-        The number of workers for training the ensemble. This input
-        argument is used for parallel ensemble methods such as
-        :mod:`voting` and :mod:`bagging`. Setting it to an integer larger
-        than ``1`` enables ``n_jobs`` base estimators to be trained
-        simultaneously.
+        The number of workers for training the ensemble. It has no effect
+        on soft gradient boosting, where the outputs of all base estimators
+        are computed in one pass on each data batch. This input argument
+        is kept for consistency with parallel ensemble methods such as
+        :mod:`voting` and :mod:`bagging`.
 
     Attributes
     ----------
@@ -114,16 +114,18 @@ def _soft_gradient_boosting_model_doc(header, item="model"):
     return adddoc
 
 
-def _parallel_compute_pseudo_residual(
-    output, target, estimator_idx, shrinkage_rate, n_outputs, is_classification
+def _compute_pseudo_residual(
+    output, target, shrinkage_rate, n_outputs, is_classification
 ):
     """
-    Compute pseudo residuals in soft gradient boosting for each base estimator
-    in a parallel fashion.
+    Compute pseudo residuals in soft gradient boosting for all base estimators
+    in one pass. The input ``output`` stacks the outputs of all base
+    estimators along the first dimension, and the accumulated output used by
+    the i-th base estimator is the shifted cumulative sum over the outputs of
+    the first i base estimators.
     """
-    accumulated_output = torch.zeros_like(output[0], device=output[0].device)
-    for i in range(estimator_idx):
-        accumulated_output += shrinkage_rate * output[i]
+    accumulated_output = torch.zeros_like(output)
+    accumulated_output[1:] = shrinkage_rate * torch.cumsum(output[:-1], dim=0)
 
     # Classification
     if is_classification:
@@ -132,12 +134,17 @@ def _parallel_compute_pseudo_residual(
         )
     # Regression
     else:
-        residual = op.pseudo_residual_regression(target, accumulated_output)
+        if target.size() != output.size()[1:]:
+            msg = "The shape of target {} should be the same as output {}."
+            raise ValueError(msg.format(target.size(), output.size()[1:]))
+        residual = target - accumulated_output
 
     return residual
 
 
 class _BaseSoftGradientBoosting(BaseModule):
+    _supports_stacked_training = True
+
     def __init__(
         self,
         estimator,
@@ -167,6 +174,9 @@ class _BaseSoftGradientBoosting(BaseModule):
 
         self.estimators_ = nn.ModuleList()
         self.use_scheduler_ = False
+        self.checkpoint_format_ = "file"
+        self.precision_ = "fp32"
+        self._validation_cache = ValidationCache()
 
     def _validate_parameters(self, epochs, log_interval):
         """Validate hyper-parameters on training the ensemble."""
@@ -218,9 +228,7 @@ class _BaseSoftGradientBoosting(BaseModule):
         self.n_outputs = self._decide_n_outputs(train_loader)
 
         # Utils
-        criterion = (
-            nn.MSELoss(reduction="sum") if use_reduction_sum else nn.MSELoss()
-        )
+        criterion = nn.MSELoss(reduction="sum")
         total_iters = 0
 
         # Set up optimizer and learning rate scheduler
@@ -240,25 +248,30 @@ class _BaseSoftGradientBoosting(BaseModule):
             for batch_idx, elem in enumerate(train_loader):
 
                 data, target = io.split_data_target(elem, self.device)
-                output = [estimator(*data) for estimator in self.estimators_]
-
-                # Compute pseudo residuals in parallel
-                rets = Parallel(n_jobs=self.n_jobs)(
-                    delayed(_parallel_compute_pseudo_residual)(
+                with set_module.autocast(self.precision_, self.device):
+                    if self._use_stacked_training():
+                        output = self._stacked_training_forward(*data)
+                    else:
+                        output = [
+                            estimator(*data)
+                            for estimator in self.estimators_
+                        ]
+                        output = torch.stack(output)
+
+                    # Compute pseudo residuals for all base estimators
+                    residual = _compute_pseudo_residual(
                         output,
                         target,
-                        i,
                         self.shrinkage_rate,
                         self.n_outputs,
                         self.is_classification,
                     )
-                    for i in range(self.n_estimators)
-                )
 
-                # Compute sGBM loss
-                loss = torch.tensor(0.0, device=self.device)
-                for idx, estimator in enumerate(self.estimators_):
-                    loss += criterion(output[idx], rets[idx])
+                    # Compute sGBM loss, which sums up the losses of all base
+                    # estimators
+                    loss = criterion(output, residual)
+                if not use_reduction_sum:
+                    loss = loss / output[0].numel()
 
                 optimizer.zero_grad()
                 loss.backward()
@@ -319,16 +332,9 @@ class SoftGradientBoostingClassifier(
     @torch.no_grad()
     def _evaluate_during_fit(self, test_loader, epoch):
         self.eval()
-        correct = 0
-        total = 0
         flag = False
-        for _, elem in enumerate(test_loader):
-            data, target = io.split_data_target(elem, self.device)
-            output = self.forward(*data)
-            _, predicted = torch.max(output.data, 1)
-            correct += (predicted == target).sum().item()
-            total += target.size(0)
-        acc = 100 * correct / total
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        acc = self._evaluate_outputs(batches)
 
         if acc > self.best_acc:
             self.best_acc = acc
@@ -367,6 +373,13 @@ class SoftGradientBoostingClassifier(
     def set_criterion(self, criterion):
         super().set_criterion(criterion)
 
+    @torchensemble_model_doc(
+        """Set the forward mode for SoftGradientBoostingClassifier.""",
+        "set_forward_mode",
+    )
+    def set_forward_mode(self, mode, training=False):
+        super().set_forward_mode(mode, training)
+
     @_soft_gradient_boosting_model_doc(
         """Implementation on the training stage of SoftGradientBoostingClassifier.""",  # noqa: E501
         "fit",
@@ -396,19 +409,39 @@ class SoftGradientBoostingClassifier(
         "classifier_forward",
     )
     def forward(self, *x):
+        if self._use_stacked_forward():
+            return self._aggregate_outputs(self._stacked_forward(*x))
+
         output = [estimator(*x) for estimator in self.estimators_]
         output = op.sum_with_multiplicative(output, self.shrinkage_rate)
         proba = F.softmax(output, dim=1)
 
         return proba
 
+    def _aggregate_outputs(self, outputs):
+        """Sum over outputs from all base estimators before softmax."""
+        return F.softmax(self.shrinkage_rate * outputs.sum(0), dim=1)
+
     @torchensemble_model_doc(item="classifier_evaluate")
     def evaluate(self, test_loader, return_loss=False):
-        return super().evaluate(test_loader, return_loss)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches, return_loss)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
+
+    def _staged_output(self, accumulated, n_estimators):
+        return F.softmax(self.shrinkage_rate * accumulated, dim=1)
+
+    @torchensemble_model_doc(item="staged_predict")
+    def staged_predict(self, *x):
+        return self._staged_predict(*x)
+
+    @torchensemble_model_doc(item="classifier_staged_evaluate")
+    def staged_evaluate(self, test_loader, return_loss=False):
+        return self._staged_evaluate(test_loader, return_loss)
 
 
 @_soft_gradient_boosting_model_doc(
@@ -442,10 +475,10 @@ class SoftGradientBoostingRegressor(_BaseSoftGradientBoosting, BaseRegressor):
         mse = 0.0
         flag = False
         criterion = nn.MSELoss()
-        for _, elem in enumerate(test_loader):
-            data, target = io.split_data_target(elem, self.device)
-            output = self.forward(*data)
-            mse += criterion(output, target)
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        for outputs, target in batches:
+            outputs, target = outputs.to(self.device), target.to(self.device)
+            mse += criterion(self._aggregate_outputs(outputs), target)
         mse /= len(test_loader)
 
         if mse < self.best_mse:
@@ -484,6 +517,13 @@ class SoftGradientBoostingRegressor(_BaseSoftGradientBoosting, BaseRegressor):
     def set_criterion(self, criterion):
         super().set_criterion(criterion)
 
+    @torchensemble_model_doc(
+        """Set the forward mode for SoftGradientBoostingRegressor.""",
+        "set_forward_mode",
+    )
+    def set_forward_mode(self, mode, training=False):
+        super().set_forward_mode(mode, training)
+
     @_soft_gradient_boosting_model_doc(
         """Implementation on the training stage of SoftGradientBoostingRegressor.""",  # noqa: E501
         "fit",
@@ -513,15 +553,35 @@ class SoftGradientBoostingRegressor(_BaseSoftGradientBoosting, BaseRegressor):
         "regressor_forward",
     )
     def forward(self, *x):
+        if self._use_stacked_forward():
+            return self._aggregate_outputs(self._stacked_forward(*x))
+
         outputs = [estimator(*x) for estimator in self.estimators_]
         pred = op.sum_with_multiplicative(outputs, self.shrinkage_rate)
 
         return pred
 
+    def _aggregate_outputs(self, outputs):
+        """Sum over predictions from all base estimators."""
+        return self.shrinkage_rate * outputs.sum(0)
+
     @torchensemble_model_doc(item="regressor_evaluate")
     def evaluate(self, test_loader):
-        return super().evaluate(test_loader)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
+
+    def _staged_output(self, accumulated, n_estimators):
+        return self.shrinkage_rate * accumulated
+
+    @torchensemble_model_doc(item="staged_predict")
+    def staged_predict(self, *x):
+        return self._staged_predict(*x)
+
+    @torchensemble_model_doc(item="regressor_staged_evaluate")
+    def staged_evaluate(self, test_loader):
+        return self._staged_evaluate(test_loader)
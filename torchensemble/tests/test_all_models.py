@@ -92,6 +92,7 @@ def test_clf_class(clf):
     """
     This unit test checks the training and evaluating stage of all classifiers.
     """
+    torch.manual_seed(0)
     epochs = 1
     n_estimators = 2
 
@@ -142,6 +143,7 @@ def test_clf_object(clf):
     """
     This unit test checks the training and evaluating stage of all classifiers.
     """
+    torch.manual_seed(0)
     epochs = 1
     n_estimators = 2
 
@@ -192,6 +194,7 @@ def test_reg_class(reg):
     """
     This unit test checks the training and evaluating stage of all regressors.
     """
+    torch.manual_seed(0)
     epochs = 1
     n_estimators = 2
 
@@ -242,6 +245,7 @@ def test_reg_object(reg):
     """
     This unit test checks the training and evaluating stage of all regressors.
     """
+    torch.manual_seed(0)
     epochs = 1
     n_estimators = 2
 
@@ -302,3 +306,52 @@ def test_predict():
     with pytest.raises(ValueError) as excinfo:
         model.predict([X_test])  # list
     assert "The type of input X should be one of" in str(excinfo.value)
+
+
+def test_predict_chunked(tmpdir):
+
+    fusion = all_clf[0]  # FusionClassifier
+    model = fusion(estimator=MLP_clf, n_estimators=2, cuda=False)
+    model.set_optimizer("Adam", lr=1e-3, weight_decay=5e-4)
+
+    train = TensorDataset(X_train, y_train_clf)
+    train_loader = DataLoader(train, batch_size=2, shuffle=False)
+    model.fit(train_loader, epochs=1, save_model=False)
+
+    expected = model.predict(X_train).numpy()
+
+    # Chunked tensor and numpy array
+    assert np.allclose(model.predict(X_train, batch_size=3), expected)
+    assert np.allclose(
+        model.predict(X_train.numpy(), batch_size=1), expected
+    )
+
+    # Read-only memmaps as input and output
+    filename = str(tmpdir.join("X_train.npy"))
+    np.save(filename, X_train.numpy())
+    X_memmap = np.load(filename, mmap_mode="r")
+    out = np.lib.format.open_memmap(
+        str(tmpdir.join("pred.npy")),
+        mode="w+",
+        dtype=np.float32,
+        shape=expected.shape,
+    )
+    pred = model.predict(X_memmap, batch_size=3, out=out)
+    assert pred is out
+    assert np.allclose(out, expected)
+
+    # Data loader
+    test_loader = DataLoader(TensorDataset(X_train), batch_size=3)
+    assert np.allclose(model.predict(test_loader), expected)
+
+    # Targets in batches of a labelled data loader are ignored
+    test_loader = DataLoader(TensorDataset(X_train, y_train_clf), batch_size=3)
+    assert np.allclose(model.predict(test_loader), expected)
+
+    with pytest.raises(ValueError) as excinfo:
+        model.predict(X_train, batch_size=0)
+    assert "number of samples in each chunk" in str(excinfo.value)
+
+    with pytest.raises(ValueError) as excinfo:
+        model.predict(X_train, out=torch.empty(1, 2))
+    assert "is too small to hold the predictions" in str(excinfo.value)
@@ -98,6 +98,7 @@ def test_clf_class(clf):
     """
     This unit test checks the training and evaluating stage of all classifiers.
     """
+    torch.manual_seed(0)
     epochs = 1
     n_estimators = 2
 
@@ -149,6 +150,7 @@ def test_clf_object(clf):
     """
     This unit test checks the training and evaluating stage of all classifiers.
     """
+    torch.manual_seed(0)
     epochs = 1
     n_estimators = 2
 
@@ -200,6 +202,7 @@ def test_reg_class(reg):
     """
     This unit test checks the training and evaluating stage of all regressors.
     """
+    torch.manual_seed(0)
     epochs = 1
     n_estimators = 2
 
@@ -251,6 +254,7 @@ def test_reg_object(reg):
     """
     This unit test checks the training and evaluating stage of all regressors.
     """
+    torch.manual_seed(0)
     epochs = 1
     n_estimators = 2
 
@@ -297,6 +301,21 @@ def test_reg_object(reg):
         break
 
 
+def test_predict_dataloader():
+    model = torchensemble.VotingClassifier(
+        estimator=MLP_clf, n_estimators=2, cuda=False
+    )
+    model.set_optimizer("Adam", lr=1e-3)
+
+    train = TensorDataset(X_train, X_train, y_train_clf)
+    train_loader = DataLoader(train, batch_size=2, shuffle=False)
+    model.fit(train_loader, epochs=1, save_model=False)
+
+    # The last element in each batch is the target, as in `evaluate`
+    expected = model.predict(X_train, X_train)
+    assert torch.allclose(model.predict(train_loader), expected)
+
+
 def test_split_data_target_invalid_data_type():
     with pytest.raises(ValueError) as excinfo:
         io.split_data_target(0.0, device, logger)
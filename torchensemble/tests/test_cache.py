@@ -0,0 +1,285 @@
+import torch
+import pytest
+import numpy as np
+import torch.nn as nn
+from numpy.testing import assert_array_almost_equal
+from torch.utils.data import TensorDataset, DataLoader
+
+import torchensemble
+from torchensemble._base import BaseClassifier
+from torchensemble.utils.cache import OutputCache
+from torchensemble.utils.dataloder import IndexedDataLoader
+from torchensemble.utils.dataloder import make_sequential_dataloader
+from torchensemble.utils.logging import set_logger
+
+
+set_logger("pytest_cache")
+
+
+# Base estimator
+class MLP(nn.Module):
+    def __init__(self):
+        super(MLP, self).__init__()
+        self.linear1 = nn.Linear(2, 2)
+        self.linear2 = nn.Linear(2, 2)
+
+    def forward(self, X):
+        X = X.view(X.size()[0], -1)
+        output = self.linear1(X)
+        output = self.linear2(output)
+        return output
+
+
+# Training data
+X_train = torch.Tensor(
+    np.array(([0.1, 0.1], [0.2, 0.2], [0.3, 0.3], [0.4, 0.4]))
+)
+y_train = torch.LongTensor(np.array(([0, 0, 1, 1])))
+
+train = TensorDataset(X_train, y_train)
+
+
+def test_indexed_dataloader():
+    dataloader = DataLoader(train, batch_size=3, shuffle=True)
+    indexed_dataloader = IndexedDataLoader(dataloader)
+
+    n_samples = 0
+    for indices, (data, target) in indexed_dataloader:
+        assert torch.equal(X_train[indices], data)
+        assert torch.equal(y_train[indices], target)
+        n_samples += indices.size(0)
+
+    assert n_samples == len(train)
+    assert len(indexed_dataloader) == 2
+
+
+def test_indexed_dataloader_worker_args():
+    dataloader = DataLoader(
+        train,
+        batch_size=2,
+        num_workers=1,
+        persistent_workers=True,
+        prefetch_factor=4,
+        multiprocessing_context="spawn",
+    )
+
+    # Settings on worker processes are kept
+    for indexed_dataloader in [
+        IndexedDataLoader(dataloader),
+        make_sequential_dataloader(dataloader),
+    ]:
+        assert indexed_dataloader._dataloader.persistent_workers
+        assert indexed_dataloader._dataloader.prefetch_factor == 4
+        context = indexed_dataloader._dataloader.multiprocessing_context
+        assert context is dataloader.multiprocessing_context
+
+
+def test_indexed_dataloader_invalid_type():
+    with pytest.raises(ValueError) as excinfo:
+        IndexedDataLoader((X_train, y_train))
+    assert "input used to instantiate IndexedDataLoader" in str(excinfo.value)
+
+
+@pytest.mark.parametrize("cache_dir", [None, "./"])
+def test_output_cache(cache_dir):
+    cache = OutputCache(4, torch.device("cpu"), cache_dir)
+    assert cache.is_empty()
+
+    cache.update(torch.LongTensor([0, 2]), torch.ones(2, 3))
+    cache.update(torch.LongTensor([2, 3]), torch.ones(2, 3))
+
+    expected = np.array(([1, 1, 1], [0, 0, 0], [2, 2, 2], [1, 1, 1]))
+    assert_array_almost_equal(cache[torch.arange(4)].numpy(), expected)
+
+    cache.clear()
+    assert cache.is_empty()
+
+
+def test_gradient_boosting_cache():
+    train_loader = DataLoader(train, batch_size=2, shuffle=False)
+
+    models = []
+    for use_cache in [True, False]:
+        torch.manual_seed(0)
+        model = torchensemble.GradientBoostingClassifier(
+            estimator=MLP, n_estimators=3, shrinkage_rate=0.5, cuda=False
+        )
+        model.set_optimizer("SGD", lr=1e-1)
+        model.fit(
+            train_loader, epochs=2, save_model=False, use_cache=use_cache
+        )
+        models.append(model)
+
+    # Caching the outputs should not change the fitted ensemble
+    for _, (data, _) in enumerate(train_loader):
+        assert_array_almost_equal(
+            models[0].predict(data).numpy(), models[1].predict(data).numpy()
+        )
+
+
+class ModeMLP(MLP):
+    def forward(self, X):
+        # Outputs depend on the mode of the base estimator
+        output = super(ModeMLP, self).forward(X)
+        return 2 * output if self.training else output
+
+
+@pytest.mark.parametrize("validation", [False, True])
+def test_gradient_boosting_cache_mode(validation):
+    train_loader = DataLoader(train, batch_size=2, shuffle=False)
+    test_loader = train_loader if validation else None
+
+    models = []
+    for use_cache in [True, False]:
+        torch.manual_seed(0)
+        model = torchensemble.GradientBoostingClassifier(
+            estimator=ModeMLP, n_estimators=3, shrinkage_rate=0.5, cuda=False
+        )
+        model.set_optimizer("SGD", lr=1e-3)
+        model.fit(
+            train_loader,
+            epochs=2,
+            test_loader=test_loader,
+            early_stopping_rounds=3,
+            save_model=False,
+            use_cache=use_cache,
+        )
+        models.append(model)
+
+    # Cached outputs are computed in the same mode as without the cache
+    for param, expected in zip(
+        models[0].parameters(), models[1].parameters()
+    ):
+        assert_array_almost_equal(
+            param.detach().numpy(), expected.detach().numpy()
+        )
+
+
+def test_sequential_dataloader():
+    batch_sampler = [[3, 1], [0], [2, 1]]
+    dataloader = DataLoader(train, batch_sampler=batch_sampler)
+    assert dataloader.batch_size is None
+
+    # A fixed batch size is used for dataloaders with a custom batch sampler
+    n_samples = 0
+    for indices, (data, target) in make_sequential_dataloader(dataloader):
+        assert torch.equal(X_train[indices], data)
+        n_samples += indices.size(0)
+    assert n_samples == len(train)
+
+
+def test_output_cache_unique_filename(tmpdir):
+    caches = [
+        OutputCache(4, torch.device("cpu"), str(tmpdir)) for _ in range(2)
+    ]
+    for value, cache in enumerate(caches):
+        cache.update(torch.arange(4), torch.full((4, 2), float(value)))
+
+    # Caches sharing the same directory do not overwrite each other
+    assert caches[0].filename_ != caches[1].filename_
+    for value, cache in enumerate(caches):
+        assert torch.all(cache[torch.arange(4)] == value)
+        cache.clear()
+    assert not tmpdir.listdir()
+
+
+def test_gradient_boosting_batch_sampler():
+    batch_sampler = [[0, 1], [2, 3]]
+    train_loader = DataLoader(train, batch_sampler=batch_sampler)
+
+    model = torchensemble.GradientBoostingClassifier(
+        estimator=MLP, n_estimators=2, cuda=False
+    )
+    model.set_optimizer("SGD", lr=1e-1)
+    model.fit(train_loader, epochs=1, save_model=False, use_cache=True)
+
+    assert len(model.estimators_) == 2
+    model.predict(X_train)
+
+
+@pytest.mark.parametrize(
+    "method",
+    [
+        torchensemble.VotingClassifier,
+        torchensemble.BaggingClassifier,
+        torchensemble.FusionClassifier,
+        torchensemble.SnapshotEnsembleClassifier,
+        torchensemble.SoftGradientBoostingClassifier,
+    ],
+)
+def test_validation_cache(method, monkeypatch):
+    model = method(estimator=MLP, n_estimators=2, cuda=False)
+    model.set_optimizer("Adam", lr=1e-3)
+    model.set_validation_cache(max_size=2 ** 30)
+
+    train_loader = DataLoader(train, batch_size=2, shuffle=False)
+    test_loader = DataLoader(train, batch_size=2, shuffle=False)
+    # Snapshot ensembles require a multiple of `n_estimators` epochs
+    epochs = 2 if method is torchensemble.SnapshotEnsembleClassifier else 1
+    model.fit(
+        train_loader, epochs=epochs, test_loader=test_loader, save_model=False
+    )
+
+    # Outputs from the validation in `fit` are reused
+    n_calls = []
+    forward = MLP.forward
+
+    def _forward(self, X):
+        n_calls.append(1)
+        return forward(self, X)
+
+    monkeypatch.setattr(MLP, "forward", _forward)
+
+    model.evaluate(test_loader)
+    assert len(model.evaluate_estimators(test_loader)) == 2
+    assert len(n_calls) == 0
+
+    # Outputs are recomputed after base estimators are updated
+    with torch.no_grad():
+        model.estimators_[0].linear1.weight.add_(1.0)
+    acc, loss = model.evaluate(test_loader, return_loss=True)
+    assert len(n_calls) == 4
+
+    # Results are the same as the evaluation on the ensemble output
+    expected_acc, expected_loss = BaseClassifier.evaluate(
+        model, test_loader, return_loss=True
+    )
+    assert acc == expected_acc
+    assert loss == pytest.approx(expected_loss)
+
+
+def test_validation_cache_size(monkeypatch):
+    model = torchensemble.VotingClassifier(
+        estimator=MLP, n_estimators=2, cuda=False
+    )
+    model.set_optimizer("Adam", lr=1e-3)
+
+    train_loader = DataLoader(train, batch_size=2, shuffle=False)
+    model.fit(train_loader, epochs=1, save_model=False)
+
+    n_calls = []
+    forward = MLP.forward
+
+    def _forward(self, X):
+        n_calls.append(1)
+        return forward(self, X)
+
+    monkeypatch.setattr(MLP, "forward", _forward)
+
+    # The cache is disabled by default
+    acc = model.evaluate(train_loader)
+    assert model.evaluate(train_loader) == acc
+    assert len(n_calls) == 8
+    assert model._validation_cache.batches_ is None
+
+    # Outputs exceeding the size limit are streamed without caching
+    n_calls.clear()
+    model.set_validation_cache(max_size=16)
+    acc = model.evaluate(train_loader)
+    assert model.evaluate(train_loader) == acc
+    assert len(n_calls) == 8
+    assert acc == BaseClassifier.evaluate(model, train_loader)
+
+    with pytest.raises(ValueError) as excinfo:
+        model.set_validation_cache(max_size=-1)
+    assert "validation cache should be non-negative" in str(excinfo.value)
@@ -0,0 +1,79 @@
+import torch
+import pytest
+import numpy as np
+import torch.nn as nn
+
+import torchensemble
+from torchensemble.utils.logging import set_logger
+
+
+cascade = [
+    torchensemble.VotingClassifier,
+    torchensemble.BaggingClassifier,
+    torchensemble.SnapshotEnsembleClassifier,
+    torchensemble.FastGeometricClassifier,
+]
+
+
+set_logger("pytest_cascade")
+
+
+# Base estimator
+class MLP(nn.Module):
+    def __init__(self):
+        super(MLP, self).__init__()
+        self.linear1 = nn.Linear(2, 2)
+        self.linear2 = nn.Linear(2, 3)
+
+    def forward(self, X):
+        X = X.view(X.size()[0], -1)
+        output = self.linear1(X)
+        output = self.linear2(output)
+        return output
+
+
+X_test = torch.Tensor(np.random.rand(8, 2))
+
+
+def _make_model(method):
+    model = method(estimator=MLP, n_estimators=4, cuda=False)
+    for _ in range(model.n_estimators):
+        model.estimators_.append(model._make_estimator())
+
+    return model
+
+
+@pytest.mark.parametrize("method", cascade)
+@pytest.mark.parametrize("criterion", ["margin", "agreement"])
+def test_predict_cascade(method, criterion):
+    model = _make_model(method)
+
+    # No sample is confident enough before the last base estimator
+    proba, n_used = model.predict_cascade(
+        X_test, threshold=1.0, criterion=criterion, min_estimators=4
+    )
+    assert torch.equal(proba, model.predict(X_test))
+    assert torch.equal(n_used, torch.full((8,), 4, dtype=torch.long))
+
+    # All samples stop after the minimum number of base estimators
+    proba, n_used = model.predict_cascade(
+        X_test, threshold=0.0, criterion=criterion
+    )
+    assert torch.equal(n_used, torch.full((8,), 2, dtype=torch.long))
+    assert torch.allclose(proba.sum(dim=1), torch.ones(8))
+
+
+def test_predict_cascade_invalid():
+    model = _make_model(torchensemble.VotingClassifier)
+
+    with pytest.raises(ValueError) as excinfo:
+        model.predict_cascade(X_test, threshold=0.5, criterion="entropy")
+    assert "criterion on the cascade prediction" in str(excinfo.value)
+
+    with pytest.raises(ValueError) as excinfo:
+        model.predict_cascade(X_test, threshold=1.5)
+    assert "threshold on the cascade prediction" in str(excinfo.value)
+
+    with pytest.raises(ValueError) as excinfo:
+        model.predict_cascade(X_test, threshold=0.5, min_estimators=0)
+    assert "minimum number of base estimators" in str(excinfo.value)
@@ -0,0 +1,185 @@
+import os
+import torch
+import pytest
+import numpy as np
+import torch.nn as nn
+from torch.utils.data import TensorDataset, DataLoader
+
+import torchensemble
+from torchensemble.utils.logging import set_logger
+from torchensemble.utils.distillation import TeacherCache, distill
+from torchensemble.utils.distillation import _teacher_key
+
+
+set_logger("pytest_distillation")
+
+
+# Base estimator
+class MLP(nn.Module):
+    def __init__(self, output_dim=2):
+        super(MLP, self).__init__()
+        self.linear1 = nn.Linear(2, 2)
+        self.linear2 = nn.Linear(2, output_dim)
+
+    def forward(self, X):
+        X = X.view(X.size()[0], -1)
+        output = self.linear1(X)
+        output = self.linear2(output)
+        return output
+
+
+# Training data
+X_train = torch.Tensor(
+    np.array(([0.1, 0.1], [0.2, 0.2], [0.3, 0.3], [0.4, 0.4]))
+)
+y_train_clf = torch.LongTensor(np.array(([0, 0, 1, 1])))
+y_train_reg = torch.FloatTensor(np.array(([0.1, 0.2, 0.3, 0.4])))
+y_train_reg = y_train_reg.view(-1, 1)
+
+
+def _fit(method, y_train, output_dim):
+    model = method(
+        estimator=MLP,
+        n_estimators=2,
+        estimator_args={"output_dim": output_dim},
+        cuda=False,
+    )
+    model.set_optimizer("Adam", lr=1e-3)
+
+    train_loader = DataLoader(
+        TensorDataset(X_train, y_train), batch_size=2, shuffle=True
+    )
+    model.fit(train_loader, epochs=2, save_model=False)
+
+    return model, train_loader
+
+
+@pytest.mark.parametrize(
+    "method, y_train, output_dim",
+    [
+        (torchensemble.VotingClassifier, y_train_clf, 2),
+        (torchensemble.GradientBoostingRegressor, y_train_reg, 1),
+    ],
+)
+def test_distill(method, y_train, output_dim):
+    model, train_loader = _fit(method, y_train, output_dim)
+
+    student = distill(
+        model,
+        MLP(output_dim),
+        train_loader,
+        epochs=2,
+        optimizer_args={"lr": 1e-3},
+        alpha=0.5,
+    )
+    assert student(X_train).size() == (4, output_dim)
+
+    with pytest.raises(ValueError) as excinfo:
+        distill(model, MLP(output_dim), train_loader, alpha=2.0)
+    assert "should be in the range [0, 1]" in str(excinfo.value)
+
+
+def test_teacher_cache(tmpdir):
+    model, train_loader = _fit(torchensemble.VotingClassifier, y_train_clf, 2)
+    cache_dir = str(tmpdir)
+
+    # Cached outputs follow the order of samples in the dataset
+    cache = TeacherCache(model, train_loader, cache_dir).load()
+    assert torch.allclose(cache[torch.arange(4)], model.predict(X_train))
+    assert os.path.exists(os.path.join(cache_dir, "teacher.json"))
+
+    # Cached outputs are reused by another run with the same teacher
+    mtime = os.path.getmtime(os.path.join(cache_dir, "teacher.npy"))
+    cache = TeacherCache(model, train_loader, cache_dir).load()
+    assert os.path.getmtime(os.path.join(cache_dir, "teacher.npy")) == mtime
+
+    # Cached outputs are recomputed once the teacher changes
+    with torch.no_grad():
+        for param in model.parameters():
+            param.add_(1.0)
+    cache = TeacherCache(model, train_loader, cache_dir).load()
+    assert torch.allclose(cache[torch.arange(4)], model.predict(X_train))
+
+    # Cached outputs are recomputed on a different dataset of the same size
+    X_other = X_train.flip(0)
+    other_loader = DataLoader(
+        TensorDataset(X_other, y_train_clf), batch_size=2, shuffle=True
+    )
+    cache = TeacherCache(model, other_loader, cache_dir).load()
+    assert torch.allclose(cache[torch.arange(4)], model.predict(X_other))
+
+    cache.clear()
+    assert not os.listdir(cache_dir)
+
+
+def test_teacher_key():
+    dataset = TensorDataset(X_train, y_train_clf)
+    teacher = MLP()
+    key = _teacher_key(teacher, dataset)
+
+    # Teachers with bf16 parameters are supported
+    assert _teacher_key(teacher.bfloat16(), dataset) != key
+    assert _teacher_key(MLP(), TensorDataset(X_train.flip(0))) != key
+
+
+def test_teacher_key_precision():
+    dataset = TensorDataset(X_train, y_train_clf)
+    teacher = torchensemble.VotingClassifier(
+        estimator=MLP, n_estimators=2, cuda=False
+    )
+    key = _teacher_key(teacher, dataset)
+
+    # Outputs depend on the precision and quantization of the teacher
+    teacher.set_precision("bf16")
+    bf16_key = _teacher_key(teacher, dataset)
+    assert bf16_key != key
+
+    teacher.quantization_ = "dynamic"
+    assert _teacher_key(teacher, dataset) not in (key, bf16_key)
+
+
+class UnreadableDataset(object):
+    def __init__(self, X, y):
+        self.X = X
+        self.y = y
+
+    def __getitem__(self, index):
+        raise RuntimeError("Samples should not be read.")
+
+    def __len__(self):
+        return len(self.X)
+
+
+def test_teacher_key_dataset(tmpdir):
+    teacher = MLP()
+    X = X_train.numpy()
+    y = y_train_clf.numpy()
+
+    # Samples are not read to identify datasets other than TensorDataset
+    dataset = UnreadableDataset(X, y)
+    with pytest.raises(ValueError) as excinfo:
+        _teacher_key(teacher, dataset)
+    assert "requires `cache_key` to identify the dataset" in str(
+        excinfo.value
+    )
+
+    dataloader = DataLoader(dataset, batch_size=2)
+    with pytest.raises(ValueError) as excinfo:
+        TeacherCache(teacher, dataloader, str(tmpdir))
+    assert "requires `cache_key` to identify the dataset" in str(
+        excinfo.value
+    )
+
+    key = _teacher_key(teacher, dataset, "v1")
+    assert key != _teacher_key(teacher, dataset, "v2")
+    assert key != _teacher_key(MLP(), dataset, "v1")
+
+
+def test_teacher_cache_batch_sampler():
+    model, _ = _fit(torchensemble.VotingClassifier, y_train_clf, 2)
+    dataloader = DataLoader(
+        TensorDataset(X_train, y_train_clf), batch_sampler=[[2, 0], [3, 1]]
+    )
+
+    cache = TeacherCache(model, dataloader).load()
+    assert torch.allclose(cache[torch.arange(4)], model.predict(X_train))
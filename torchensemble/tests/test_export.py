@@ -0,0 +1,102 @@
+import torch
+import pytest
+import numpy as np
+import torch.nn as nn
+from torch.utils.data import TensorDataset, DataLoader
+
+import torchensemble
+from torchensemble.utils.export import export
+from torchensemble.utils.logging import set_logger
+
+
+set_logger("pytest_export")
+
+
+# Base estimator
+class MLP(nn.Module):
+    def __init__(self, output_dim=2):
+        super(MLP, self).__init__()
+        self.linear1 = nn.Linear(2, 2)
+        self.linear2 = nn.Linear(2, output_dim)
+
+    def forward(self, X):
+        X = X.view(X.size()[0], -1)
+        output = self.linear1(X)
+        output = self.linear2(output)
+        return output
+
+
+# Training data
+X_train = torch.Tensor(
+    np.array(([0.1, 0.1], [0.2, 0.2], [0.3, 0.3], [0.4, 0.4]))
+)
+y_train_clf = torch.LongTensor(np.array(([0, 0, 1, 1])))
+y_train_reg = torch.FloatTensor(np.array(([0.1, 0.2, 0.3, 0.4])))
+y_train_reg = y_train_reg.view(-1, 1)
+
+# Testing data
+X_test = torch.Tensor(np.array(([0.5, 0.5], [0.6, 0.6], [0.7, 0.7])))
+
+
+all_models = [
+    (torchensemble.FusionClassifier, y_train_clf, 2),
+    (torchensemble.VotingClassifier, y_train_clf, 2),
+    (torchensemble.BaggingRegressor, y_train_reg, 1),
+    (torchensemble.GradientBoostingClassifier, y_train_clf, 2),
+    (torchensemble.GradientBoostingRegressor, y_train_reg, 1),
+    (torchensemble.SnapshotEnsembleClassifier, y_train_clf, 2),
+    (torchensemble.NeuralForestClassifier, y_train_clf, 2),
+]
+
+
+def _fit(method, y_train, output_dim):
+    if issubclass(method, torchensemble.NeuralForestClassifier):
+        model = method(n_estimators=2, depth=2, cuda=False)
+    else:
+        model = method(
+            estimator=MLP,
+            n_estimators=2,
+            estimator_args={"output_dim": output_dim},
+            cuda=False,
+        )
+    model.set_optimizer("Adam", lr=1e-3)
+
+    train_loader = DataLoader(TensorDataset(X_train, y_train), batch_size=2)
+    model.fit(train_loader, epochs=2, save_model=False)
+
+    return model
+
+
+@pytest.mark.parametrize("method, y_train, output_dim", all_models)
+def test_export_trace(tmpdir, method, y_train, output_dim):
+    model = _fit(method, y_train, output_dim)
+    forward_mode = getattr(model, "forward_mode_", None)
+    path = str(tmpdir.join("model.pt"))
+    export(model, X_train, path=path)
+
+    # The forward mode of the ensemble is restored
+    assert getattr(model, "forward_mode_", None) == forward_mode
+
+    # The graph is loaded without the definition of the ensemble
+    graph = torch.jit.load(path)
+    assert torch.allclose(graph(X_test), model.predict(X_test), atol=1e-6)
+
+
+@pytest.mark.skipif(
+    not hasattr(torch, "export"), reason="requires torch.export"
+)
+def test_export_program(tmpdir):
+    model = _fit(torchensemble.VotingRegressor, y_train_reg, 1)
+    path = str(tmpdir.join("model.pt2"))
+    export(model, X_train, path=path, method="export")
+
+    program = torch.export.load(path)
+    pred = program.module()(X_test)
+    assert torch.allclose(pred, model.predict(X_test), atol=1e-6)
+
+
+def test_export_method():
+    model = _fit(torchensemble.VotingClassifier, y_train_clf, 2)
+    with pytest.raises(ValueError) as excinfo:
+        export(model, X_train, method="script")
+    assert "packaging method should be one of" in str(excinfo.value)
@@ -1,9 +1,12 @@
 import torch
+import pickle
 import pytest
 import numpy as np
-from torch.utils.data import TensorDataset, DataLoader
+from torch.utils.data import TensorDataset, DataLoader, Subset
 
 from torchensemble.utils.dataloder import FixedDataLoader
+from torchensemble.utils.dataloder import MemmapTensorDataset
+from torchensemble.utils.dataloder import share_dataloaders
 
 
 # Data
@@ -29,3 +32,72 @@ def test_fixed_dataloader_invalid_type():
     with pytest.raises(ValueError) as excinfo:
         FixedDataLoader((X, y))
     assert "input used to instantiate FixedDataLoader" in str(excinfo.value)
+
+
+def test_share_dataloaders(tmpdir):
+    subset = Subset(data, [3, 1, 1])
+    dataloaders = [
+        dataloder,
+        DataLoader(subset, batch_size=2, shuffle=True),
+        DataLoader(data, batch_size=2, sampler=[0, 1]),
+    ]
+    shared = share_dataloaders(dataloaders, str(tmpdir))
+
+    # The same dataset is stored only once
+    assert len(tmpdir.listdir()) == 2
+    assert isinstance(shared[0].dataset, MemmapTensorDataset)
+    assert shared[1].dataset.dataset is shared[0].dataset
+
+    # Custom samplers are not supported
+    assert shared[2] is dataloaders[2]
+
+    # Only filenames are pickled
+    dataset = pickle.loads(pickle.dumps(shared[0].dataset))
+    assert dataset._tensors is None
+    for elem_1, elem_2 in zip(dataset[1], data[1]):
+        assert torch.equal(elem_1, elem_2)
+
+    for elem_1, elem_2 in zip(shared[0], dataloder):
+        for tensor_1, tensor_2 in zip(elem_1, elem_2):
+            assert torch.equal(tensor_1, tensor_2)
+    assert sorted(shared[1].dataset[i][1].item() for i in range(3)) == [
+        0,
+        0,
+        1,
+    ]
+
+
+def test_share_dataloaders_generator(tmpdir):
+    # Seeded shuffling is preserved on the shared dataloader
+    dataloader = DataLoader(
+        data,
+        batch_size=2,
+        shuffle=True,
+        generator=torch.Generator().manual_seed(0),
+    )
+    shared = share_dataloaders([dataloader], str(tmpdir))[0]
+    assert shared.sampler.generator is dataloader.sampler.generator
+
+    dataloader.sampler.generator.manual_seed(0)
+    expected = [target for _, target in dataloader]
+    dataloader.sampler.generator.manual_seed(0)
+    for (_, target), expected_target in zip(shared, expected):
+        assert torch.equal(target, expected_target)
+
+
+def test_share_dataloaders_worker_args(tmpdir):
+    dataloader = DataLoader(
+        data,
+        batch_size=2,
+        num_workers=1,
+        persistent_workers=True,
+        prefetch_factor=4,
+        multiprocessing_context="spawn",
+    )
+    shared = share_dataloaders([dataloader], str(tmpdir))[0]
+
+    # Settings on worker processes are kept
+    assert shared is not dataloader
+    assert shared.persistent_workers
+    assert shared.prefetch_factor == 4
+    assert shared.multiprocessing_context is dataloader.multiprocessing_context
@@ -0,0 +1,173 @@
+import torch
+import pickle
+import pytest
+import numpy as np
+import torch.nn as nn
+from numpy.testing import assert_array_almost_equal
+from torch.utils.data import TensorDataset, DataLoader
+
+import torchensemble
+from torchensemble.utils.stacking import check_stackable
+from torchensemble.utils.stacking import TrainableStackedEstimators
+from torchensemble.utils.logging import set_logger
+
+
+stackable = [
+    torchensemble.VotingClassifier,
+    torchensemble.VotingRegressor,
+    torchensemble.BaggingClassifier,
+    torchensemble.BaggingRegressor,
+]
+
+
+jointly_fitted = [
+    torchensemble.FusionClassifier,
+    torchensemble.FusionRegressor,
+    torchensemble.SoftGradientBoostingClassifier,
+    torchensemble.SoftGradientBoostingRegressor,
+]
+
+
+set_logger("pytest_forward_mode")
+
+
+# Base estimator
+class MLP(nn.Module):
+    def __init__(self, output_dim=2):
+        super(MLP, self).__init__()
+        self.linear1 = nn.Linear(2, 2)
+        self.linear2 = nn.Linear(2, output_dim)
+
+    def forward(self, X):
+        X = X.view(X.size()[0], -1)
+        output = self.linear1(X)
+        output = self.linear2(output)
+        return output
+
+
+# Training data
+X_train = torch.Tensor(
+    np.array(([0.1, 0.1], [0.2, 0.2], [0.3, 0.3], [0.4, 0.4]))
+)
+y_train_clf = torch.LongTensor(np.array(([0, 0, 1, 1])))
+y_train_reg = torch.FloatTensor(np.array(([0.1, 0.2, 0.3, 0.4])))
+y_train_reg = y_train_reg.view(-1, 1)
+
+
+@pytest.mark.parametrize("method", stackable + jointly_fitted)
+def test_stacked_forward(method):
+    pytest.importorskip("torch.func")
+
+    is_classifier = "Classifier" in method.__name__
+    model = method(
+        estimator=MLP,
+        n_estimators=3,
+        estimator_args={"output_dim": 2 if is_classifier else 1},
+        cuda=False,
+    )
+    model.set_optimizer("Adam", lr=1e-3)
+
+    y_train = y_train_clf if is_classifier else y_train_reg
+    train_loader = DataLoader(TensorDataset(X_train, y_train), batch_size=2)
+    model.fit(train_loader, epochs=1, save_model=False)
+
+    model.set_forward_mode("sequential")
+    expected = model.predict(X_train)
+
+    model.set_forward_mode("stacked")
+    actual = model.predict(X_train)
+
+    assert_array_almost_equal(actual.numpy(), expected.numpy())
+
+    # Stacked tensors are dropped on pickling, and rebuilt on first use
+    estimators, stacked_estimators = pickle.loads(
+        pickle.dumps((model.estimators_, model._stacked_estimators))
+    )
+    with torch.no_grad():
+        outputs = stacked_estimators(estimators, X_train)
+        expected = model._stacked_forward(X_train)
+
+    assert_array_almost_equal(outputs.numpy(), expected.numpy())
+
+
+@pytest.mark.parametrize("method", jointly_fitted)
+def test_stacked_training(method):
+    pytest.importorskip("torch.func")
+
+    is_classifier = "Classifier" in method.__name__
+    y_train = y_train_clf if is_classifier else y_train_reg
+    train_loader = DataLoader(TensorDataset(X_train, y_train), batch_size=2)
+
+    predictions = []
+    for training in (False, True):
+        torch.manual_seed(0)
+        model = method(
+            estimator=MLP,
+            n_estimators=3,
+            estimator_args={"output_dim": 2 if is_classifier else 1},
+            cuda=False,
+        )
+        model.set_optimizer("SGD", lr=1e-1)
+        if training:
+            model.set_forward_mode("stacked", training=True)
+        model.fit(train_loader, epochs=2, save_model=False)
+        predictions.append(model.predict(X_train))
+
+    assert_array_almost_equal(predictions[0].numpy(), predictions[1].numpy())
+
+
+def test_trainable_stacked_estimators():
+    pytest.importorskip("torch.func")
+
+    def _make_estimator():
+        return nn.Sequential(nn.Linear(2, 2), nn.BatchNorm1d(2))
+
+    estimators = [_make_estimator() for _ in range(2)]
+    copies = [_make_estimator() for _ in range(2)]
+    for estimator, copied in zip(estimators, copies):
+        copied.load_state_dict(estimator.state_dict())
+
+    # The sum of outputs of batch normalization has zero gradients on its
+    # weights, and outputs are squared to compare non-trivial gradients
+    outputs = TrainableStackedEstimators()(estimators, X_train)
+    outputs.pow(2).sum().backward()
+
+    expected = torch.stack([copied(X_train) for copied in copies])
+    expected.pow(2).sum().backward()
+
+    assert_array_almost_equal(
+        outputs.detach().numpy(), expected.detach().numpy()
+    )
+    for estimator, copied in zip(estimators, copies):
+        for param, param_ in zip(estimator.parameters(), copied.parameters()):
+            assert torch.allclose(param.grad, param_.grad)
+        for buffer, buffer_ in zip(estimator.buffers(), copied.buffers()):
+            assert torch.equal(buffer, buffer_)
+
+
+def test_invalid_forward_mode():
+    model = torchensemble.VotingClassifier(
+        estimator=MLP, n_estimators=2, cuda=False
+    )
+
+    with pytest.raises(ValueError) as excinfo:
+        model.set_forward_mode("parallel")
+    assert "forward mode should be one of" in str(excinfo.value)
+
+    with pytest.raises(ValueError) as excinfo:
+        model.set_forward_mode("sequential", training=True)
+    assert "requires the forward mode `stacked`" in str(excinfo.value)
+
+    # Base estimators in voting and bagging are not fitted jointly
+    for method in stackable:
+        model = method(estimator=MLP, n_estimators=2, cuda=False)
+        with pytest.raises(ValueError) as excinfo:
+            model.set_forward_mode("stacked", training=True)
+        msg = "is not supported by {}".format(method.__name__)
+        assert msg in str(excinfo.value)
+
+
+def test_check_stackable():
+    with pytest.raises(ValueError) as excinfo:
+        check_stackable([MLP(output_dim=2), MLP(output_dim=1)])
+    assert "does not share the same architecture" in str(excinfo.value)
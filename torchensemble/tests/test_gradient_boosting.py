@@ -0,0 +1,109 @@
+import torch
+import pytest
+import numpy as np
+import torch.nn as nn
+from torch.utils.data import TensorDataset, DataLoader
+
+import torchensemble
+from torchensemble.utils.logging import set_logger
+
+
+set_logger("pytest_gradient_boosting")
+
+
+# Base estimator
+class MLP(nn.Module):
+    def __init__(self, output_dim=2):
+        super(MLP, self).__init__()
+        self.linear1 = nn.Linear(2, 2)
+        self.linear2 = nn.Linear(2, output_dim)
+
+    def forward(self, X):
+        X = X.view(X.size()[0], -1)
+        output = self.linear1(X)
+        output = self.linear2(output)
+        return output
+
+
+# Training data
+X_train = torch.Tensor(
+    np.array(([0.1, 0.1], [0.2, 0.2], [0.3, 0.3], [0.4, 0.4]))
+)
+y_train_clf = torch.LongTensor(np.array(([0, 0, 1, 1])))
+y_train_reg = torch.FloatTensor(np.array(([0.1, 0.2, 0.3, 0.4])))
+y_train_reg = y_train_reg.view(-1, 1)
+
+
+def _fit(method, y_train, **estimator_args):
+    model = method(
+        estimator=MLP,
+        n_estimators=3,
+        estimator_args=estimator_args,
+        cuda=False,
+    )
+    model.set_optimizer("Adam", lr=1e-3)
+
+    train_loader = DataLoader(TensorDataset(X_train, y_train), batch_size=2)
+    model.fit(train_loader, epochs=1, save_model=False)
+
+    return model
+
+
+def test_early_exit_classifier():
+    model = _fit(torchensemble.GradientBoostingClassifier, y_train_clf)
+
+    # No sample is decided before the last base estimator
+    proba, n_stages = model.predict_early_exit(X_train, threshold=1.0)
+    assert torch.equal(proba, model.predict(X_train))
+    assert torch.equal(n_stages, torch.full((4,), 3, dtype=torch.long))
+
+    # All samples are decided after the first base estimator
+    proba, n_stages = model.predict_early_exit(X_train, threshold=0.0)
+    assert torch.equal(n_stages, torch.ones(4, dtype=torch.long))
+    assert torch.allclose(
+        proba, torch.softmax(model.shrinkage_rate * model[0](X_train), 1)
+    )
+
+    with pytest.raises(ValueError) as excinfo:
+        model.predict_early_exit(X_train, threshold=2.0)
+    assert "margin of class probabilities" in str(excinfo.value)
+
+
+def test_early_exit_regressor():
+    model = _fit(
+        torchensemble.GradientBoostingRegressor, y_train_reg, output_dim=1
+    )
+
+    pred, n_stages = model.predict_early_exit(X_train, threshold=0.0)
+    assert torch.equal(pred, model.predict(X_train))
+    assert torch.equal(n_stages, torch.full((4,), 3, dtype=torch.long))
+
+    _, n_stages = model.predict_early_exit(X_train, threshold=float("inf"))
+    assert torch.equal(n_stages, torch.ones(4, dtype=torch.long))
+
+    with pytest.raises(ValueError) as excinfo:
+        model.predict_early_exit(X_train, threshold=-1.0)
+    assert "magnitude of updates" in str(excinfo.value)
+
+
+@pytest.mark.parametrize(
+    "method, y_train, output_dim",
+    [
+        (torchensemble.GradientBoostingClassifier, y_train_clf, 2),
+        (torchensemble.GradientBoostingRegressor, y_train_reg, 1),
+    ],
+)
+def test_validation_accumulated(method, y_train, output_dim):
+    model = _fit(method, y_train, output_dim=output_dim)
+    test_loader = DataLoader(TensorDataset(X_train, y_train), batch_size=3)
+
+    accumulated = []
+    for est_idx in range(model.n_estimators):
+        expected = list(model._validation_outputs(test_loader, est_idx))
+        outputs = list(
+            model._validation_outputs(test_loader, est_idx, accumulated)
+        )
+        assert len(outputs) == len(expected) == 2
+        for (output, target), (output_, target_) in zip(outputs, expected):
+            assert torch.allclose(output, output_, atol=1e-6)
+            assert torch.equal(target, target_)
@@ -0,0 +1,151 @@
+import os
+import torch
+import pytest
+import numpy as np
+import torch.nn as nn
+from torch.utils.data import TensorDataset, DataLoader
+
+import torchensemble
+from torchensemble.utils import io
+from torchensemble.utils.logging import set_logger
+
+
+set_logger("pytest_io")
+
+
+# Base estimator
+class MLP(nn.Module):
+    def __init__(self):
+        super(MLP, self).__init__()
+        self.linear1 = nn.Linear(2, 2)
+        self.linear2 = nn.Linear(2, 2)
+
+    def forward(self, X):
+        X = X.view(X.size()[0], -1)
+        output = self.linear1(X)
+        output = self.linear2(output)
+        return output
+
+
+# Training data
+X_train = torch.Tensor(
+    np.array(([0.1, 0.1], [0.2, 0.2], [0.3, 0.3], [0.4, 0.4]))
+)
+y_train = torch.LongTensor(np.array(([0, 0, 1, 1])))
+
+train = TensorDataset(X_train, y_train)
+train_loader = DataLoader(train, batch_size=2, shuffle=False)
+
+
+def _fit(tmpdir):
+    model = torchensemble.VotingClassifier(
+        estimator=MLP, n_estimators=2, cuda=False
+    )
+    model.set_optimizer("Adam", lr=1e-3)
+    model.set_checkpoint_format("sharded")
+    model.fit(train_loader, epochs=1, save_dir=str(tmpdir))
+
+    return model
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_sharded_save_load(tmpdir, lazy):
+    model = _fit(tmpdir)
+
+    ckpt_dir = str(tmpdir.join("VotingClassifier_MLP_2_ckpt"))
+    assert sorted(os.listdir(ckpt_dir)) == [
+        "ensemble.pth",
+        "estimator_000.pth",
+        "estimator_001.pth",
+        "manifest.json",
+    ]
+
+    new_model = torchensemble.VotingClassifier(
+        estimator=MLP, n_estimators=2, cuda=False
+    )
+    io.load(new_model, str(tmpdir), lazy=lazy)
+
+    assert len(new_model.estimators_) == 2
+    assert torch.equal(new_model.predict(X_train), model.predict(X_train))
+
+
+def test_sharded_save_unchanged(tmpdir, monkeypatch):
+    model = _fit(tmpdir)
+
+    saved = []
+    atomic_save = io._atomic_save
+
+    def _atomic_save(obj, filename):
+        saved.append(os.path.basename(filename))
+        atomic_save(obj, filename)
+
+    monkeypatch.setattr(io, "_atomic_save", _atomic_save)
+
+    # Only the updated base estimator is rewritten
+    with torch.no_grad():
+        model.estimators_[1].linear1.weight.add_(1.0)
+    io.save(model, str(tmpdir), model.logger)
+
+    assert saved == ["estimator_001.pth", "ensemble.pth"]
+
+
+def test_sharded_save_out_of_process(tmpdir, monkeypatch):
+    model = _fit(tmpdir)
+
+    saved = []
+    atomic_save = io._atomic_save
+
+    def _atomic_save(obj, filename):
+        saved.append(os.path.basename(filename))
+        atomic_save(obj, filename)
+
+    monkeypatch.setattr(io, "_atomic_save", _atomic_save)
+
+    # An update from another process does not change the version counter
+    weight = model.estimators_[0].linear1.weight
+    version = weight._version
+    weight.detach().numpy()[:] += 1.0
+    assert weight._version == version
+
+    model._clear_caches()
+    io.save(model, str(tmpdir), model.logger)
+
+    assert saved == [
+        "estimator_000.pth",
+        "estimator_001.pth",
+        "ensemble.pth",
+    ]
+
+
+def test_invalid_checkpoint_format():
+    model = torchensemble.VotingClassifier(
+        estimator=MLP, n_estimators=2, cuda=False
+    )
+
+    with pytest.raises(ValueError) as excinfo:
+        model.set_checkpoint_format("zip")
+    assert "checkpoint format should be one of" in str(excinfo.value)
+
+
+def test_checkpoint_writer(tmpdir):
+    model = _fit(tmpdir)
+    model.set_checkpoint_format("file")
+    expected = model.predict(X_train)
+
+    with io.CheckpointWriter(model.logger) as writer:
+        writer.save(model, str(tmpdir))
+
+        # Updating the ensemble does not affect the queued checkpoint
+        with torch.no_grad():
+            for param in model.parameters():
+                param.add_(1.0)
+
+    new_model = torchensemble.VotingClassifier(
+        estimator=MLP, n_estimators=2, cuda=False
+    )
+    io.load(new_model, str(tmpdir))
+
+    assert torch.equal(new_model.predict(X_train), expected)
+    assert not os.path.exists(
+        str(tmpdir.join("VotingClassifier_MLP_2_ckpt.pth.tmp"))
+    )
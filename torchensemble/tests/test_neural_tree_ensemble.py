@@ -1,7 +1,9 @@
 import torch
+import pickle
 import numpy as np
 from torch.utils.data import TensorDataset, DataLoader
 
+from torchensemble._base import BaseTree
 from torchensemble.utils import io
 from torchensemble.utils.logging import set_logger
 from torchensemble import NeuralForestClassifier, NeuralForestRegressor
@@ -137,3 +139,89 @@ def test_neural_forest_regressor():
     for _, (data, target) in enumerate(test_loader):
         new_model.predict(data)
         break
+
+
+def _naive_penalty(tree, X):
+    """Compute the regularization term node by node."""
+    batch_size = X.size()[0]
+    X = tree._data_augment(X)
+    path_prob = tree.inner_nodes(X)
+    path_prob = torch.unsqueeze(path_prob, dim=2)
+    path_prob = torch.cat((path_prob, 1 - path_prob), dim=2)
+
+    _mu = X.data.new(batch_size, 1, 1).fill_(1.0)
+    penalty = torch.tensor(0.0)
+
+    begin_idx, end_idx = 0, 1
+    for layer_idx in range(0, tree.depth):
+        _path_prob = path_prob[:, begin_idx:end_idx, :]
+        mu = _mu.view(batch_size, 2 ** layer_idx)
+        pp = _path_prob.reshape(batch_size, 2 ** (layer_idx + 1))
+        for node in range(0, 2 ** (layer_idx + 1)):
+            alpha = torch.sum(pp[:, node] * mu[:, node // 2], dim=0)
+            alpha /= torch.sum(mu[:, node // 2], dim=0)
+            coeff = tree.penalty_list[layer_idx]
+            penalty -= 0.5 * coeff * (torch.log(alpha) + torch.log(1 - alpha))
+
+        _mu = _mu.view(batch_size, -1, 1).repeat(1, 1, 2) * _path_prob
+        begin_idx = end_idx
+        end_idx = begin_idx + 2 ** (layer_idx + 1)
+
+    return _mu.view(batch_size, -1), penalty
+
+
+def test_base_tree_penalty():
+    tree = BaseTree(input_dim=2, output_dim=2, depth=4, lamda=1e-3)
+    X = torch.rand(8, 2)
+
+    mu, penalty = tree._forward(X)
+    expected_mu, expected_penalty = _naive_penalty(tree, X)
+
+    assert torch.equal(mu, expected_mu)
+    assert torch.allclose(penalty, expected_penalty)
+
+
+def test_stacked_trees():
+    model = NeuralForestClassifier(n_estimators=3, depth=3, cuda=False)
+    model.n_inputs = 2
+    model.n_outputs = 2
+    for _ in range(model.n_estimators):
+        model.estimators_.append(model._make_estimator())
+    model.eval()
+
+    # Soft decision trees are evaluated one by one by default
+    assert not model._use_stacked_forward()
+    output = model.forward(X_train)
+    output.sum().backward()
+    assert model.estimators_[0].leaf_nodes.weight.grad is not None
+
+    model.set_forward_mode("stacked")
+    outputs = model._stacked_forward(X_train)
+    expected = torch.stack([tree(X_train) for tree in model.estimators_])
+    assert torch.allclose(outputs, expected, atol=1e-6)
+
+    # Fused weights are rebuilt after base estimators are updated
+    with torch.no_grad():
+        model.estimators_[1].leaf_nodes.weight.add_(1.0)
+    outputs = model._stacked_forward(X_train)
+    assert torch.allclose(outputs[1], model.estimators_[1](X_train))
+
+    # Fused weights are rebuilt after updates from another process, which
+    # do not change the version counters
+    weight = model.estimators_[2].leaf_nodes.weight
+    weight.detach().numpy()[:] += 1.0
+    model._clear_caches()
+    outputs = model._stacked_forward(X_train)
+    assert torch.allclose(outputs[2], model.estimators_[2](X_train))
+
+    stacked_proba = model.predict(X_train)
+
+    # Fused weights are dropped on pickling, and rebuilt on first use
+    estimators, stacked_trees = pickle.loads(
+        pickle.dumps((model.estimators_, model._stacked_estimators))
+    )
+    outputs = stacked_trees(estimators, X_train)
+    assert torch.allclose(outputs, model._stacked_forward(X_train))
+
+    model.set_forward_mode("sequential")
+    assert torch.allclose(stacked_proba, model.predict(X_train), atol=1e-6)
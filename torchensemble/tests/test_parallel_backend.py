@@ -0,0 +1,390 @@
+import os
+import torch
+import pytest
+import numpy as np
+import torch.nn as nn
+from torch.utils.data import TensorDataset, DataLoader
+
+import torchensemble
+from torchensemble.voting import _parallel_fit_per_epoch
+from torchensemble.voting import _parallel_fit_per_batch
+from torchensemble.utils.parallel import get_trainer, LockstepTrainer
+from torchensemble.utils import set_module
+from torchensemble.utils.logging import set_logger
+
+
+parallel = [
+    torchensemble.VotingClassifier,
+    torchensemble.BaggingClassifier,
+    torchensemble.AdversarialTrainingClassifier,
+]
+
+
+set_logger("pytest_parallel_backend")
+
+
+# Base estimator
+class MLP(nn.Module):
+    def __init__(self):
+        super(MLP, self).__init__()
+        self.linear1 = nn.Linear(2, 2)
+        self.linear2 = nn.Linear(2, 2)
+
+    def forward(self, X):
+        X = X.view(X.size()[0], -1)
+        output = self.linear1(X)
+        output = self.linear2(output)
+        return output
+
+
+# Training data
+X_train = torch.Tensor(
+    np.array(([0.1, 0.1], [0.2, 0.2], [0.3, 0.3], [0.4, 0.4]))
+)
+y_train = torch.LongTensor(np.array(([0, 0, 1, 1])))
+
+train = TensorDataset(X_train, y_train)
+train_loader = DataLoader(train, batch_size=2, shuffle=False)
+
+
+@pytest.mark.parametrize("method", parallel)
+def test_shared_memory_backend(method):
+    model = method(estimator=MLP, n_estimators=2, cuda=False, n_jobs=2)
+    model.set_optimizer("Adam", lr=1e-3)
+    model.set_scheduler("MultiStepLR", milestones=[1])
+    model.set_parallel_backend("shared_memory")
+
+    model.fit(train_loader, epochs=2, save_model=False)
+
+    assert len(model.estimators_) == 2
+    for estimator in model.estimators_:
+        for param in estimator.parameters():
+            assert param.is_shared()
+
+    model.predict(X_train)
+
+
+def test_shared_memory_backend_validation(monkeypatch):
+    model = torchensemble.VotingClassifier(
+        estimator=MLP, n_estimators=2, cuda=False, n_jobs=2
+    )
+    model.set_optimizer("SGD", lr=1e-1)
+    model.set_parallel_backend("shared_memory")
+
+    # Record the validation outputs after each training epoch
+    outputs = []
+    evaluate_outputs = model._evaluate_outputs
+
+    def _evaluate_outputs(batches, *args):
+        # Outputs may be streamed over batches, which are iterated once
+        batches = list(batches)
+        outputs.append(torch.cat([output for output, _ in batches], dim=1))
+        return evaluate_outputs(batches, *args)
+
+    monkeypatch.setattr(model, "_evaluate_outputs", _evaluate_outputs)
+
+    model.fit(
+        train_loader, epochs=3, test_loader=train_loader, save_model=False
+    )
+
+    # Updates from the workers are visible to the validation
+    assert len(outputs) == 3
+    for before, after in zip(outputs[:-1], outputs[1:]):
+        assert not torch.equal(before, after)
+
+
+@pytest.mark.parametrize("method", parallel)
+@pytest.mark.parametrize("backend", ["joblib", "shared_memory", "threading"])
+def test_best_checkpoint(method, backend, monkeypatch, tmpdir):
+    model = method(estimator=MLP, n_estimators=2, cuda=False, n_jobs=2)
+    model.set_optimizer("SGD", lr=1e-1)
+    model.set_parallel_backend(backend)
+
+    # Record the base estimators evaluated after each training epoch
+    states = []
+    collect_outputs = model._collect_outputs
+
+    def _collect_outputs(estimators, test_loader):
+        states.append(
+            [
+                {k: v.clone() for k, v in e.state_dict().items()}
+                for e in estimators
+            ]
+        )
+        return collect_outputs(estimators, test_loader)
+
+    # The validation accuracy peaks after the second training epoch
+    accuracies = iter([50.0, 90.0, 70.0, 80.0])
+    monkeypatch.setattr(model, "_collect_outputs", _collect_outputs)
+    monkeypatch.setattr(
+        model, "_evaluate_outputs", lambda batches: next(accuracies)
+    )
+
+    model.fit(
+        train_loader,
+        epochs=4,
+        test_loader=train_loader,
+        save_dir=str(tmpdir),
+    )
+
+    # Base estimators in the last epoch are kept
+    assert len(states) == 4
+    for estimator, last in zip(model.estimators_, states[3]):
+        for key, value in estimator.state_dict().items():
+            assert torch.equal(value, last[key])
+
+    # Base estimators updated in place later do not affect the checkpoint
+    new_model = method(estimator=MLP, n_estimators=2, cuda=False)
+    torchensemble.utils.io.load(new_model, str(tmpdir))
+    for estimator, best in zip(new_model.estimators_, states[1]):
+        for key, value in estimator.state_dict().items():
+            assert torch.equal(value, best[key])
+
+
+def test_shared_memory_backend_update():
+    estimator = MLP()
+    optimizer = torch.optim.SGD(estimator.parameters(), lr=1e-1)
+    before = [p.clone() for p in estimator.parameters()]
+
+    with get_trainer(
+        "shared_memory",
+        _parallel_fit_per_epoch,
+        [estimator],
+        [optimizer],
+        [train_loader],
+        n_jobs=1,
+        criterion=nn.CrossEntropyLoss(),
+        log_interval=100,
+        device=torch.device("cpu"),
+        is_classification=True,
+    ) as trainer:
+        trainer.fit_per_epoch(0, None)
+
+    # Parameters updated by the worker are visible in the main process
+    after = list(estimator.parameters())
+    assert any(not torch.equal(b, a) for b, a in zip(before, after))
+
+
+def test_invalid_parallel_backend():
+    model = torchensemble.VotingClassifier(
+        estimator=MLP, n_estimators=2, cuda=False
+    )
+
+    with pytest.raises(ValueError) as excinfo:
+        model.set_parallel_backend("dask")
+    assert "parallel backend should be one of" in str(excinfo.value)
+
+    with pytest.raises(ValueError) as excinfo:
+        model.set_parallel_backend("joblib", pin_cpus=True)
+    assert "Unrecognized argument" in str(excinfo.value)
+
+
+@pytest.mark.parametrize("method", parallel)
+def test_threading_backend(method):
+    model = method(estimator=MLP, n_estimators=2, cuda=False, n_jobs=2)
+    model.set_optimizer("Adam", lr=1e-3)
+    model.set_scheduler("MultiStepLR", milestones=[1])
+    model.set_parallel_backend("threading")
+
+    num_threads = torch.get_num_threads()
+    model.fit(
+        train_loader, epochs=2, test_loader=train_loader, save_model=False
+    )
+
+    assert len(model.estimators_) == 2
+    assert torch.get_num_threads() == num_threads
+
+    model.predict(X_train)
+
+
+def test_threading_backend_num_threads():
+    num_threads = torch.get_num_threads()
+    torch.set_num_threads(4)
+
+    # Record the number of intra-op threads seen by each worker
+    seen = []
+
+    def fit_func(estimator, optimizer, **kwargs):
+        seen.append(torch.get_num_threads())
+        return estimator, optimizer
+
+    try:
+        with get_trainer(
+            "threading",
+            fit_func,
+            [MLP(), MLP()],
+            [None, None],
+            [None, None],
+            n_jobs=2,
+        ) as trainer:
+            trainer.fit_per_epoch(0, None)
+            assert torch.get_num_threads() == 2
+
+        # The number of intra-op threads is shared by all workers
+        assert seen == [2, 2]
+        assert torch.get_num_threads() == 4
+    finally:
+        torch.set_num_threads(num_threads)
+
+
+def test_threading_backend_update():
+    estimator = MLP()
+    optimizer = torch.optim.SGD(estimator.parameters(), lr=1e-1)
+    before = [p.clone() for p in estimator.parameters()]
+
+    with get_trainer(
+        "threading",
+        _parallel_fit_per_epoch,
+        [estimator],
+        [optimizer],
+        [train_loader],
+        n_jobs=1,
+        backend_args={"pin_cpus": hasattr(os, "sched_setaffinity")},
+        criterion=nn.CrossEntropyLoss(),
+        log_interval=100,
+        device=torch.device("cpu"),
+        is_classification=True,
+    ) as trainer:
+        trainer.fit_per_epoch(0, None)
+
+    # Base estimators are updated in place by the worker
+    after = list(estimator.parameters())
+    assert any(not torch.equal(b, a) for b, a in zip(before, after))
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_lockstep_trainer(n_jobs):
+    estimators = [MLP(), MLP()]
+    copies = [MLP(), MLP()]
+    for estimator, copied in zip(estimators, copies):
+        copied.load_state_dict(estimator.state_dict())
+
+    fit_args = dict(
+        criterion=nn.CrossEntropyLoss(),
+        log_interval=100,
+        device=torch.device("cpu"),
+        is_classification=True,
+    )
+
+    # Lockstep on each data batch
+    optimizers = [
+        torch.optim.SGD(estimator.parameters(), lr=1e-1)
+        for estimator in estimators
+    ]
+    with LockstepTrainer(
+        _parallel_fit_per_batch,
+        estimators,
+        optimizers,
+        [train_loader],
+        n_jobs=n_jobs,
+        **fit_args
+    ) as trainer:
+        trainer.fit_per_epoch(0, None)
+
+    # Each base estimator iterates over the dataloader on its own
+    optimizers = [
+        torch.optim.SGD(estimator.parameters(), lr=1e-1)
+        for estimator in copies
+    ]
+    with get_trainer(
+        "joblib",
+        _parallel_fit_per_epoch,
+        copies,
+        optimizers,
+        [train_loader] * 2,
+        n_jobs=1,
+        **fit_args
+    ) as trainer:
+        trainer.fit_per_epoch(0, None)
+        copies = trainer.estimators
+
+    for estimator, copied in zip(estimators, copies):
+        for param, param_ in zip(estimator.parameters(), copied.parameters()):
+            assert torch.allclose(param, param_)
+
+
+def test_voting_lockstep():
+    model = torchensemble.VotingClassifier(
+        estimator=MLP, n_estimators=2, cuda=False, n_jobs=2
+    )
+    model.set_optimizer("Adam", lr=1e-3)
+    model.fit(train_loader, epochs=2, save_model=False, lockstep=True)
+
+    assert len(model.estimators_) == 2
+    model.predict(X_train)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_lockstep_trainer_joint_optimizer(n_jobs):
+    estimators = [MLP(), MLP()]
+    copies = [MLP(), MLP()]
+    for estimator, copied in zip(estimators, copies):
+        copied.load_state_dict(estimator.state_dict())
+
+    fit_args = dict(
+        criterion=nn.CrossEntropyLoss(),
+        log_interval=100,
+        device=torch.device("cpu"),
+        is_classification=True,
+    )
+
+    # A single optimizer with one parameter group for each base estimator
+    optimizer = set_module.set_joint_optimizer(estimators, "Adam", lr=1e-1)
+    assert len(optimizer.param_groups) == 2
+    with LockstepTrainer(
+        _parallel_fit_per_batch,
+        estimators,
+        [optimizer],
+        [train_loader],
+        n_jobs=n_jobs,
+        backend_args={"joint_optimizer": True},
+        **fit_args
+    ) as trainer:
+        trainer.fit_per_epoch(0, None)
+
+    # One optimizer for each base estimator
+    optimizers = [
+        set_module.set_optimizer(estimator, "Adam", lr=1e-1)
+        for estimator in copies
+    ]
+    with LockstepTrainer(
+        _parallel_fit_per_batch,
+        copies,
+        optimizers,
+        [train_loader],
+        n_jobs=n_jobs,
+        **fit_args
+    ) as trainer:
+        trainer.fit_per_epoch(0, None)
+
+    for estimator, copied in zip(estimators, copies):
+        for param, param_ in zip(estimator.parameters(), copied.parameters()):
+            assert torch.allclose(param, param_)
+
+
+@pytest.mark.parametrize("method", parallel)
+def test_joint_optimizer(method):
+    model = method(estimator=MLP, n_estimators=2, cuda=False, n_jobs=2)
+    model.set_optimizer("Adam", lr=1e-3)
+    model.set_scheduler("MultiStepLR", milestones=[1])
+
+    if method is torchensemble.BaggingClassifier:
+        fit_args = {"sampling": "poisson"}
+    else:
+        fit_args = {"lockstep": True}
+
+    with pytest.raises(ValueError) as excinfo:
+        model.fit(train_loader, epochs=1, joint_optimizer=True)
+    assert "The joint optimizer requires" in str(excinfo.value)
+
+    model.fit(
+        train_loader,
+        epochs=2,
+        test_loader=train_loader,
+        save_model=False,
+        joint_optimizer=True,
+        **fit_args
+    )
+
+    assert len(model.estimators_) == 2
+    model.predict(X_train)
@@ -0,0 +1,92 @@
+import torch
+import pytest
+import numpy as np
+import torch.nn as nn
+from torch.utils.data import TensorDataset, DataLoader
+
+import torchensemble
+from torchensemble.utils import io
+from torchensemble.utils.logging import set_logger
+from torchensemble.utils.quantization import quantize
+
+
+set_logger("pytest_quantization")
+
+
+# Base estimator
+class MLP(nn.Module):
+    def __init__(self):
+        super(MLP, self).__init__()
+        self.linear1 = nn.Linear(2, 2)
+        self.linear2 = nn.Linear(2, 2)
+
+    def forward(self, X):
+        X = X.view(X.size()[0], -1)
+        output = self.linear1(X)
+        output = self.linear2(output)
+        return output
+
+
+# Training data
+X_train = torch.Tensor(
+    np.array(([0.1, 0.1], [0.2, 0.2], [0.3, 0.3], [0.4, 0.4]))
+)
+y_train = torch.LongTensor(np.array(([0, 0, 1, 1])))
+
+train_loader = DataLoader(TensorDataset(X_train, y_train), batch_size=2)
+
+
+def _fit(method):
+    model = method(estimator=MLP, n_estimators=2, cuda=False)
+    model.set_optimizer("Adam", lr=1e-3)
+    model.fit(train_loader, epochs=1, save_model=False)
+
+    return model
+
+
+@pytest.mark.parametrize(
+    "method",
+    [torchensemble.VotingClassifier, torchensemble.GradientBoostingClassifier],
+)
+@pytest.mark.parametrize("quantization", ["dynamic", "static"])
+def test_quantize(tmpdir, method, quantization):
+    model = _fit(method)
+    quantized = quantize(
+        model,
+        method=quantization,
+        calibration_loader=train_loader,
+        test_loader=train_loader,
+        save_model=True,
+        save_dir=str(tmpdir),
+    )
+
+    # The original ensemble is unchanged
+    assert isinstance(model.estimators_[0].linear1, nn.Linear)
+    for estimator in quantized.estimators_:
+        for module in estimator.modules():
+            assert not isinstance(module, nn.Linear)
+
+    pred = quantized.predict(X_train)
+    assert torch.allclose(pred, model.predict(X_train), atol=0.1)
+
+    # Load the quantized ensemble
+    new_model = method(estimator=MLP, n_estimators=2, cuda=False)
+    io.load(new_model, str(tmpdir))
+    assert new_model.quantization_ == quantization
+    assert torch.allclose(new_model.predict(X_train), pred)
+
+
+def test_quantize_parameters():
+    model = _fit(torchensemble.VotingClassifier)
+
+    with pytest.raises(ValueError) as excinfo:
+        quantize(model, method="fp16")
+    assert "quantization method should be one of" in str(excinfo.value)
+
+    with pytest.raises(ValueError) as excinfo:
+        quantize(model, method="static")
+    assert "requires a `calibration_loader`" in str(excinfo.value)
+
+    with pytest.raises(ValueError) as excinfo:
+        quantize(model, test_loader=train_loader, tolerance=-1.0)
+    assert "tolerance on the degradation" in str(excinfo.value)
@@ -0,0 +1,56 @@
+import torch
+import pytest
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+
+from torchensemble.utils import operator as op
+from torchensemble.soft_gradient_boosting import _compute_pseudo_residual
+
+
+torch.manual_seed(0)
+
+n_estimators = 4
+shrinkage_rate = 0.5
+output = torch.randn(n_estimators, 3, 2)
+target_clf = torch.LongTensor(np.array(([0, 1, 1])))
+target_reg = torch.randn(3, 2)
+
+
+def _naive_pseudo_residual(output, target, is_classification):
+    residuals = []
+    for i in range(output.size(0)):
+        accumulated_output = torch.zeros_like(output[0])
+        for j in range(i):
+            accumulated_output += shrinkage_rate * output[j]
+
+        if is_classification:
+            residual = op.pseudo_residual_classification(
+                target, accumulated_output, 2
+            )
+        else:
+            residual = op.pseudo_residual_regression(
+                target, accumulated_output
+            )
+        residuals.append(residual)
+
+    return torch.stack(residuals)
+
+
+@pytest.mark.parametrize("is_classification", [True, False])
+def test_compute_pseudo_residual(is_classification):
+    target = target_clf if is_classification else target_reg
+
+    actual = _compute_pseudo_residual(
+        output, target, shrinkage_rate, 2, is_classification
+    )
+    expected = _naive_pseudo_residual(output, target, is_classification)
+
+    assert_array_almost_equal(actual.numpy(), expected.numpy())
+
+
+def test_compute_pseudo_residual_invalid_shape():
+    with pytest.raises(ValueError) as excinfo:
+        _compute_pseudo_residual(
+            output, target_reg.view(-1), shrinkage_rate, 2, False
+        )
+    assert "should be the same as output" in str(excinfo.value)
@@ -0,0 +1,99 @@
+import torch
+import pytest
+import numpy as np
+import torch.nn as nn
+from torch.utils.data import TensorDataset, DataLoader
+
+import torchensemble
+
+
+staged_clf = [
+    torchensemble.GradientBoostingClassifier,
+    torchensemble.SoftGradientBoostingClassifier,
+    torchensemble.SnapshotEnsembleClassifier,
+    torchensemble.FastGeometricClassifier,
+]
+
+staged_reg = [
+    torchensemble.GradientBoostingRegressor,
+    torchensemble.SoftGradientBoostingRegressor,
+    torchensemble.SnapshotEnsembleRegressor,
+    torchensemble.FastGeometricRegressor,
+]
+
+
+# Base estimator
+class MLP(nn.Module):
+    def __init__(self, output_dim=2):
+        super(MLP, self).__init__()
+        self.linear1 = nn.Linear(2, 2)
+        self.linear2 = nn.Linear(2, output_dim)
+
+    def forward(self, X):
+        X = X.view(X.size()[0], -1)
+        output = self.linear1(X)
+        output = self.linear2(output)
+        return output
+
+
+# Testing data
+X_test = torch.Tensor(np.random.rand(4, 2))
+y_test_clf = torch.LongTensor(np.array(([0, 1, 1, 0])))
+y_test_reg = torch.Tensor(np.random.rand(4, 1))
+
+
+def _make_model(method, criterion, **estimator_args):
+    model = method(
+        estimator=MLP,
+        n_estimators=3,
+        estimator_args=estimator_args,
+        cuda=False,
+    )
+    for _ in range(model.n_estimators):
+        model.estimators_.append(model._make_estimator())
+    model._criterion = criterion
+
+    return model
+
+
+def _prefix(model, n_estimators):
+    """Only keep the first `n_estimators` base estimators in the ensemble."""
+    estimators = model.estimators_
+    model.estimators_ = nn.ModuleList(estimators[:n_estimators])
+    return model, estimators
+
+
+@pytest.mark.parametrize("method", staged_clf)
+def test_staged_classifier(method):
+    model = _make_model(method, nn.CrossEntropyLoss())
+    test_loader = DataLoader(TensorDataset(X_test, y_test_clf), batch_size=2)
+
+    staged_proba = list(model.staged_predict(X_test))
+    staged_acc, staged_loss = model.staged_evaluate(
+        test_loader, return_loss=True
+    )
+    assert len(staged_proba) == len(staged_acc) == len(staged_loss) == 3
+
+    for idx in range(3):
+        model, estimators = _prefix(model, idx + 1)
+        assert torch.allclose(staged_proba[idx], model.predict(X_test))
+        acc, loss = model.evaluate(test_loader, return_loss=True)
+        assert staged_acc[idx] == acc
+        assert staged_loss[idx] == pytest.approx(loss)
+        model.estimators_ = estimators
+
+
+@pytest.mark.parametrize("method", staged_reg)
+def test_staged_regressor(method):
+    model = _make_model(method, nn.MSELoss(), output_dim=1)
+    test_loader = DataLoader(TensorDataset(X_test, y_test_reg), batch_size=2)
+
+    staged_pred = list(model.staged_predict(X_test))
+    staged_mse = model.staged_evaluate(test_loader)
+    assert len(staged_pred) == len(staged_mse) == 3
+
+    for idx in range(3):
+        model, estimators = _prefix(model, idx + 1)
+        assert torch.allclose(staged_pred[idx], model.predict(X_test))
+        assert staged_mse[idx] == pytest.approx(model.evaluate(test_loader))
+        model.estimators_ = estimators
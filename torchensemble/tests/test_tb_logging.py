@@ -89,6 +89,7 @@ def test_clf_class(clf):
     """
     This unit test checks the training and evaluating stage of all classifiers.
     """
+    torch.manual_seed(0)
     epochs = 1
     n_estimators = 2
 
@@ -138,6 +139,7 @@ def test_clf_object(clf):
     """
     This unit test checks the training and evaluating stage of all classifiers.
     """
+    torch.manual_seed(0)
     epochs = 1
     n_estimators = 2
 
@@ -187,6 +189,7 @@ def test_reg_class(reg):
     """
     This unit test checks the training and evaluating stage of all regressors.
     """
+    torch.manual_seed(0)
     epochs = 1
     n_estimators = 2
 
@@ -236,6 +239,7 @@ def test_reg_object(reg):
     """
     This unit test checks the training and evaluating stage of all regressors.
     """
+    torch.manual_seed(0)
     epochs = 1
     n_estimators = 2
 
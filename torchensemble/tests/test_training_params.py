@@ -121,6 +121,23 @@ def test_snapshot_ensemble():
     assert "should be a multiple of n_estimators" in str(excinfo.value)
 
 
+def test_bagging_sampling():
+    model = torchensemble.BaggingClassifier(
+        estimator=MLP, n_estimators=2, cuda=False
+    )
+    model.set_optimizer("Adam", lr=1e-3)
+
+    # Sampling
+    with pytest.raises(ValueError) as excinfo:
+        model.fit(train_loader, sampling="subsample")
+    assert "sampling strategy should be one of" in str(excinfo.value)
+
+    # Online bagging
+    model.fit(train_loader, epochs=2, save_model=False, sampling="poisson")
+    assert len(model.estimators_) == 2
+    model.predict(X_train)
+
+
 def test_adversarial_training():
     model = torchensemble.AdversarialTrainingClassifier(
         estimator=MLP, n_estimators=2, cuda=False
@@ -158,3 +175,87 @@ def test_neural_forest():
     with pytest.raises(ValueError) as excinfo:
         model.fit(train_loader, epochs=1)
     assert "coefficient of the regularization term" in str(excinfo.value)
+
+
+@pytest.mark.skipif(
+    not hasattr(torch, "autocast"), reason="requires torch.autocast"
+)
+@pytest.mark.parametrize(
+    "method",
+    parallel
+    + [
+        torchensemble.GradientBoostingClassifier,
+        torchensemble.SnapshotEnsembleClassifier,
+    ],
+)
+def test_precision(method):
+    model = method(estimator=MLP, n_estimators=2, cuda=False)
+    model.set_optimizer("Adam", lr=1e-3)
+
+    with pytest.raises(ValueError) as excinfo:
+        model.set_precision("fp16")
+    assert "precision should be one of" in str(excinfo.value)
+
+    model.set_precision("bf16")
+    model.fit(train_loader, epochs=2, save_model=False)
+
+    # Parameters are kept in float32
+    for param in model.parameters():
+        assert param.dtype == torch.float32
+
+    pred = model.predict(X_train)
+    assert pred.dtype == torch.float32
+
+
+class MLP_BN(nn.Module):
+    def __init__(self):
+        super(MLP_BN, self).__init__()
+        self.linear1 = nn.Linear(2, 2)
+        self.bn = nn.BatchNorm1d(2)
+        self.linear2 = nn.Linear(2, 2)
+
+    def forward(self, X):
+        X = X.view(X.size()[0], -1)
+        output = self.bn(self.linear1(X))
+        output = self.linear2(output)
+        return output
+
+
+@pytest.mark.parametrize(
+    "method",
+    [
+        torchensemble.SnapshotEnsembleClassifier,
+        torchensemble.FastGeometricClassifier,
+    ],
+)
+def test_average_weights(method, monkeypatch):
+    model = method(estimator=MLP_BN, n_estimators=2, cuda=False)
+    model.set_optimizer("SGD", lr=1e-1)
+
+    n_calls = []
+    update_bn = model._update_bn
+
+    def _update_bn(*args):
+        n_calls.append(1)
+        return update_bn(*args)
+
+    monkeypatch.setattr(model, "_update_bn", _update_bn)
+
+    fit_args = {"epochs": 2, "save_model": False, "average_weights": True}
+    if method is torchensemble.FastGeometricClassifier:
+        fit_args.update({"cycle": 2})
+    model.fit(train_loader, **fit_args)
+
+    # One base estimator averaged over all snapshots
+    assert len(model.estimators_) == 1
+    assert model.n_snapshots_ == 2
+
+    # Without validation, statistics are recomputed once at the end
+    assert len(n_calls) == 1
+
+    # Statistics of batch normalization are recomputed on all samples
+    bn = model.estimators_[0].bn
+    with torch.no_grad():
+        hidden = model.estimators_[0].linear1(X_train)
+    assert torch.allclose(bn.running_mean, hidden.mean(0), atol=1e-5)
+    model.predict(X_train)
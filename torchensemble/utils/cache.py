@@ -0,0 +1,153 @@
+"""
+  This module implements caches on the outputs of fitted base estimators,
+  which are used to avoid re-running frozen base estimators on the same data.
+"""
+
+
+import os
+import torch
+import weakref
+import tempfile
+import numpy as np
+
+from .io import _fingerprint, _is_unchanged
+
+
+__all__ = ["OutputCache", "ValidationCache"]
+
+
+class OutputCache(object):
+    """
+    Per-sample cache on the accumulated outputs of fitted base estimators,
+    indexed by the positions of samples in the dataset.
+
+    Parameters
+    ----------
+    n_samples : int
+        The number of samples in the dataset.
+    device : torch.device
+        The device where the cached outputs are returned.
+    cache_dir : string, default=None
+        Specify where to store the cached outputs.
+
+        - If ``None``, the cached outputs are kept in memory on ``device``.
+        - If not ``None``, the cached outputs are stored in a memory-mapped
+          file under the specified directory: ``cache_dir``.
+    name : string, default="output_cache"
+        The filename prefix of the memory-mapped file, which is followed by
+        a unique suffix.
+    """
+
+    def __init__(self, n_samples, device, cache_dir=None, name="output_cache"):
+        self.n_samples = n_samples
+        self.device = device
+        self.cache_dir = cache_dir
+        self.name = name
+        self.outputs_ = None
+
+    def _allocate(self, output_shape):
+        shape = (self.n_samples,) + tuple(output_shape)
+
+        if self.cache_dir is None:
+            self.outputs_ = torch.zeros(shape, device=self.device)
+        else:
+            if not os.path.isdir(self.cache_dir):
+                os.mkdir(self.cache_dir)
+            # A unique filename, so that caches sharing `cache_dir` do not
+            # overwrite each other
+            fd, self.filename_ = tempfile.mkstemp(
+                suffix=".npy", prefix=self.name + "_", dir=self.cache_dir
+            )
+            os.close(fd)
+            buffer = np.lib.format.open_memmap(
+                self.filename_, mode="w+", dtype=np.float32, shape=shape
+            )
+            self.outputs_ = torch.from_numpy(buffer)
+
+    def is_empty(self):
+        """Return whether no outputs have been accumulated into the cache."""
+        return self.outputs_ is None
+
+    def __getitem__(self, indices):
+        """Return the accumulated outputs of samples with ``indices``."""
+        if self.is_empty():
+            msg = "Cannot read from an empty cache."
+            raise RuntimeError(msg)
+
+        return self.outputs_[indices.to(self.outputs_.device)].to(self.device)
+
+    @torch.no_grad()
+    def update(self, indices, output):
+        """
+        Accumulate ``output`` into the cache for samples with ``indices``.
+        """
+        if self.is_empty():
+            self._allocate(output.size()[1:])
+
+        indices = indices.to(self.outputs_.device)
+        output = output.detach().to(self.outputs_.device)
+        self.outputs_.index_add_(0, indices, output.type_as(self.outputs_))
+
+    def clear(self):
+        """Release the cached outputs and remove the memory-mapped file."""
+        self.outputs_ = None
+        if self.cache_dir is not None and hasattr(self, "filename_"):
+            if os.path.exists(self.filename_):
+                os.remove(self.filename_)
+
+
+class ValidationCache(object):
+    """
+    Cache on the outputs of base estimators over all batches of a validation
+    dataloader. The cache is valid until any base estimator is updated or a
+    different dataloader is used.
+
+    Parameters
+    ----------
+    max_size : int, default=0
+        The maximum size in bytes of the cached outputs. Outputs exceeding
+        ``max_size`` are not cached, and the cache is disabled by default.
+    """
+
+    def __init__(self, max_size=0):
+        self.max_size = max_size
+        self.clear()
+
+    def __getstate__(self):
+        # Weak references cannot be pickled, and the cache is not copied
+        return {"max_size": self.max_size}
+
+    def __setstate__(self, state):
+        self.max_size = state.get("max_size", 0)
+        self.clear()
+
+    def get(self, estimators, dataloader):
+        """
+        Return the cached list of ``(outputs, target)``, or ``None`` if the
+        cache does not match ``estimators`` and ``dataloader``.
+        """
+        if self.batches_ is None or self._dataloader() is not dataloader:
+            return None
+
+        if len(estimators) != len(self._fingerprints):
+            return None
+
+        for estimator, fingerprint in zip(estimators, self._fingerprints):
+            if not _is_unchanged(estimator, fingerprint):
+                return None
+
+        return self.batches_
+
+    def set(self, estimators, dataloader, batches):
+        """Cache the list of ``(outputs, target)`` on all batches."""
+        self._dataloader = weakref.ref(dataloader)
+        self._fingerprints = [
+            _fingerprint(estimator) for estimator in estimators
+        ]
+        self.batches_ = batches
+
+    def clear(self):
+        """Release the cached outputs."""
+        self._dataloader = None
+        self._fingerprints = None
+        self.batches_ = None
@@ -1,4 +1,20 @@
-from torch.utils.data import DataLoader
+import os
+import torch
+import numpy as np
+from collections import deque
+from torch.utils.data import (
+    BatchSampler,
+    DataLoader,
+    Dataset,
+    IterableDataset,
+    RandomSampler,
+    SequentialSampler,
+    Subset,
+    TensorDataset,
+)
+
+
+__sequential_batch_size__ = 128
 
 
 class FixedDataLoader(object):
@@ -20,3 +36,248 @@ class FixedDataLoader(object):
 
     def __len__(self):
         return len(self.elem_list)
+
+
+def is_indexable(dataloader):
+    """
+    Check whether the sample indices of each batch produced by the dataloader
+    can be recovered, which requires a map-style dataset with auto-batching.
+    """
+    return (
+        isinstance(dataloader, DataLoader)
+        and not isinstance(dataloader.dataset, IterableDataset)
+        and dataloader.batch_sampler is not None
+    )
+
+
+class _RecordingBatchSampler(object):
+    """Batch sampler that records the indices of each batch it yields."""
+
+    def __init__(self, batch_sampler):
+        self.batch_sampler = batch_sampler
+        self.queue = deque()
+
+    def __iter__(self):
+        for indices in self.batch_sampler:
+            self.queue.append(list(indices))
+            yield indices
+
+    def __len__(self):
+        return len(self.batch_sampler)
+
+
+def _worker_kwargs(dataloader):
+    """
+    Return the keyword arguments on worker processes of ``dataloader`` that
+    are only accepted by :class:`DataLoader` with multiple workers.
+    """
+    if dataloader.num_workers == 0:
+        return {}
+
+    return {
+        "persistent_workers": dataloader.persistent_workers,
+        "prefetch_factor": dataloader.prefetch_factor,
+        "multiprocessing_context": dataloader.multiprocessing_context,
+    }
+
+
+class IndexedDataLoader(object):
+    """
+    Wrap a dataloader so that each batch is yielded along with the indices
+    of its samples in the underlying dataset.
+
+    The dataset, sampling order, and collating function of the original
+    dataloader are kept unchanged. Since batches are yielded in the same
+    order as the batch sampler produces their indices, the indices recorded
+    by the sampler can be matched with the batches even when the samples are
+    loaded by multiple workers in advance.
+    """
+
+    def __init__(self, dataloader):
+        # Check input
+        if not is_indexable(dataloader):
+            msg = (
+                "The input used to instantiate IndexedDataLoader should be a"
+                " DataLoader from `torch.utils.data` with a map-style dataset"
+                " and automatic batching enabled."
+            )
+            raise ValueError(msg)
+
+        self.dataset = dataloader.dataset
+        self._batch_sampler = _RecordingBatchSampler(dataloader.batch_sampler)
+        self._dataloader = DataLoader(
+            dataloader.dataset,
+            batch_sampler=self._batch_sampler,
+            num_workers=dataloader.num_workers,
+            collate_fn=dataloader.collate_fn,
+            pin_memory=dataloader.pin_memory,
+            timeout=dataloader.timeout,
+            worker_init_fn=dataloader.worker_init_fn,
+            **_worker_kwargs(dataloader)
+        )
+
+    def __iter__(self):
+        self._batch_sampler.queue.clear()
+        for elem in self._dataloader:
+            indices = self._batch_sampler.queue.popleft()
+            yield torch.as_tensor(indices, dtype=torch.int64), elem
+
+    def __len__(self):
+        return len(self._dataloader)
+
+
+def make_sequential_dataloader(dataloader):
+    """
+    Make an indexed dataloader that iterates over the dataset of
+    ``dataloader`` sequentially, which is used to compute outputs on all
+    samples. The batch size of ``dataloader`` is kept, and a fixed batch
+    size is used if it is built with a custom batch sampler instead.
+    """
+    batch_size = dataloader.batch_size
+    if batch_size is None:
+        batch_size = __sequential_batch_size__
+
+    sequential_dataloader = DataLoader(
+        dataloader.dataset,
+        batch_size=batch_size,
+        shuffle=False,
+        num_workers=dataloader.num_workers,
+        collate_fn=dataloader.collate_fn,
+        **_worker_kwargs(dataloader)
+    )
+
+    return IndexedDataLoader(sequential_dataloader)
+
+
+class MemmapTensorDataset(Dataset):
+    """
+    Dataset wrapping tensors stored in memory-mapped ``.npy`` files. Only the
+    filenames are pickled, so that the dataset can be sent to worker
+    processes without copying the data, and all workers share the pages of
+    the same files.
+    """
+
+    def __init__(self, filenames):
+        self.filenames = list(filenames)
+        self._tensors = None
+
+    @property
+    def tensors(self):
+        if self._tensors is None:
+            # Copy-on-write mappings, the files are never modified
+            self._tensors = [
+                torch.from_numpy(np.load(filename, mmap_mode="c"))
+                for filename in self.filenames
+            ]
+        return self._tensors
+
+    def __getitem__(self, index):
+        return tuple(tensor[index] for tensor in self.tensors)
+
+    def __len__(self):
+        return self.tensors[0].size(0)
+
+    def __getstate__(self):
+        return {"filenames": self.filenames}
+
+    def __setstate__(self, state):
+        self.filenames = state["filenames"]
+        self._tensors = None
+
+
+def _share_dataset(dataset, save_dir, memo):
+    """
+    Return a copy of ``dataset`` backed by memory-mapped files under
+    ``save_dir``, or ``None`` if the dataset is not supported.
+    """
+    if id(dataset) in memo:
+        return memo[id(dataset)]
+
+    shared = None
+    if isinstance(dataset, TensorDataset):
+        filenames = []
+        for tensor_idx, tensor in enumerate(dataset.tensors):
+            if tensor.is_cuda:
+                break
+            try:
+                array = tensor.detach().numpy()
+            except TypeError:
+                # Data types without numpy counterparts, e.g., bfloat16
+                break
+            filename = "dataset_{:03d}_tensor_{:03d}.npy".format(
+                len(memo), tensor_idx
+            )
+            filename = os.path.join(save_dir, filename)
+            np.save(filename, array)
+            filenames.append(filename)
+        else:
+            shared = MemmapTensorDataset(filenames)
+    elif isinstance(dataset, Subset):
+        inner = _share_dataset(dataset.dataset, save_dir, memo)
+        if inner is not None:
+            shared = Subset(inner, dataset.indices)
+
+    memo[id(dataset)] = shared
+
+    return shared
+
+
+def share_dataloaders(dataloaders, save_dir):
+    """
+    Return copies of ``dataloaders`` whose datasets are moved into
+    memory-mapped files under ``save_dir``, so that sending a dataloader to
+    worker processes only pickles the filenames. Datasets shared by several
+    dataloaders are stored only once.
+
+    Dataloaders are returned unchanged unless the dataset is a
+    :class:`TensorDataset` on CPU or a :class:`Subset` of such a dataset, and
+    the data is sampled by the default samplers.
+    """
+    memo = {}
+    return [
+        _share_dataloader(dataloader, save_dir, memo)
+        for dataloader in dataloaders
+    ]
+
+
+def _share_dataloader(dataloader, save_dir, memo):
+    if not is_indexable(dataloader):
+        return dataloader
+
+    sampler = dataloader.sampler
+    batch_sampler = dataloader.batch_sampler
+    if not (
+        type(batch_sampler) is BatchSampler
+        and batch_sampler.sampler is sampler
+        and type(sampler) in (SequentialSampler, RandomSampler)
+    ):
+        return dataloader
+
+    dataset = _share_dataset(dataloader.dataset, save_dir, memo)
+    if dataset is None:
+        return dataloader
+
+    # Samplers keep a reference to the dataset, and are rebuilt
+    if isinstance(sampler, RandomSampler):
+        sampler = RandomSampler(
+            dataset,
+            replacement=sampler.replacement,
+            num_samples=getattr(sampler, "_num_samples", None),
+            generator=sampler.generator,
+        )
+    else:
+        sampler = SequentialSampler(dataset)
+
+    return DataLoader(
+        dataset,
+        batch_size=dataloader.batch_size,
+        sampler=sampler,
+        drop_last=dataloader.drop_last,
+        num_workers=dataloader.num_workers,
+        collate_fn=dataloader.collate_fn,
+        pin_memory=dataloader.pin_memory,
+        timeout=dataloader.timeout,
+        worker_init_fn=dataloader.worker_init_fn,
+        generator=dataloader.generator,
+        **_worker_kwargs(dataloader)
+    )
@@ -0,0 +1,412 @@
+"""
+  This module implements the distillation of a fitted ensemble into a single
+  student model, which only requires one forward pass at inference time.
+  Outputs of the ensemble are computed once and cached, so that multiple
+  students can be trained without re-running all base estimators.
+"""
+
+
+import os
+import json
+import torch
+import hashlib
+import logging
+import warnings
+import numpy as np
+import torch.nn.functional as F
+from torch.utils.data import TensorDataset
+
+from . import io
+from . import set_module
+from .dataloder import IndexedDataLoader, is_indexable
+from .dataloder import make_sequential_dataloader
+from .._base import BaseClassifier
+
+
+__all__ = ["TeacherCache", "distill"]
+
+
+def _update_hash(sha, value):
+    """
+    Update ``sha`` with the tensors in ``value``, which may be nested in
+    tuples, lists, and dicts. Tensors are hashed in float32, so that bf16
+    and quantized tensors are supported. Values of other types
+    are not supported, since they cannot be hashed reliably.
+    """
+    if isinstance(value, torch.Tensor):
+        if value.is_quantized:
+            value = value.dequantize()
+        value = value.detach().float().cpu().contiguous()
+        sha.update(str(tuple(value.size())).encode())
+        sha.update(value.numpy().tobytes())
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            _update_hash(sha, item)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            sha.update(str(key).encode())
+            _update_hash(sha, item)
+    elif value is None or isinstance(
+        value, (bool, int, float, str, np.generic, torch.dtype)
+    ):
+        sha.update(repr(value).encode())
+    else:
+        msg = (
+            "Cannot compute the key on the teacher outputs with a value of"
+            " type {}."
+        )
+        raise ValueError(msg.format(type(value).__name__))
+
+
+def _teacher_key(teacher, dataset, cache_key=None):
+    """
+    Return a hash on the class, parameters, buffers, precision, and
+    quantization method of the teacher, and ``cache_key`` if it is not
+    ``None``, else all tensors of the dataset, which should be a
+    :class:`TensorDataset`.
+    """
+    sha = hashlib.sha1()
+    sha.update(type(teacher).__name__.encode())
+    for name, value in teacher.state_dict().items():
+        sha.update(name.encode())
+        _update_hash(sha, value)
+
+    # Outputs also depend on the autocast and the quantized forward
+    _update_hash(sha, getattr(teacher, "precision_", None))
+    _update_hash(sha, getattr(teacher, "quantization_", None))
+
+    sha.update(str(len(dataset)).encode())
+    if cache_key is not None:
+        sha.update(str(cache_key).encode())
+    else:
+        _check_cache_key(dataset, cache_key)
+        _update_hash(sha, dataset.tensors)
+
+    return sha.hexdigest()
+
+
+def _check_cache_key(dataset, cache_key):
+    """
+    Check that the dataset can be identified without reading its samples,
+    which is only supported for :class:`TensorDataset` unless ``cache_key``
+    is given.
+    """
+    if cache_key is None and not isinstance(dataset, TensorDataset):
+        msg = (
+            "Caching teacher outputs on disk for a dataset of type {} requires"
+            " `cache_key` to identify the dataset, since only the tensors of"
+            " a TensorDataset are hashed."
+        )
+        raise ValueError(msg.format(type(dataset).__name__))
+
+
+class TeacherCache(object):
+    """
+    Per-sample outputs of a fitted ensemble on the dataset of a dataloader,
+    indexed by the positions of samples in the dataset.
+
+    Parameters
+    ----------
+    teacher : torchensemble model
+        The fitted ensemble, whose outputs are used as the soft targets.
+    dataloader : torch.utils.data.DataLoader
+        A dataloader with a map-style dataset, which is iterated sequentially
+        to compute the outputs of ``teacher`` on all samples.
+    cache_dir : string, default=None
+        Specify where to store the cached outputs.
+
+        - If ``None``, the cached outputs are kept in memory.
+        - If not ``None``, the cached outputs are stored in a ``.npy`` file
+          under the specified directory: ``cache_dir``, along with a
+          manifest. Cached outputs are reused if the parameters, precision,
+          and quantization of ``teacher`` and the samples in the dataset are
+          unchanged.
+    name : string, default="teacher"
+        The filename prefix of the cache and manifest.
+    cache_key : string, default=None
+        The key that identifies the dataset in the manifest.
+
+        - If ``None``, all tensors of the dataset are hashed on loading the
+          cache, which requires a :class:`TensorDataset` when ``cache_dir``
+          is not ``None``.
+        - If not ``None``, samples in the dataset are not read on loading
+          the cache, and the cache should be cleared by the caller once the
+          dataset is changed.
+    """
+
+    def __init__(
+        self,
+        teacher,
+        dataloader,
+        cache_dir=None,
+        name="teacher",
+        cache_key=None,
+    ):
+        if not is_indexable(dataloader):
+            msg = (
+                "The dataloader used to cache teacher outputs should be a"
+                " DataLoader from `torch.utils.data` with a map-style dataset"
+                " and automatic batching enabled."
+            )
+            raise ValueError(msg)
+
+        if cache_dir is not None:
+            _check_cache_key(dataloader.dataset, cache_key)
+
+        self.teacher = teacher
+        self.dataloader = dataloader
+        self.cache_dir = cache_dir
+        self.name = name
+        self.cache_key = cache_key
+        self.outputs_ = None
+
+    def _paths(self):
+        return (
+            os.path.join(self.cache_dir, "{}.npy".format(self.name)),
+            os.path.join(self.cache_dir, "{}.json".format(self.name)),
+        )
+
+    def _load_cached(self, key):
+        """Return the cached outputs if they match ``key``, else ``None``."""
+        filename, manifest = self._paths()
+        if not (os.path.exists(filename) and os.path.exists(manifest)):
+            return None
+
+        with open(manifest, "r") as f:
+            if json.load(f).get("key") != key:
+                return None
+
+        # The cache is opened read-only, so that it cannot be modified
+        outputs = np.load(filename, mmap_mode="r")
+        with warnings.catch_warnings():
+            # UserWarning on the non-writable array is ignored
+            warnings.simplefilter("ignore", UserWarning)
+            return torch.from_numpy(outputs)
+
+    @torch.no_grad()
+    def _compute(self, filename=None):
+        """Compute the outputs of the teacher on all samples."""
+        teacher = self.teacher
+        teacher.eval()
+        dataloader = make_sequential_dataloader(self.dataloader)
+
+        outputs, buffer = None, None
+        for indices, elem in dataloader:
+            data, _ = io.split_data_target(elem, teacher.device)
+            with set_module.autocast(teacher.precision_, teacher.device):
+                output = teacher(*data)
+            output = output.float().cpu()
+
+            if outputs is None:
+                shape = (len(self.dataloader.dataset),) + tuple(
+                    output.size()[1:]
+                )
+                if filename is None:
+                    outputs = torch.zeros(shape)
+                else:
+                    buffer = np.lib.format.open_memmap(
+                        filename, mode="w+", dtype=np.float32, shape=shape
+                    )
+                    outputs = torch.from_numpy(buffer)
+            outputs[indices] = output
+
+        if buffer is not None:
+            buffer.flush()
+
+        return outputs
+
+    def load(self):
+        """Compute the outputs of the teacher, or reuse the cached ones."""
+        if self.cache_dir is None:
+            self.outputs_ = self._compute()
+            return self
+
+        if not os.path.isdir(self.cache_dir):
+            os.mkdir(self.cache_dir)
+
+        key = _teacher_key(
+            self.teacher, self.dataloader.dataset, self.cache_key
+        )
+        self.outputs_ = self._load_cached(key)
+        if self.outputs_ is not None:
+            msg = "Reuse the cached teacher outputs in: {}"
+            self.teacher.logger.info(msg.format(self.cache_dir))
+            return self
+
+        # The manifest is written after the outputs are complete, so that an
+        # interrupted run is never mistaken for a valid cache
+        filename, manifest = self._paths()
+        if os.path.exists(manifest):
+            os.remove(manifest)
+        self.outputs_ = self._compute(filename)
+        with open(manifest, "w") as f:
+            json.dump({"key": key}, f)
+
+        return self
+
+    def __getitem__(self, indices):
+        """Return the teacher outputs of samples with ``indices``."""
+        if self.outputs_ is None:
+            self.load()
+
+        return self.outputs_[indices]
+
+    def clear(self):
+        """Release the cached outputs and remove the files on disk."""
+        self.outputs_ = None
+        if self.cache_dir is not None:
+            for path in self._paths():
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def _distillation_loss(
+    output, soft_target, target, temperature, alpha, is_classification
+):
+    """
+    Return the weighted sum of the loss on the teacher outputs and the loss
+    on the ground-truth targets.
+    """
+    if is_classification:
+        # Teacher outputs of classifiers are probabilities
+        log_proba = torch.log(soft_target.clamp_min(1e-12))
+        soft_target = F.softmax(log_proba / temperature, dim=1)
+        soft_loss = F.kl_div(
+            F.log_softmax(output / temperature, dim=1),
+            soft_target,
+            reduction="batchmean",
+        ) * (temperature ** 2)
+        hard_loss = F.cross_entropy(output, target)
+    else:
+        soft_loss = F.mse_loss(output, soft_target)
+        hard_loss = F.mse_loss(output, target)
+
+    return (1 - alpha) * soft_loss + alpha * hard_loss
+
+
+def distill(
+    teacher,
+    student,
+    train_loader,
+    epochs=10,
+    optimizer_name="Adam",
+    optimizer_args=None,
+    temperature=1.0,
+    alpha=0.0,
+    log_interval=100,
+    cache_dir=None,
+    cache_name="teacher",
+    cache_key=None,
+):
+    """
+    Train a single student model on the outputs of a fitted ensemble.
+
+    Parameters
+    ----------
+    teacher : torchensemble model
+        The fitted ensemble, such as :class:`VotingClassifier`,
+        :class:`BaggingClassifier`, :class:`GradientBoostingClassifier`,
+        :class:`SnapshotEnsembleClassifier`,
+        :class:`FastGeometricClassifier`, :class:`FusionClassifier`, or their
+        regressor counterparts.
+    student : torch.nn.Module
+        The student model, which should return the same shape of outputs as
+        the base estimators in ``teacher``. For classification, the student
+        returns logits.
+    train_loader : torch.utils.data.DataLoader
+        A dataloader with a map-style dataset and automatic batching, used to
+        train the student.
+    epochs : int, default=10
+        The number of training epochs.
+    optimizer_name : string, default="Adam"
+        The name of the optimizer, see
+        :meth:`torchensemble.utils.set_module.set_optimizer`.
+    optimizer_args : dict, default=None
+        Keyword arguments on the optimizer, such as ``{"lr": 1e-3}``.
+    temperature : float, default=1.0
+        The temperature used to soften the teacher and student probabilities
+        for classification. It has no effect for regression.
+    alpha : float, default=0.0
+        The weight on the loss with respect to the ground-truth targets, in
+        the range [0, 1]. The loss with respect to the teacher outputs is
+        weighted by ``1 - alpha``.
+    log_interval : int, default=100
+        The number of batches to wait before logging the training status.
+    cache_dir : string, default=None
+        Specify where to cache the teacher outputs, see
+        :class:`TeacherCache`.
+    cache_name : string, default="teacher"
+        The filename prefix of the cached teacher outputs.
+    cache_key : string, default=None
+        The key that identifies the dataset of ``train_loader`` in the
+        cached teacher outputs, see :class:`TeacherCache`.
+
+    Returns
+    -------
+    student : torch.nn.Module
+        The fitted student model.
+    """
+    if not epochs > 0:
+        msg = (
+            "The number of training epochs should be strictly positive, but"
+            " got {} instead."
+        )
+        raise ValueError(msg.format(epochs))
+
+    if not temperature > 0:
+        msg = (
+            "The temperature should be strictly positive, but got {}"
+            " instead."
+        )
+        raise ValueError(msg.format(temperature))
+
+    if not 0 <= alpha <= 1:
+        msg = (
+            "The weight on the loss with respect to ground-truth targets"
+            " should be in the range [0, 1], but got {} instead."
+        )
+        raise ValueError(msg.format(alpha))
+
+    logger = logging.getLogger()
+    device = teacher.device
+    is_classification = isinstance(teacher, BaseClassifier)
+
+    cache = TeacherCache(
+        teacher, train_loader, cache_dir, cache_name, cache_key
+    ).load()
+
+    student = student.to(device)
+    optimizer = set_module.set_optimizer(
+        student, optimizer_name, **(optimizer_args or {})
+    )
+
+    train_loader = IndexedDataLoader(train_loader)
+    for epoch in range(epochs):
+        student.train()
+        for batch_idx, (indices, elem) in enumerate(train_loader):
+
+            data, target = io.split_data_target(elem, device)
+            soft_target = cache[indices].to(device)
+
+            optimizer.zero_grad()
+            with set_module.autocast(teacher.precision_, device):
+                output = student(*data)
+                loss = _distillation_loss(
+                    output,
+                    soft_target,
+                    target,
+                    temperature,
+                    alpha,
+                    is_classification,
+                )
+            loss.backward()
+            optimizer.step()
+
+            # Print training status
+            if batch_idx % log_interval == 0:
+                msg = "Student | Epoch: {:03d} | Batch: {:03d} | Loss: {:.5f}"
+                logger.info(msg.format(epoch, batch_idx, loss))
+
+    student.eval()
+
+    return student
@@ -0,0 +1,107 @@
+"""
+  This module implements the packaging of a fitted ensemble into a single
+  self-contained graph, which can be loaded by PyTorch alone for serving,
+  without importing torchensemble or the definition of base estimators.
+"""
+
+
+import torch
+import contextlib
+
+
+__all__ = ["export"]
+
+
+@contextlib.contextmanager
+def _inference_mode(model):
+    """
+    Put the ensemble into evaluating mode with the sequential data
+    forwarding, so that the Python loop over base estimators is unrolled
+    into the graph. The original states are restored on exit.
+    """
+    training = model.training
+    forward_mode = getattr(model, "forward_mode_", None)
+    stacked_estimators = getattr(model, "_stacked_estimators", None)
+
+    model.eval()
+    if forward_mode is not None:
+        model.forward_mode_ = "sequential"
+    try:
+        with torch.no_grad():
+            yield model
+    finally:
+        model.train(training)
+        if forward_mode is not None:
+            model.forward_mode_ = forward_mode
+            model._stacked_estimators = stacked_estimators
+
+
+def export(model, example_inputs, path=None, method="trace"):
+    """
+    Package a fitted ensemble into a single graph.
+
+    Parameters
+    ----------
+    model : torchensemble model
+        The fitted ensemble, including gradient boosting with the shrinkage
+        rate and forests of soft decision trees.
+    example_inputs : torch.Tensor or tuple of torch.Tensor
+        A data batch used to record the data forwarding of ``model``. The
+        first dimension of each input is the batch size.
+    path : string, default=None
+        Specify where to save the packaged graph. If ``None``, the graph is
+        only returned.
+    method : {"trace", "export"}, default="trace"
+        The method of packaging.
+
+        - If ``trace``, the graph is recorded by :func:`torch.jit.trace`,
+          saved by :func:`torch.jit.save`, and can be loaded by
+          :func:`torch.jit.load`.
+        - If ``export``, the graph is recorded by :func:`torch.export.export`
+          with a dynamic batch size, saved by :func:`torch.export.save`, and
+          can be loaded by :func:`torch.export.load`. Requires
+          PyTorch >= 2.1.
+
+    Returns
+    -------
+    graph : torch.jit.ScriptModule or torch.export.ExportedProgram
+        The packaged graph, which returns the same outputs as ``model`` in
+        evaluating mode. Base estimators are evaluated in float32.
+    """
+    if method not in ("trace", "export"):
+        msg = (
+            "The packaging method should be one of {{trace, export}}, but got"
+            " {} instead."
+        )
+        raise ValueError(msg.format(method))
+
+    if isinstance(example_inputs, torch.Tensor):
+        example_inputs = (example_inputs,)
+    example_inputs = tuple(
+        tensor.to(model.device) for tensor in example_inputs
+    )
+
+    if method == "export" and not hasattr(torch, "export"):
+        msg = (
+            "Packaging with `torch.export` is not available in PyTorch {}."
+        )
+        raise RuntimeError(msg.format(torch.__version__))
+
+    with _inference_mode(model):
+        if method == "trace":
+            graph = torch.jit.trace(model, example_inputs)
+        else:
+            # All inputs are passed to the variadic argument of `forward`
+            batch = torch.export.Dim("batch")
+            dynamic_shapes = (tuple({0: batch} for _ in example_inputs),)
+            graph = torch.export.export(
+                model, example_inputs, dynamic_shapes=dynamic_shapes
+            )
+
+    if path is not None:
+        if method == "trace":
+            torch.jit.save(graph, path)
+        else:
+            torch.export.save(graph, path)
+
+    return graph
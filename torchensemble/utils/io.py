@@ -1,15 +1,24 @@
 import os
+import json
+import queue
 import torch
+import weakref
+import threading
+import torch.nn as nn
 
 
-def save(model, save_dir, logger):
-    """Implement model serialization to the specified directory."""
-    if save_dir is None:
-        save_dir = "./"
+__manifest__ = "manifest.json"
+__ensemble_shard__ = "ensemble.pth"
+__estimator_shard__ = "estimator_{:03d}.pth"
 
-    if not os.path.isdir(save_dir):
-        os.mkdir(save_dir)
 
+# Fingerprints of base estimators saved by each ensemble, indexed by the
+# checkpoint directory and the index of base estimators
+_fingerprints = weakref.WeakKeyDictionary()
+
+
+def _get_checkpoint_name(model):
+    """Return the checkpoint name shared by all saving formats."""
     # Decide the base estimator name
     if isinstance(model.base_estimator_, type):
         base_estimator_name = model.base_estimator_.__name__
@@ -17,52 +26,450 @@ def save(model, save_dir, logger):
         base_estimator_name = model.base_estimator_.__class__.__name__
 
     # {Ensemble_Model_Name}_{Base_Estimator_Name}_{n_estimators}
-    filename = "{}_{}_{}_ckpt.pth".format(
+    return "{}_{}_{}_ckpt".format(
         type(model).__name__,
         base_estimator_name,
         model.n_estimators,
     )
 
+
+def _get_state(model):
+    """Return the states of the ensemble except its parameters."""
     # The real number of base estimators in some ensembles is not same as
     # `n_estimators`.
     state = {
         "n_estimators": len(model.estimators_),
-        "model": model.state_dict(),
         "_criterion": model._criterion,
         "n_outputs": model.n_outputs,
     }
 
     if hasattr(model, "n_inputs"):
         state.update({"n_inputs": model.n_inputs})
+    if getattr(model, "quantization_", None) is not None:
+        state.update({"quantization_": model.quantization_})
+
+    return state
+
+
+def _set_state(model, state):
+    """Restore the states of the ensemble except its parameters."""
+    model._criterion = state["_criterion"]
+    model.n_outputs = state["n_outputs"]
+    if "n_inputs" in state:
+        model.n_inputs = state["n_inputs"]
+    if "quantization_" in state:
+        model.quantization_ = state["quantization_"]
+
+
+def _make_estimator(model):
+    """
+    Make a base estimator with the same structure as the saved ones, which
+    are quantized if the ensemble is quantized.
+    """
+    estimator = model._make_estimator()
+    if getattr(model, "quantization_", None) is not None:
+        from .quantization import _make_quantized_estimator
+
+        estimator = _make_quantized_estimator(estimator, model.quantization_)
+
+    return estimator
+
+
+def _atomic_save(obj, filename):
+    """Save ``obj`` to a temporary file and rename it to ``filename``."""
+    tmp_filename = filename + ".tmp"
+    torch.save(obj, tmp_filename)
+    os.replace(tmp_filename, filename)
+
+
+def _load_shard(filename, device, mmap=False):
+    """Load a shard, memory-mapping it if supported by PyTorch."""
+    if mmap:
+        try:
+            return torch.load(filename, map_location=device, mmap=True)
+        except TypeError:
+            # `mmap` is not supported by torch.load in PyTorch < 2.1
+            pass
+
+    return torch.load(filename, map_location=device)
+
+
+def _get_tensors(estimator):
+    """
+    Return the tensors in the state dict of a base estimator, including
+    those nested in tuples such as packed parameters of quantized layers.
+    Other values such as :obj:`torch.dtype` are skipped.
+    """
+    tensors = []
+    values = list(estimator.state_dict(keep_vars=True).values())
+    while values:
+        value = values.pop(0)
+        if isinstance(value, torch.Tensor):
+            tensors.append(value)
+        elif isinstance(value, (tuple, list)):
+            values[:0] = value
+
+    return tensors
+
+
+def _fingerprint(estimator):
+    """
+    Return the fingerprint of a base estimator, which consists of weak
+    references to its parameters and buffers, and their version counters
+    increased on each in-place update.
+    """
+    return [
+        (weakref.ref(tensor), tensor._version)
+        for tensor in _get_tensors(estimator)
+    ]
+
+
+def _is_unchanged(estimator, fingerprint):
+    """Check whether a base estimator matches the saved fingerprint."""
+    if fingerprint is None:
+        return False
+
+    tensors = _get_tensors(estimator)
+    if len(tensors) != len(fingerprint):
+        return False
+
+    return all(
+        ref() is tensor and version == tensor._version
+        for tensor, (ref, version) in zip(tensors, fingerprint)
+    )
+
+
+def _drop_fingerprints(model):
+    """
+    Drop the fingerprints of base estimators saved by ``model``, so that the
+    shards of all base estimators are rewritten on the next saving. It is
+    required when base estimators are updated in place by another process,
+    which leaves their version counters in the current process unchanged.
+    """
+    _fingerprints.pop(model, None)
+
+
+class _LazyModuleList(nn.ModuleList):
+    """
+    A list of base estimators loaded from their shards on first use.
+
+    Unloaded base estimators are kept as ``None`` placeholders. They are
+    loaded when accessed by indexing or iteration, and all of them are loaded
+    before the list is converted, serialized, or traversed for parameters.
+    """
+
+    def __init__(self, make_estimator, filenames, device):
+        super(_LazyModuleList, self).__init__()
+        self._make_estimator = make_estimator
+        self._filenames = list(filenames)
+        self._device = device
+        for idx in range(len(self._filenames)):
+            self._modules[str(idx)] = None
+
+    def _materialize(self, idx):
+        key = str(idx)
+        if self._modules[key] is None:
+            estimator = self._make_estimator()
+            state = _load_shard(self._filenames[idx], self._device, mmap=True)
+            estimator.load_state_dict(state)
+            estimator.train(self.training)
+            self._modules[key] = estimator
+
+        return self._modules[key]
+
+    def _materialize_all(self):
+        for idx in range(len(self._modules)):
+            self._materialize(idx)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return nn.ModuleList(list(self)[idx])
+
+        if idx < 0:
+            idx += len(self)
+
+        if not 0 <= idx < len(self):
+            raise IndexError("index {} is out of range".format(idx))
+
+        return self._materialize(idx)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self._materialize(idx)
+
+    def named_modules(self, *args, **kwargs):
+        self._materialize_all()
+        return super(_LazyModuleList, self).named_modules(*args, **kwargs)
+
+    def state_dict(self, *args, **kwargs):
+        self._materialize_all()
+        return super(_LazyModuleList, self).state_dict(*args, **kwargs)
+
+    def _load_from_state_dict(self, *args, **kwargs):
+        self._materialize_all()
+        return super(_LazyModuleList, self)._load_from_state_dict(
+            *args, **kwargs
+        )
+
+    def _apply(self, fn):
+        self._materialize_all()
+        return super(_LazyModuleList, self)._apply(fn)
+
+
+def _copy_state(state):
+    """Return a copy of ``state`` with all tensors copied to CPU."""
+    if isinstance(state, torch.Tensor):
+        state = state.detach()
+        return state.cpu() if state.is_cuda else state.clone()
+    elif isinstance(state, dict):
+        copied = type(state)(
+            (key, _copy_state(value)) for key, value in state.items()
+        )
+        # Version information of modules in state dicts
+        if hasattr(state, "_metadata"):
+            copied._metadata = state._metadata
+        return copied
+    else:
+        return state
+
+
+def _get_save_tasks(model, save_dir, logger, copy=False):
+    """
+    Return the list of ``(obj, filename)`` to write and the list of
+    filenames to remove on saving the ensemble. If ``copy`` is ``True``,
+    tensors are copied so that the ensemble can be updated before writing.
+    """
+    if save_dir is None:
+        save_dir = "./"
+
+    if not os.path.isdir(save_dir):
+        os.mkdir(save_dir)
+
+    if getattr(model, "checkpoint_format_", "file") == "sharded":
+        return _get_sharded_save_tasks(model, save_dir, logger, copy)
+
+    filename = _get_checkpoint_name(model) + ".pth"
+
+    state = _get_state(model)
+    state.update({"model": model.state_dict()})
+    if copy:
+        state = _copy_state(state)
 
     save_dir = os.path.join(save_dir, filename)
 
     logger.info("Saving the model to `{}`".format(save_dir))
 
-    # Save
-    torch.save(state, save_dir)
+    return [(state, save_dir)], []
 
-    return
 
+def _get_sharded_save_tasks(model, save_dir, logger, copy=False):
+    """
+    Return the tasks on saving the ensemble into a directory with one shard
+    for each base estimator, one shard for remaining states of the ensemble,
+    and a manifest. Shards of base estimators unchanged since the last saving
+    are not rewritten.
+    """
+    ckpt_dir = os.path.join(save_dir, _get_checkpoint_name(model))
+    if not os.path.isdir(ckpt_dir):
+        os.mkdir(ckpt_dir)
 
-def load(model, save_dir="./", logger=None):
-    """Implement model deserialization from the specified directory."""
+    logger.info("Saving the model to `{}`".format(ckpt_dir))
+
+    fingerprints = _fingerprints.setdefault(model, {}).setdefault(
+        os.path.abspath(ckpt_dir), {}
+    )
+
+    estimators = model.estimators_
+    if isinstance(estimators, _LazyModuleList):
+        estimators._materialize_all()
+
+    tasks = []
+    shards = []
+    for idx, estimator in enumerate(estimators):
+        shard = __estimator_shard__.format(idx)
+        filename = os.path.join(ckpt_dir, shard)
+        shards.append(shard)
+
+        if os.path.exists(filename) and _is_unchanged(
+            estimator, fingerprints.get(idx)
+        ):
+            continue
+
+        state = estimator.state_dict()
+        if copy:
+            state = _copy_state(state)
+        tasks.append((state, filename))
+        fingerprints[idx] = _fingerprint(estimator)
+
+    logger.info(
+        "Rewriting {} out of {} base estimators".format(
+            len(tasks), len(shards)
+        )
+    )
+
+    # Remaining states, including parameters outside base estimators
+    state = _get_state(model)
+    state.update(
+        {
+            "model": {
+                key: value
+                for key, value in model.state_dict().items()
+                if not key.startswith("estimators_.")
+            }
+        }
+    )
+    if copy:
+        state = _copy_state(state)
+    tasks.append((state, os.path.join(ckpt_dir, __ensemble_shard__)))
+
+    # The manifest is written at last, shards not listed are removed
+    manifest = {
+        "ensemble": type(model).__name__,
+        "n_estimators": len(shards),
+        "ensemble_shard": __ensemble_shard__,
+        "estimator_shards": shards,
+    }
+    tasks.append((manifest, os.path.join(ckpt_dir, __manifest__)))
+
+    removals = [
+        os.path.join(ckpt_dir, filename)
+        for filename in os.listdir(ckpt_dir)
+        if filename.startswith("estimator_")
+        and filename.endswith(".pth")
+        and filename not in shards
+    ]
+    for idx in list(fingerprints.keys()):
+        if idx >= len(shards):
+            del fingerprints[idx]
+
+    return tasks, removals
+
+
+def _write(tasks, removals):
+    """Write all objects in ``tasks`` and remove files in ``removals``."""
+    for obj, filename in tasks:
+        if filename.endswith(".json"):
+            with open(filename + ".tmp", "w") as f:
+                json.dump(obj, f, indent=2)
+            os.replace(filename + ".tmp", filename)
+        else:
+            _atomic_save(obj, filename)
+
+    for filename in removals:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+def save(model, save_dir, logger):
+    """Implement model serialization to the specified directory."""
+    tasks, removals = _get_save_tasks(model, save_dir, logger)
+    _write(tasks, removals)
+
+
+class CheckpointWriter(object):
+    """
+    Save checkpoints of the ensemble in a background thread.
+
+    On calling :meth:`save`, the states of the ensemble are copied to CPU in
+    the calling thread by default, and written by a dedicated writer thread
+    afterwards, so that the ensemble can be updated during writing. Each
+    file is written to a temporary file first and then renamed.
+
+    Parameters
+    ----------
+    logger : logging.Logger
+        The logger used to record the saving status.
+    max_pending : int, default=1
+        The maximum number of checkpoints waiting to be written. Calling
+        :meth:`save` blocks when the number of pending checkpoints reaches
+        ``max_pending``.
+    """
+
+    def __init__(self, logger, max_pending=1):
+        self.logger = logger
+        self.max_pending = max_pending
+
+    def __enter__(self):
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close(raise_error=exc_type is None)
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    break
+                model, tasks, removals = task
+                # Skip the remaining checkpoints after a failure
+                if self._error is None:
+                    try:
+                        _write(tasks, removals)
+                    except Exception as error:
+                        self._error = error
+                        # Shards of all base estimators are rewritten next
+                        _drop_fingerprints(model)
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            msg = "Failed to write the checkpoint in the background."
+            self.logger.error(msg)
+            raise RuntimeError(msg) from error
+
+    def save(self, model, save_dir, copy=True):
+        """
+        Queue the checkpoint of ``model`` to be saved to ``save_dir``. States
+        of the ensemble are only copied if ``copy`` is ``True``, which can be
+        disabled when its tensors are no longer updated in place.
+        """
+        self._raise_error()
+        tasks, removals = _get_save_tasks(
+            model, save_dir, self.logger, copy=copy
+        )
+        self._queue.put((model, tasks, removals))
+
+    def flush(self):
+        """Block until all pending checkpoints are written."""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self, raise_error=True):
+        """Write all pending checkpoints and stop the writer thread."""
+        if not hasattr(self, "_thread"):
+            return
+
+        self._queue.put(None)
+        self._thread.join()
+        del self._thread
+
+        if raise_error:
+            self._raise_error()
+
+
+def load(model, save_dir="./", logger=None, lazy=False):
+    """
+    Implement model deserialization from the specified directory.
+
+    Both the single-file format and the sharded format are supported. For the
+    sharded format, base estimators are loaded on first use when ``lazy`` is
+    ``True``, and shards are memory-mapped if supported by PyTorch.
+    """
     if not os.path.exists(save_dir):
         raise FileExistsError("`{}` does not exist".format(save_dir))
 
-    # Decide the base estimator name
-    if isinstance(model.base_estimator_, type):
-        base_estimator_name = model.base_estimator_.__name__
-    else:
-        base_estimator_name = model.base_estimator_.__class__.__name__
+    ckpt_dir = os.path.join(save_dir, _get_checkpoint_name(model))
+    if os.path.exists(os.path.join(ckpt_dir, __manifest__)):
+        return _load_sharded(model, ckpt_dir, logger, lazy)
 
-    # {Ensemble_Model_Name}_{Base_Estimator_Name}_{n_estimators}
-    filename = "{}_{}_{}_ckpt.pth".format(
-        type(model).__name__,
-        base_estimator_name,
-        model.n_estimators,
-    )
-    save_dir = os.path.join(save_dir, filename)
+    save_dir = ckpt_dir + ".pth"
 
     if logger:
         logger.info("Loading the model from `{}`".format(save_dir))
@@ -70,17 +477,63 @@ def load(model, save_dir="./", logger=None):
     state = torch.load(save_dir)
     n_estimators = state["n_estimators"]
     model_params = state["model"]
-    model._criterion = state["_criterion"]
-    model.n_outputs = state["n_outputs"]
-    if "n_inputs" in state:
-        model.n_inputs = state["n_inputs"]
+    _set_state(model, state)
 
     # Pre-allocate and load all base estimators
     for _ in range(n_estimators):
-        model.estimators_.append(model._make_estimator())
+        model.estimators_.append(_make_estimator(model))
     model.load_state_dict(model_params)
 
 
+def _load_sharded(model, ckpt_dir, logger=None, lazy=False):
+    """Implement model deserialization from the sharded format."""
+    if logger:
+        logger.info("Loading the model from `{}`".format(ckpt_dir))
+
+    with open(os.path.join(ckpt_dir, __manifest__), "r") as f:
+        manifest = json.load(f)
+
+    state = torch.load(
+        os.path.join(ckpt_dir, manifest["ensemble_shard"]),
+        map_location=model.device,
+    )
+    _set_state(model, state)
+
+    filenames = [
+        os.path.join(ckpt_dir, shard)
+        for shard in manifest["estimator_shards"]
+    ]
+
+    if lazy:
+        model.estimators_ = _LazyModuleList(
+            lambda: _make_estimator(model), filenames, model.device
+        )
+    else:
+        model.estimators_ = nn.ModuleList()
+        for filename in filenames:
+            estimator = _make_estimator(model)
+            estimator.load_state_dict(
+                _load_shard(filename, model.device, mmap=True)
+            )
+            model.estimators_.append(estimator)
+
+    # Parameters outside base estimators, loaded without traversing base
+    # estimators so that lazy base estimators are not loaded
+    model_params = state["model"]
+    model._load_from_state_dict(model_params, "", {}, False, [], [], [])
+    for name, module in model.named_children():
+        if name == "estimators_":
+            continue
+        prefix = name + "."
+        module.load_state_dict(
+            {
+                key[len(prefix):]: value
+                for key, value in model_params.items()
+                if key.startswith(prefix)
+            }
+        )
+
+
 def split_data_target(element, device, logger=None):
     """Split elements in dataloader according to pre-defined rules."""
     if not (isinstance(element, list) or isinstance(element, tuple)):
@@ -11,6 +11,7 @@ __all__ = [
     "onehot_encoding",
     "pseudo_residual_classification",
     "pseudo_residual_regression",
+    "moving_average_",
 ]
 
 
@@ -41,7 +42,7 @@ def pseudo_residual_classification(target, output, n_classes):
     Compute the pseudo residual for classification with cross-entropyloss."""
     y_onehot = onehot_encoding(target, n_classes)
 
-    return y_onehot - F.softmax(output, dim=1)
+    return y_onehot - F.softmax(output, dim=-1)
 
 
 def pseudo_residual_regression(target, output):
@@ -51,3 +52,13 @@ def pseudo_residual_regression(target, output):
         raise ValueError(msg.format(target.size(), output.size()))
 
     return target - output
+
+
+@torch.no_grad()
+def moving_average_(averaged, model, n_averaged):
+    """
+    Update parameters of `averaged` in-place with the running average over
+    `n_averaged` models and parameters of `model`.
+    """
+    for param_avg, param in zip(averaged.parameters(), model.parameters()):
+        param_avg.copy_(param_avg + (param - param_avg) / (n_averaged + 1))
@@ -0,0 +1,533 @@
+"""
+  This module implements backends on fitting base estimators in parallel for
+  each training epoch, used by parallel ensembles such as :mod:`voting`,
+  :mod:`bagging`, and :mod:`adversarial_training`.
+"""
+
+
+import os
+import queue
+import torch
+import shutil
+import tempfile
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import torch.multiprocessing as mp
+from joblib import Parallel, delayed, effective_n_jobs
+
+from . import io
+from . import set_module
+from .dataloder import share_dataloaders
+
+
+__all__ = [
+    "JoblibTrainer",
+    "SharedMemoryTrainer",
+    "ThreadingTrainer",
+    "LockstepTrainer",
+    "get_trainer",
+    "available_backends",
+]
+
+
+class _BaseTrainer(object):
+    """
+    Base class for all parallel backends.
+
+    Parameters
+    ----------
+    fit_func : callable
+        The function used to fit a base estimator for one epoch. It is called
+        with keyword arguments ``train_loader``, ``estimator``, ``cur_lr``,
+        ``optimizer``, ``idx``, ``epoch``, and ``fit_args``, and should
+        return the fitted base estimator and optimizer.
+    estimators : list
+        The list of base estimators.
+    optimizers : list
+        The list of optimizers, one for each base estimator.
+    train_loaders : list
+        The list of training dataloaders, one for each base estimator.
+    n_jobs : int, default=None
+        The number of workers.
+    backend_args : dict, default=None
+        Keyword arguments specific to the backend, should be a subset of
+        ``_backend_params``.
+    **fit_args : keyword arguments
+        Additional keyword arguments passed to ``fit_func``.
+    """
+
+    # Names of keyword arguments specific to the backend
+    _backend_params = ()
+
+    # Whether base estimators are updated in place at each epoch, instead of
+    # being replaced by the fitted copies returned from workers
+    in_place = True
+
+    def __init__(
+        self,
+        fit_func,
+        estimators,
+        optimizers,
+        train_loaders,
+        n_jobs=None,
+        backend_args=None,
+        **fit_args
+    ):
+        self.fit_func = fit_func
+        self.estimators = list(estimators)
+        self.optimizers = list(optimizers)
+        self.train_loaders = list(train_loaders)
+        self.n_jobs = n_jobs
+        self.fit_args = fit_args
+
+        backend_args = backend_args or {}
+        _check_backend_args(type(self), backend_args)
+        for key, value in backend_args.items():
+            setattr(self, key, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def fit_per_epoch(self, epoch, cur_lr):
+        """Fit all base estimators for one epoch."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release resources held by the backend."""
+
+
+class JoblibTrainer(_BaseTrainer):
+    """
+    Fit base estimators with :mod:`joblib`. Base estimators and optimizers
+    are sent to workers and returned at each epoch.
+
+    When base estimators are fitted in multiple workers, datasets of the
+    training dataloaders are moved into memory-mapped files once on
+    entering the backend, and workers only receive the filenames.
+    """
+
+    def __enter__(self):
+        self._parallel = Parallel(n_jobs=self.n_jobs).__enter__()
+        if effective_n_jobs(self.n_jobs) > 1:
+            self._tmpdir = tempfile.mkdtemp(prefix="torchensemble_")
+            self.train_loaders = share_dataloaders(
+                self.train_loaders, self._tmpdir
+            )
+        return self
+
+    @property
+    def in_place(self):
+        # Base estimators are only copied when sent to other workers
+        return effective_n_jobs(self.n_jobs) == 1
+
+    def fit_per_epoch(self, epoch, cur_lr):
+        rets = self._parallel(
+            delayed(self.fit_func)(
+                train_loader=train_loader,
+                estimator=estimator,
+                cur_lr=cur_lr,
+                optimizer=optimizer,
+                idx=idx,
+                epoch=epoch,
+                **self.fit_args
+            )
+            for idx, (estimator, optimizer, train_loader) in enumerate(
+                zip(self.estimators, self.optimizers, self.train_loaders)
+            )
+        )
+
+        self.estimators, self.optimizers = [], []
+        for estimator, optimizer in rets:
+            self.estimators.append(estimator)
+            self.optimizers.append(optimizer)
+
+    def close(self):
+        if hasattr(self, "_parallel"):
+            self._parallel.__exit__(None, None, None)
+            del self._parallel
+        if hasattr(self, "_tmpdir"):
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            del self._tmpdir
+
+
+def _pool_worker(
+    fit_func,
+    indices,
+    estimators,
+    optimizers,
+    train_loaders,
+    fit_args,
+    n_threads,
+    task_queue,
+    result_queue,
+    cpus=None,
+):
+    """
+    Private function running in each worker of SharedMemoryTrainer and
+    ThreadingTrainer. The worker owns a fixed subset of base estimators and
+    their optimizers during the whole training stage, and only receives the
+    epoch index and learning rate from the main process. The number of
+    intra-op threads is only set if ``n_threads`` is not ``None``.
+    """
+    # The number of intra-op threads is shared by all threads in a process,
+    # and is only set in worker processes of SharedMemoryTrainer. The CPU
+    # affinity is applied to the calling thread.
+    if n_threads is not None:
+        torch.set_num_threads(n_threads)
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        epoch, cur_lr = task
+        try:
+            for idx, estimator, optimizer, train_loader in zip(
+                indices, estimators, optimizers, train_loaders
+            ):
+                estimator.train()
+                fit_func(
+                    train_loader=train_loader,
+                    estimator=estimator,
+                    cur_lr=cur_lr,
+                    optimizer=optimizer,
+                    idx=idx,
+                    epoch=epoch,
+                    **fit_args
+                )
+            result_queue.put(None)
+        except Exception:
+            result_queue.put(traceback.format_exc())
+
+
+class _WorkerPoolTrainer(_BaseTrainer):
+    """
+    Base class for backends with a persistent pool of workers, each owning a
+    fixed subset of base estimators. Derived classes start the workers on
+    entering the backend.
+    """
+
+    def _partition(self):
+        """
+        Return the number of workers, the number of intra-op threads for
+        each worker, and the indices of base estimators owned by each worker.
+        """
+        n_estimators = len(self.estimators)
+        n_workers = max(1, min(effective_n_jobs(self.n_jobs), n_estimators))
+        n_threads = max(1, torch.get_num_threads() // n_workers)
+        indices = [
+            list(range(worker_idx, n_estimators, n_workers))
+            for worker_idx in range(n_workers)
+        ]
+
+        return n_workers, n_threads, indices
+
+    def _worker_args(self, indices, n_threads, task_queue):
+        """Return the positional arguments of `_pool_worker`."""
+        return (
+            self.fit_func,
+            indices,
+            [self.estimators[idx] for idx in indices],
+            [self.optimizers[idx] for idx in indices],
+            [self.train_loaders[idx] for idx in indices],
+            self.fit_args,
+            n_threads,
+            task_queue,
+            self._result_queue,
+        )
+
+    def fit_per_epoch(self, epoch, cur_lr):
+        for task_queue in self._task_queues:
+            task_queue.put((epoch, cur_lr))
+
+        errors = []
+        n_finished = 0
+        while n_finished < len(self._workers):
+            try:
+                error = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self._workers):
+                    msg = "A worker exited unexpectedly."
+                    raise RuntimeError(msg)
+                continue
+
+            n_finished += 1
+            if error is not None:
+                errors.append(error)
+
+        if errors:
+            msg = "Worker failed with the exception:\n{}"
+            raise RuntimeError(msg.format(errors[0]))
+
+    def close(self):
+        if not hasattr(self, "_workers"):
+            return
+
+        for task_queue, worker in zip(self._task_queues, self._workers):
+            if worker.is_alive():
+                task_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        del self._workers
+
+
+class SharedMemoryTrainer(_WorkerPoolTrainer):
+    """
+    Fit base estimators with a persistent pool of worker processes from
+    :mod:`torch.multiprocessing`. Parameters and buffers of base estimators
+    are moved into shared memory, and each worker updates its own subset of
+    base estimators in place during the whole training stage. Only the epoch
+    index, learning rate, and worker status are exchanged at each epoch.
+
+    This backend only supports base estimators on CPU.
+    """
+
+    def __enter__(self):
+        for estimator in self.estimators:
+            for tensor in estimator.parameters():
+                if tensor.is_cuda:
+                    msg = (
+                        "The shared memory backend only supports base"
+                        " estimators on CPU."
+                    )
+                    raise RuntimeError(msg)
+            estimator.share_memory()
+
+        n_workers, n_threads, indices = self._partition()
+
+        context = mp.get_context()
+        self._result_queue = context.Queue()
+        self._task_queues = []
+        self._workers = []
+
+        for worker_idx in range(n_workers):
+            task_queue = context.SimpleQueue()
+            worker = context.Process(
+                target=_pool_worker,
+                args=self._worker_args(
+                    indices[worker_idx], n_threads, task_queue
+                ),
+            )
+            worker.start()
+            self._task_queues.append(task_queue)
+            self._workers.append(worker)
+
+        return self
+
+
+class ThreadingTrainer(_WorkerPoolTrainer):
+    """
+    Fit base estimators with a persistent pool of threads in the current
+    process, which relies on PyTorch operators releasing the GIL. Nothing is
+    serialized, and each thread updates its own subset of base estimators in
+    place during the whole training stage.
+
+    The number of intra-op threads of PyTorch is a setting of the whole
+    process shared by all workers, instead of a budget of each worker. It is
+    divided by the number of workers on entering the backend, so that
+    concurrent base estimators do not oversubscribe the CPUs, and restored on
+    closing the backend. If ``pin_cpus`` is ``True``, the Python thread of
+    each worker is also pinned to a disjoint subset of the CPUs available to
+    the process, which requires :func:`os.sched_setaffinity`. The pinning is
+    best-effort: intra-op threads of PyTorch, such as OpenMP threads, are
+    not pinned.
+    """
+
+    _backend_params = ("pin_cpus",)
+    pin_cpus = False
+
+    def _cpus(self, n_workers):
+        """Return the disjoint subsets of CPUs assigned to each worker."""
+        if not self.pin_cpus:
+            return [None] * n_workers
+
+        if not hasattr(os, "sched_setaffinity"):
+            msg = (
+                "Pinning workers to CPUs is not supported on this platform."
+            )
+            raise RuntimeError(msg)
+
+        cpus = sorted(os.sched_getaffinity(0))
+        n_cpus = len(cpus) // n_workers
+        if n_cpus == 0:
+            msg = (
+                "The number of available CPUs = {} is smaller than the"
+                " number of workers = {}."
+            )
+            raise RuntimeError(msg.format(len(cpus), n_workers))
+
+        subsets = []
+        for worker_idx in range(n_workers):
+            begin, end = worker_idx * n_cpus, (worker_idx + 1) * n_cpus
+            subsets.append(cpus[begin:end])
+
+        return subsets
+
+    def __enter__(self):
+        n_workers, n_threads, indices = self._partition()
+        cpus = self._cpus(n_workers)
+
+        # The intra-op threads are shared by all workers in the process
+        self._num_threads = torch.get_num_threads()
+        torch.set_num_threads(n_threads)
+
+        self._result_queue = queue.Queue()
+        self._task_queues = []
+        self._workers = []
+
+        for worker_idx in range(n_workers):
+            task_queue = queue.Queue()
+            worker = threading.Thread(
+                target=_pool_worker,
+                args=self._worker_args(indices[worker_idx], None, task_queue)
+                + (cpus[worker_idx],),
+                daemon=True,
+            )
+            worker.start()
+            self._task_queues.append(task_queue)
+            self._workers.append(worker)
+
+        return self
+
+    def close(self):
+        super().close()
+        # Restore the number of intra-op threads of the process
+        if hasattr(self, "_num_threads"):
+            torch.set_num_threads(self._num_threads)
+            del self._num_threads
+
+
+class LockstepTrainer(_BaseTrainer):
+    """
+    Fit base estimators in lockstep within the current process. Each data
+    batch is loaded once from the first dataloader in ``train_loaders``, and
+    then fed to all base estimators before loading the next one. If
+    ``n_jobs`` is larger than 1, base estimators are fitted on each data
+    batch concurrently by a pool of threads.
+
+    Different from other backends, ``fit_func`` is called once for each
+    pair of data batch and base estimator, with keyword arguments ``data``,
+    ``target``, ``estimator``, ``optimizer``, ``idx``, ``epoch``,
+    ``batch_idx``, and ``fit_args``. The keyword argument ``device`` in
+    ``fit_args`` is used to load data batches.
+
+    If ``joint_optimizer`` is ``True``, ``optimizers`` contains a single
+    optimizer with one parameter group for each base estimator. ``fit_func``
+    is then called with ``optimizer=None`` and only computes the gradients,
+    and all base estimators are updated by one step of the optimizer on
+    each data batch.
+    """
+
+    _backend_params = ("joint_optimizer",)
+    joint_optimizer = False
+
+    def __enter__(self):
+        n_workers = min(effective_n_jobs(self.n_jobs), len(self.estimators))
+        if n_workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=n_workers)
+        return self
+
+    def _fit_per_batch(self, data, target, epoch, batch_idx):
+        """Fit all base estimators on one data batch."""
+        if self.joint_optimizer:
+            optimizers = [None] * len(self.estimators)
+            self.optimizers[0].zero_grad()
+        else:
+            optimizers = self.optimizers
+
+        kwargs = [
+            dict(
+                data=data,
+                target=target,
+                estimator=estimator,
+                optimizer=optimizer,
+                idx=idx,
+                epoch=epoch,
+                batch_idx=batch_idx,
+                **self.fit_args
+            )
+            for idx, (estimator, optimizer) in enumerate(
+                zip(self.estimators, optimizers)
+            )
+        ]
+
+        if not hasattr(self, "_executor"):
+            for kwarg in kwargs:
+                self.fit_func(**kwarg)
+        else:
+            futures = [
+                self._executor.submit(self.fit_func, **kwarg)
+                for kwarg in kwargs
+            ]
+            for future in futures:
+                future.result()
+
+        if self.joint_optimizer:
+            self.optimizers[0].step()
+
+    def fit_per_epoch(self, epoch, cur_lr):
+        if cur_lr:
+            for optimizer in self.optimizers:
+                set_module.update_lr(optimizer, cur_lr)
+
+        for estimator in self.estimators:
+            estimator.train()
+
+        for batch_idx, elem in enumerate(self.train_loaders[0]):
+            data, target = io.split_data_target(elem, self.fit_args["device"])
+            self._fit_per_batch(data, target, epoch, batch_idx)
+
+    def close(self):
+        if hasattr(self, "_executor"):
+            self._executor.shutdown()
+            del self._executor
+
+
+_backends = {
+    "joblib": JoblibTrainer,
+    "shared_memory": SharedMemoryTrainer,
+    "threading": ThreadingTrainer,
+}
+
+
+def _check_backend_args(backend, backend_args):
+    """
+    Check that keyword arguments are accepted by the backend, given by its
+    name or class.
+    """
+    trainer_cls = _backends[backend] if isinstance(backend, str) else backend
+    for key in backend_args:
+        if key not in trainer_cls._backend_params:
+            msg = (
+                "Unrecognized argument of the parallel backend {}: {},"
+                " should be one of {{{}}}."
+            )
+            raise ValueError(
+                msg.format(
+                    trainer_cls.__name__,
+                    key,
+                    ", ".join(trainer_cls._backend_params),
+                )
+            )
+
+
+def available_backends():
+    """Return the names of all available parallel backends."""
+    return list(_backends.keys())
+
+
+def get_trainer(backend, *args, **kwargs):
+    """Instantiate the parallel backend with the given name."""
+    if backend not in _backends:
+        msg = "Unrecognized parallel backend: {}, should be one of {}."
+        raise NotImplementedError(
+            msg.format(backend, ",".join(available_backends()))
+        )
+
+    return _backends[backend](*args, **kwargs)
@@ -0,0 +1,187 @@
+"""
+  This module implements the int8 quantization of fitted ensembles, where
+  each base estimator is quantized independently. Quantized ensembles are
+  evaluated on CPU, and can be saved and loaded by :mod:`utils.io`.
+"""
+
+
+import copy
+import torch
+
+try:
+    from torch.ao import quantization
+except ImportError:
+    from torch import quantization
+
+from . import io
+from .cache import ValidationCache
+from .._base import BaseClassifier
+
+
+__all__ = ["quantize"]
+
+
+def _validate_method(method):
+    if method not in ("dynamic", "static"):
+        msg = (
+            "The quantization method should be one of {{dynamic, static}},"
+            " but got {} instead."
+        )
+        raise ValueError(msg.format(method))
+
+
+def _prepare_estimator(estimator, method):
+    """
+    Return a copy of ``estimator`` ready for conversion. For the static
+    quantization, observers are inserted to record the ranges of activations.
+    """
+    estimator = copy.deepcopy(estimator).cpu().eval()
+    if method == "dynamic":
+        return estimator
+
+    estimator = quantization.QuantWrapper(estimator)
+    estimator.qconfig = quantization.get_default_qconfig(
+        torch.backends.quantized.engine
+    )
+    quantization.prepare(estimator, inplace=True)
+
+    return estimator
+
+
+def _convert_estimator(estimator, method):
+    """Convert a prepared base estimator into the quantized version."""
+    if method == "dynamic":
+        return quantization.quantize_dynamic(estimator, dtype=torch.qint8)
+
+    return quantization.convert(estimator, inplace=True)
+
+
+def _make_quantized_estimator(estimator, method):
+    """
+    Return a quantized base estimator with the same structure as saved ones,
+    used to load parameters of quantized ensembles.
+    """
+    return _convert_estimator(_prepare_estimator(estimator, method), method)
+
+
+def quantize(
+    model,
+    method="dynamic",
+    calibration_loader=None,
+    test_loader=None,
+    tolerance=None,
+    save_model=False,
+    save_dir=None,
+):
+    """
+    Quantize all base estimators in a fitted ensemble to int8.
+
+    Parameters
+    ----------
+    model : torchensemble model
+        The fitted ensemble. It is left unchanged.
+    method : {"dynamic", "static"}, default="dynamic"
+        The quantization method.
+
+        - If ``dynamic``, weights of supported layers such as
+          :class:`torch.nn.Linear` and recurrent layers are quantized ahead of
+          time, and activations are quantized on the fly.
+        - If ``static``, each base estimator is wrapped by
+          :class:`torch.ao.quantization.QuantWrapper`, and both weights and
+          activations are quantized with ranges of activations recorded on
+          ``calibration_loader``. It requires base estimators that take a
+          single input and are quantizable in eager mode.
+    calibration_loader : torch.utils.data.DataLoader, default=None
+        A dataloader used to calibrate the ranges of activations, required
+        for the static quantization. Each batch is fed to all base estimators.
+    test_loader : torch.utils.data.DataLoader, default=None
+        A dataloader used to compare the quantized ensemble with ``model``
+        via :meth:`evaluate`. If ``None``, the comparison is skipped.
+    tolerance : float, default=None
+        The maximum degradation of the testing accuracy for classifiers, or
+        the maximum increase of the testing loss for regressors. A
+        :obj:`RuntimeError` is raised if the degradation exceeds
+        ``tolerance``. It has no effect when ``test_loader`` is ``None``.
+    save_model : bool, default=False
+        Specify whether to save the quantized ensemble.
+    save_dir : string, default=None
+        Specify where to save the quantized ensemble, see
+        :meth:`torchensemble.utils.io.save`. The quantized ensemble can be
+        loaded by :meth:`torchensemble.utils.io.load` into an ensemble
+        created with ``cuda=False``.
+
+    Returns
+    -------
+    quantized : torchensemble model
+        The quantized ensemble on CPU.
+    """
+    _validate_method(method)
+
+    if method == "static" and calibration_loader is None:
+        msg = "The static quantization requires a `calibration_loader`."
+        raise ValueError(msg)
+
+    if tolerance is not None and not tolerance >= 0:
+        msg = (
+            "The tolerance on the degradation should be non-negative, but"
+            " got {} instead."
+        )
+        raise ValueError(msg.format(tolerance))
+
+    # Loggers are shared, and base estimators are copied on preparation
+    memo = {
+        id(model.logger): model.logger,
+        id(model.tb_logger): model.tb_logger,
+        id(model.estimators_): torch.nn.ModuleList(),
+    }
+    quantized = copy.deepcopy(model, memo)
+    quantized.device = torch.device("cpu")
+
+    # States cached on the base estimators of ``model`` are not shared
+    quantized._validation_cache = ValidationCache(
+        model._validation_cache.max_size
+    )
+    if hasattr(quantized, "_stacked_estimators"):
+        quantized._stacked_estimators.clear()
+
+    estimators = [
+        _prepare_estimator(estimator, method)
+        for estimator in model.estimators_
+    ]
+
+    if method == "static":
+        with torch.no_grad():
+            for elem in calibration_loader:
+                data, _ = io.split_data_target(elem, quantized.device)
+                for estimator in estimators:
+                    estimator(*data)
+
+    quantized.estimators_ = torch.nn.ModuleList(
+        [_convert_estimator(estimator, method) for estimator in estimators]
+    )
+    quantized.quantization_ = method
+    quantized.cpu().eval()
+
+    if test_loader is not None:
+        # Classifiers return the accuracy, and regressors return the loss
+        metric = model.evaluate(test_loader)
+        quantized_metric = quantized.evaluate(test_loader)
+        if isinstance(model, BaseClassifier):
+            degradation = metric - quantized_metric
+        else:
+            degradation = quantized_metric - metric
+
+        msg = "Testing metric | FP32: {:.5f} | INT8 ({}): {:.5f}"
+        model.logger.info(msg.format(metric, method, quantized_metric))
+
+        if tolerance is not None and degradation > tolerance:
+            msg = (
+                "The degradation of the quantized ensemble = {:.5f} exceeds"
+                " the tolerance = {:.5f}."
+            )
+            raise RuntimeError(msg.format(degradation, tolerance))
+
+    if save_model:
+        io.save(quantized, save_dir, model.logger)
+
+    return quantized
@@ -1,12 +1,11 @@
+import torch
+import inspect
 import importlib
+import contextlib
 
 
-def set_optimizer(model, optimizer_name, **kwargs):
-    """
-    Set the parameter optimizer for the model.
-
-    Reference: https://pytorch.org/docs/stable/optim.html#algorithms
-    """
+def _get_optimizer_cls(optimizer_name):
+    """Return the class of the optimizer with the given name."""
 
     torch_optim_optimizers = [
         "Adadelta",
@@ -25,14 +24,59 @@ def set_optimizer(model, optimizer_name, **kwargs):
             msg.format(optimizer_name, ",".join(torch_optim_optimizers))
         )
 
-    optimizer_cls = getattr(
-        importlib.import_module("torch.optim"), optimizer_name
-    )
+    return getattr(importlib.import_module("torch.optim"), optimizer_name)
+
+
+def set_optimizer(model, optimizer_name, **kwargs):
+    """
+    Set the parameter optimizer for the model.
+
+    Reference: https://pytorch.org/docs/stable/optim.html#algorithms
+    """
+
+    optimizer_cls = _get_optimizer_cls(optimizer_name)
     optimizer = optimizer_cls(model.parameters(), **kwargs)
 
     return optimizer
 
 
+def set_joint_optimizer(models, optimizer_name, **kwargs):
+    """
+    Set a single parameter optimizer for a list of models, with one parameter
+    group for each model. The multi-tensor (foreach) implementation is used
+    when available, unless specified otherwise in ``kwargs``, so that all
+    models are updated in one step.
+
+    Reference: https://pytorch.org/docs/stable/optim.html#algorithms
+    """
+
+    optimizer_cls = _get_optimizer_cls(optimizer_name)
+    params = inspect.signature(optimizer_cls.__init__).parameters
+    if "foreach" in params and "fused" not in kwargs:
+        kwargs.setdefault("foreach", True)
+
+    param_groups = [{"params": list(model.parameters())} for model in models]
+    optimizer = optimizer_cls(param_groups, **kwargs)
+
+    return optimizer
+
+
+def check_joint_optimizer(joint_optimizer, lockstep, requirement, logger):
+    """
+    Check that a joint optimizer is only used when all base estimators are
+    fitted in lockstep on each data batch, which is enabled by the fitting
+    option given in ``requirement``.
+    """
+
+    if joint_optimizer and not lockstep:
+        msg = (
+            "The joint optimizer requires `{}`, and is not supported by the"
+            " parallel backends."
+        )
+        logger.error(msg.format(requirement))
+        raise ValueError(msg.format(requirement))
+
+
 def update_lr(optimizer, lr):
     """
     Manually update the learning rate of the optimizer. This function is used
@@ -85,3 +129,32 @@ def set_scheduler(optimizer, scheduler_name, **kwargs):
     scheduler = scheduler_cls(optimizer, **kwargs)
 
     return scheduler
+
+
+@contextlib.contextmanager
+def autocast(precision, device):
+    """
+    Run the enclosed data forwarding and loss computation in the given
+    numerical precision. Parameters of the model are kept in float32, and
+    only supported operations are executed in the lower precision.
+
+    Reference: https://pytorch.org/docs/stable/amp.html
+    """
+
+    if precision == "fp32":
+        yield
+        return
+
+    if precision != "bf16":
+        msg = "Unrecognized precision: {}, should be one of {{fp32, bf16}}."
+        raise NotImplementedError(msg.format(precision))
+
+    if not hasattr(torch, "autocast"):
+        msg = (
+            "The bf16 precision requires `torch.autocast`, which is not"
+            " available in PyTorch {}."
+        )
+        raise RuntimeError(msg.format(torch.__version__))
+
+    with torch.autocast(device_type=device.type, dtype=torch.bfloat16):
+        yield
@@ -0,0 +1,277 @@
+"""
+  This module implements the batched data forwarding over base estimators
+  with the same architecture, using the functional API in :mod:`torch.func`,
+  both for evaluating and for jointly fitting base estimators. Soft decision
+  trees in neural tree ensembles are fused into one forest
+  without :mod:`torch.func`.
+"""
+
+
+import copy
+import torch
+import weakref
+import itertools
+import torch.nn.functional as F
+
+
+__all__ = [
+    "StackedEstimators",
+    "TrainableStackedEstimators",
+    "StackedTrees",
+    "check_stackable",
+]
+
+
+def _import_torch_func():
+    try:
+        from torch import func
+    except ImportError:
+        msg = (
+            "Cannot load the module torch.func. Please make sure that"
+            " PyTorch >= 2.0 is installed to use the stacked forward."
+        )
+        raise ModuleNotFoundError(msg)
+
+    return func
+
+
+def check_stackable(estimators):
+    """
+    Check whether base estimators can be stacked, which requires that all
+    base estimators are of the same type and have parameters and buffers
+    with the same names and shapes.
+    """
+    if len(estimators) == 0:
+        msg = "Cannot stack an empty list of base estimators."
+        raise ValueError(msg)
+
+    def _signature(estimator):
+        tensors = itertools.chain(
+            estimator.named_parameters(), estimator.named_buffers()
+        )
+        return type(estimator), [(k, v.size()) for k, v in tensors]
+
+    reference = _signature(estimators[0])
+    for idx, estimator in enumerate(estimators):
+        if _signature(estimator) != reference:
+            msg = (
+                "The base estimator with index {} does not share the same"
+                " architecture with the first base estimator, and cannot be"
+                " stacked."
+            )
+            raise ValueError(msg.format(idx))
+
+
+class StackedEstimators(object):
+    """
+    Evaluate a list of base estimators with the same architecture in one
+    batched forward. Parameters and buffers of all base estimators are
+    stacked along a new leading dimension, and the forward of a single
+    stateless copy is vectorized over this dimension with :func:`vmap`.
+
+    The stacked tensors are cached and only rebuilt when the parameters or
+    buffers of base estimators are modified (e.g., after an optimizer step
+    or loading a state dict).
+    """
+
+    def __init__(self):
+        self._refs = None
+        self._params = None
+        self._buffers = None
+        self._base = None
+
+    def __getstate__(self):
+        # Weak references cannot be pickled, and stacked tensors are rebuilt
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    @staticmethod
+    def _get_tensors(estimators):
+        tensors = []
+        for estimator in estimators:
+            tensors.extend(estimator.parameters())
+            tensors.extend(estimator.buffers())
+
+        return tensors
+
+    def _is_stale(self, tensors):
+        """Check whether the stacked tensors are out of date."""
+        if self._refs is None or len(self._refs) != len(tensors):
+            return True
+
+        for (ref, version), tensor in zip(self._refs, tensors):
+            if ref() is not tensor or tensor._version != version:
+                return True
+
+        return False
+
+    def _refresh(self, estimators):
+        """Rebuild the stacked tensors if base estimators have changed."""
+        tensors = self._get_tensors(estimators)
+        if not self._is_stale(tensors):
+            return
+
+        func = _import_torch_func()
+        check_stackable(estimators)
+
+        self._params, self._buffers = func.stack_module_state(
+            list(estimators)
+        )
+        self._base = copy.deepcopy(estimators[0]).to("meta")
+        self._refs = [(weakref.ref(t), t._version) for t in tensors]
+
+    def clear(self):
+        """Release the stacked tensors."""
+        self.__init__()
+
+    def __call__(self, estimators, *x):
+        """
+        Return the outputs of all base estimators on ``x``, stacked into a
+        tensor of shape (n_estimators, batch_size, ...).
+        """
+        func = _import_torch_func()
+        self._refresh(estimators)
+        self._base.train(estimators[0].training)
+
+        def _forward(params, buffers, *x):
+            return func.functional_call(self._base, (params, buffers), x)
+
+        in_dims = (0, 0) + (None,) * len(x)
+        return func.vmap(_forward, in_dims=in_dims)(
+            self._params, self._buffers, *x
+        )
+
+
+class TrainableStackedEstimators(StackedEstimators):
+    """
+    Fit a list of base estimators with the same architecture in one batched
+    forward and backward. Different from :class:`StackedEstimators`,
+    parameters are stacked with :func:`torch.stack` on each call, so that
+    gradients are propagated back to the parameters of each base estimator,
+    and are identical to those obtained by evaluating base estimators one by
+    one. Buffers updated in the forward (e.g., running statistics in batch
+    normalization) are copied back to base estimators.
+    """
+
+    def _refresh(self, estimators):
+        """Rebuild the stateless copy if base estimators have changed."""
+        if self._refs is not None and len(self._refs) == len(estimators):
+            if all(ref() is e for ref, e in zip(self._refs, estimators)):
+                return
+
+        _import_torch_func()
+        check_stackable(estimators)
+
+        self._base = copy.deepcopy(estimators[0]).to("meta")
+        self._refs = [weakref.ref(estimator) for estimator in estimators]
+
+    def __call__(self, estimators, *x):
+        """
+        Return the outputs of all base estimators on ``x``, stacked into a
+        tensor of shape (n_estimators, batch_size, ...).
+        """
+        func = _import_torch_func()
+        self._refresh(estimators)
+        self._base.train(estimators[0].training)
+
+        named_params = [dict(e.named_parameters()) for e in estimators]
+        named_buffers = [dict(e.named_buffers()) for e in estimators]
+        params = {
+            name: torch.stack([p[name] for p in named_params])
+            for name in named_params[0]
+        }
+        with torch.no_grad():
+            buffers = {
+                name: torch.stack([b[name] for b in named_buffers])
+                for name in named_buffers[0]
+            }
+
+        def _forward(params, buffers, *x):
+            return func.functional_call(self._base, (params, buffers), x)
+
+        # Each base estimator draws its own random numbers, e.g., in dropout
+        in_dims = (0, 0) + (None,) * len(x)
+        outputs = func.vmap(_forward, in_dims=in_dims, randomness="different")(
+            params, buffers, *x
+        )
+
+        with torch.no_grad():
+            for name, buffer in buffers.items():
+                for idx, b in enumerate(named_buffers):
+                    b[name].copy_(buffer[idx])
+
+        return outputs
+
+
+class StackedTrees(StackedEstimators):
+    """
+    Evaluate a list of soft decision trees with the same depth in one fused
+    forest. Weights on internal nodes of all trees are concatenated so that
+    routing probabilities of all trees are computed with one matrix
+    multiplication, and outputs of all trees are computed from their path
+    probabilities with one batched matrix multiplication.
+
+    The fused weights are detached from base estimators, gradients are only
+    propagated to the input data.
+    """
+
+    def _refresh(self, estimators):
+        """Rebuild the fused weights if base estimators have changed."""
+        tensors = self._get_tensors(estimators)
+        if not self._is_stale(tensors):
+            return
+
+        check_stackable(estimators)
+
+        with torch.no_grad():
+            # Shape: (n_estimators * n_internal_nodes, input_dim + 1)
+            self._inner_weight = torch.cat(
+                [tree.inner_nodes[0].weight for tree in estimators]
+            )
+            # Shape: (n_estimators, n_leaf_nodes, output_dim)
+            self._leaf_weight = torch.stack(
+                [tree.leaf_nodes.weight.t() for tree in estimators]
+            )
+
+        self._depth = estimators[0].depth
+        self._refs = [(weakref.ref(t), t._version) for t in tensors]
+
+    def __call__(self, estimators, *x):
+        """
+        Return the outputs of all soft decision trees on ``x``, stacked into
+        a tensor of shape (n_estimators, batch_size, output_dim).
+        """
+        self._refresh(estimators)
+
+        X = x[0]
+        batch_size = X.size()[0]
+        n_estimators = len(estimators)
+
+        # Add a constant input `1` serving as the bias on internal nodes
+        X = X.view(batch_size, -1)
+        X = torch.cat((X.new_ones(batch_size, 1), X), 1)
+
+        # Routing probabilities of all trees, with shape
+        # (batch_size, n_estimators, n_internal_nodes)
+        path_prob = torch.sigmoid(F.linear(X, self._inner_weight))
+        path_prob = path_prob.view(batch_size, n_estimators, -1)
+        path_prob = torch.stack((path_prob, 1 - path_prob), dim=3)
+
+        _mu = X.new_ones(batch_size, n_estimators, 1, 1)
+
+        begin_idx = 0
+        end_idx = 1
+        for layer_idx in range(0, self._depth):
+            _path_prob = path_prob[:, :, begin_idx:end_idx, :]
+            _mu = _mu.view(batch_size, n_estimators, -1, 1).repeat(1, 1, 1, 2)
+            _mu = _mu * _path_prob
+
+            begin_idx = end_idx
+            end_idx = begin_idx + 2 ** (layer_idx + 1)
+
+        # Shape: (n_estimators, batch_size, n_leaf_nodes)
+        mu = _mu.view(batch_size, n_estimators, -1).transpose(0, 1)
+
+        return torch.bmm(mu, self._leaf_weight)
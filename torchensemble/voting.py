@@ -10,13 +10,13 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 import warnings
-from joblib import Parallel, delayed
 
 from ._base import BaseClassifier, BaseRegressor, BaseTreeEnsemble
 from ._base import torchensemble_model_doc
 from .utils import io
 from .utils import set_module
 from .utils import operator as op
+from .utils.parallel import get_trainer, LockstepTrainer
 
 
 __all__ = [
@@ -27,6 +27,81 @@ __all__ = [
 ]
 
 
+__fit_doc = """
+    Parameters
+    ----------
+    train_loader : torch.utils.data.DataLoader
+        A :mod:`torch.utils.data.DataLoader` container that contains the
+        training data.
+    epochs : int, default=100
+        The number of training epochs.
+    log_interval : int, default=100
+        The number of batches to wait before logging the training status.
+    test_loader : torch.utils.data.DataLoader, default=None
+        A :mod:`torch.utils.data.DataLoader` container that contains the
+        evaluating data.
+
+        - If ``None``, no validation is conducted during the training
+          stage.
+        - If not ``None``, the ensemble will be evaluated on this
+          dataloader after each training epoch.
+    save_model : bool, default=True
+        Specify whether to save the model parameters.
+
+        - If test_loader is ``None``, the ensemble fully trained will be
+          saved.
+        - If test_loader is not ``None``, the ensemble with the best
+          validation performance will be saved.
+    save_dir : string, default=None
+        Specify where to save the model parameters.
+
+        - If ``None``, the model will be saved in the current directory.
+        - If not ``None``, the model will be saved in the specified
+          directory: ``save_dir``.
+    lockstep : bool, default=False
+        Specify how base estimators iterate over the training data.
+
+        - If ``False``, each base estimator iterates over ``train_loader``
+          on its own, using the parallel backend set by
+          :meth:`set_parallel_backend`.
+        - If ``True``, each data batch is loaded only once and fed to all
+          base estimators before loading the next one, which reduces the
+          cost on loading data by a factor of ``n_estimators``. Base
+          estimators are fitted on each data batch concurrently by a pool of
+          ``n_jobs`` threads in the current process.
+    joint_optimizer : bool, default=False
+        Specify whether to update all base estimators with a single
+        multi-tensor optimizer, which has one parameter group for each base
+        estimator, instead of one optimizer per base estimator. It reduces
+        the overhead of the optimizer when fitting many small base
+        estimators, and requires ``lockstep=True``, where all base
+        estimators are updated on each data batch in the current process.
+        It is not supported by the parallel backends set by
+        :meth:`set_parallel_backend`, including ``threading`` and
+        ``shared_memory``, where each worker fits its own base estimators
+        over the whole training epoch.
+"""
+
+
+def _voting_model_doc(header, item="fit"):
+    """
+    Decorator on obtaining documentation for different voting models.
+    """
+
+    def get_doc(item):
+        """Return selected item"""
+        __doc = {"fit": __fit_doc}
+        return __doc[item]
+
+    def adddoc(cls):
+        doc = [header + "\n\n"]
+        doc.extend(get_doc(item))
+        cls.__doc__ = "".join(doc)
+        return cls
+
+    return adddoc
+
+
 def _parallel_fit_per_epoch(
     train_loader,
     estimator,
@@ -38,6 +113,7 @@ def _parallel_fit_per_epoch(
     log_interval,
     device,
     is_classification,
+    precision="fp32",
 ):
     """
     Private function used to fit base estimators in parallel.
@@ -55,8 +131,9 @@ def _parallel_fit_per_epoch(
         batch_size = data[0].size(0)
 
         optimizer.zero_grad()
-        output = estimator(*data)
-        loss = criterion(output, target)
+        with set_module.autocast(precision, device):
+            output = estimator(*data)
+            loss = criterion(output, target)
         loss.backward()
         optimizer.step()
 
@@ -88,6 +165,58 @@ def _parallel_fit_per_epoch(
     return estimator, optimizer
 
 
+def _parallel_fit_per_batch(
+    data,
+    target,
+    estimator,
+    optimizer,
+    criterion,
+    idx,
+    epoch,
+    batch_idx,
+    log_interval,
+    device,
+    is_classification,
+    precision="fp32",
+):
+    """
+    Private function used to fit a base estimator on a data batch shared by
+    all base estimators. If ``optimizer`` is ``None``, only the gradients
+    are computed, and the base estimator is updated by the caller.
+    """
+    batch_size = data[0].size(0)
+
+    if optimizer is not None:
+        optimizer.zero_grad()
+    with set_module.autocast(precision, device):
+        output = estimator(*data)
+        loss = criterion(output, target)
+    loss.backward()
+    if optimizer is not None:
+        optimizer.step()
+
+    # Print training status
+    if batch_idx % log_interval == 0:
+
+        # Classification
+        if is_classification:
+            _, predicted = torch.max(output.data, 1)
+            correct = (predicted == target).sum().item()
+
+            msg = (
+                "Estimator: {:03d} | Epoch: {:03d} | Batch: {:03d}"
+                " | Loss: {:.5f} | Correct: {:d}/{:d}"
+            )
+            print(msg.format(idx, epoch, batch_idx, loss, correct, batch_size))
+        # Regression
+        else:
+            msg = (
+                "Estimator: {:03d} | Epoch: {:03d} | Batch: {:03d}"
+                " | Loss: {:.5f}"
+            )
+            print(msg.format(idx, epoch, batch_idx, loss))
+
+
 @torchensemble_model_doc(
     """Implementation on the VotingClassifier.""", "model"
 )
@@ -98,6 +227,10 @@ class VotingClassifier(BaseClassifier):
     )
     def forward(self, *x):
         # Average over class distributions from all base estimators.
+        if self._use_stacked_forward():
+            outputs = F.softmax(self._stacked_forward(*x), dim=2)
+            return outputs.mean(dim=0)
+
         outputs = [
             F.softmax(estimator(*x), dim=1) for estimator in self.estimators_
         ]
@@ -127,6 +260,20 @@ class VotingClassifier(BaseClassifier):
         super().set_criterion(criterion)
 
     @torchensemble_model_doc(
+        """Set the parallel backend for VotingClassifier.""",
+        "set_parallel_backend",
+    )
+    def set_parallel_backend(self, backend, **kwargs):
+        super().set_parallel_backend(backend, **kwargs)
+
+    @torchensemble_model_doc(
+        """Set the forward mode for VotingClassifier.""",
+        "set_forward_mode",
+    )
+    def set_forward_mode(self, mode, training=False):
+        super().set_forward_mode(mode, training)
+
+    @_voting_model_doc(
         """Implementation on the training stage of VotingClassifier.""", "fit"
     )
     def fit(
@@ -137,9 +284,14 @@ class VotingClassifier(BaseClassifier):
         test_loader=None,
         save_model=True,
         save_dir=None,
+        lockstep=False,
+        joint_optimizer=False,
     ):
 
         self._validate_parameters(epochs, log_interval)
+        set_module.check_joint_optimizer(
+            joint_optimizer, lockstep, "lockstep=True", self.logger
+        )
         self.n_outputs = self._decide_n_outputs(train_loader)
 
         # Instantiate a pool of base estimators, optimizers, and schedulers.
@@ -147,13 +299,7 @@ class VotingClassifier(BaseClassifier):
         for _ in range(self.n_estimators):
             estimators.append(self._make_estimator())
 
-        optimizers = []
-        for i in range(self.n_estimators):
-            optimizers.append(
-                set_module.set_optimizer(
-                    estimators[i], self.optimizer_name, **self.optimizer_args
-                )
-            )
+        optimizers = self._make_optimizers(estimators, joint_optimizer)
 
         if self.use_scheduler_:
             scheduler_ = set_module.set_scheduler(
@@ -167,17 +313,38 @@ class VotingClassifier(BaseClassifier):
         # Utils
         best_acc = 0.0
 
-        # Internal helper function on pesudo forward
-        def _forward(estimators, *x):
-            outputs = [
-                F.softmax(estimator(*x), dim=1) for estimator in estimators
-            ]
-            proba = op.average(outputs)
-
-            return proba
-
-        # Maintain a pool of workers
-        with Parallel(n_jobs=self.n_jobs) as parallel:
+        # Each data batch is shared among all base estimators in lockstep
+        if lockstep:
+            trainer = LockstepTrainer(
+                _parallel_fit_per_batch,
+                estimators,
+                optimizers,
+                [train_loader],
+                n_jobs=self.n_jobs,
+                backend_args={"joint_optimizer": joint_optimizer},
+                criterion=self._criterion,
+                log_interval=log_interval,
+                device=self.device,
+                is_classification=True,
+                precision=self.precision_,
+            )
+        else:
+            # Maintain a pool of workers
+            trainer = get_trainer(
+                self.parallel_backend_,
+                _parallel_fit_per_epoch,
+                estimators,
+                optimizers,
+                [train_loader] * self.n_estimators,
+                n_jobs=self.n_jobs,
+                backend_args=self.parallel_backend_args_,
+                criterion=self._criterion,
+                log_interval=log_interval,
+                device=self.device,
+                is_classification=True,
+                precision=self.precision_,
+            )
+        with trainer, io.CheckpointWriter(self.logger) as writer:
 
             # Training loop
             for epoch in range(epochs):
@@ -192,51 +359,27 @@ class VotingClassifier(BaseClassifier):
                     msg = "Parallelization on the training epoch: {:03d}"
                     self.logger.info(msg.format(epoch))
 
-                rets = parallel(
-                    delayed(_parallel_fit_per_epoch)(
-                        train_loader,
-                        estimator,
-                        cur_lr,
-                        optimizer,
-                        self._criterion,
-                        idx,
-                        epoch,
-                        log_interval,
-                        self.device,
-                        True,
-                    )
-                    for idx, (estimator, optimizer) in enumerate(
-                        zip(estimators, optimizers)
-                    )
-                )
-
-                estimators, optimizers = [], []
-                for estimator, optimizer in rets:
-                    estimators.append(estimator)
-                    optimizers.append(optimizer)
+                trainer.fit_per_epoch(epoch, cur_lr)
+                self._clear_caches()
+                estimators = trainer.estimators
 
                 # Validation
                 if test_loader:
                     self.eval()
                     with torch.no_grad():
-                        correct = 0
-                        total = 0
-                        for _, elem in enumerate(test_loader):
-                            data, target = io.split_data_target(
-                                elem, self.device
-                            )
-                            output = _forward(estimators, *data)
-                            _, predicted = torch.max(output.data, 1)
-                            correct += (predicted == target).sum().item()
-                            total += target.size(0)
-                        acc = 100 * correct / total
+                        batches = self._collect_outputs(
+                            estimators, test_loader
+                        )
+                        acc = self._evaluate_outputs(batches)
 
                         if acc > best_acc:
                             best_acc = acc
                             self.estimators_ = nn.ModuleList()
                             self.estimators_.extend(estimators)
                             if save_model:
-                                io.save(self, save_dir, self.logger)
+                                writer.save(
+                                    self, save_dir, copy=trainer.in_place
+                                )
 
                         msg = (
                             "Epoch: {:03d} | Validation Acc: {:.3f}"
@@ -263,13 +406,29 @@ class VotingClassifier(BaseClassifier):
         if save_model and not test_loader:
             io.save(self, save_dir, self.logger)
 
+    def _aggregate_outputs(self, outputs):
+        """Average over class distributions from all base estimators."""
+        return F.softmax(outputs, dim=2).mean(0)
+
     @torchensemble_model_doc(item="classifier_evaluate")
     def evaluate(self, test_loader, return_loss=False):
-        return super().evaluate(test_loader, return_loss)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches, return_loss)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
+
+    @torchensemble_model_doc(
+        """Cascade prediction of VotingClassifier.""", "predict_cascade"
+    )
+    def predict_cascade(
+        self, *x, threshold, criterion="margin", min_estimators=2
+    ):
+        return self._predict_cascade(
+            x, threshold, criterion, min_estimators, average_proba=True
+        )
 
 
 @torchensemble_model_doc(
@@ -282,6 +441,9 @@ class NeuralForestClassifier(BaseTreeEnsemble, VotingClassifier):
     )
     def forward(self, *x):
         # Average over class distributions from all base estimators.
+        if self._use_stacked_forward():
+            return self._aggregate_outputs(self._stacked_forward(*x))
+
         outputs = [
             F.softmax(estimator(*x), dim=1) for estimator in self.estimators_
         ]
@@ -310,7 +472,7 @@ class NeuralForestClassifier(BaseTreeEnsemble, VotingClassifier):
     def set_criterion(self, criterion):
         super().set_criterion(criterion)
 
-    @torchensemble_model_doc(
+    @_voting_model_doc(
         """Implementation on the training stage of NeuralForestClassifier.""",
         "fit",
     )
@@ -322,6 +484,8 @@ class NeuralForestClassifier(BaseTreeEnsemble, VotingClassifier):
         test_loader=None,
         save_model=True,
         save_dir=None,
+        lockstep=False,
+        joint_optimizer=False,
     ):
         self.n_inputs = self._decidce_n_inputs(train_loader)
         super().fit(
@@ -331,6 +495,8 @@ class NeuralForestClassifier(BaseTreeEnsemble, VotingClassifier):
             test_loader=test_loader,
             save_model=save_model,
             save_dir=save_dir,
+            lockstep=lockstep,
+            joint_optimizer=joint_optimizer,
         )
 
 
@@ -342,6 +508,9 @@ class VotingRegressor(BaseRegressor):
     )
     def forward(self, *x):
         # Average over predictions from all base estimators.
+        if self._use_stacked_forward():
+            return self._stacked_forward(*x).mean(dim=0)
+
         outputs = [estimator(*x) for estimator in self.estimators_]
         pred = op.average(outputs)
 
@@ -369,6 +538,20 @@ class VotingRegressor(BaseRegressor):
         super().set_criterion(criterion)
 
     @torchensemble_model_doc(
+        """Set the parallel backend for VotingRegressor.""",
+        "set_parallel_backend",
+    )
+    def set_parallel_backend(self, backend, **kwargs):
+        super().set_parallel_backend(backend, **kwargs)
+
+    @torchensemble_model_doc(
+        """Set the forward mode for VotingRegressor.""",
+        "set_forward_mode",
+    )
+    def set_forward_mode(self, mode, training=False):
+        super().set_forward_mode(mode, training)
+
+    @_voting_model_doc(
         """Implementation on the training stage of VotingRegressor.""", "fit"
     )
     def fit(
@@ -379,9 +562,14 @@ class VotingRegressor(BaseRegressor):
         test_loader=None,
         save_model=True,
         save_dir=None,
+        lockstep=False,
+        joint_optimizer=False,
     ):
 
         self._validate_parameters(epochs, log_interval)
+        set_module.check_joint_optimizer(
+            joint_optimizer, lockstep, "lockstep=True", self.logger
+        )
         self.n_outputs = self._decide_n_outputs(train_loader)
 
         # Instantiate a pool of base estimators, optimizers, and schedulers.
@@ -389,13 +577,7 @@ class VotingRegressor(BaseRegressor):
         for _ in range(self.n_estimators):
             estimators.append(self._make_estimator())
 
-        optimizers = []
-        for i in range(self.n_estimators):
-            optimizers.append(
-                set_module.set_optimizer(
-                    estimators[i], self.optimizer_name, **self.optimizer_args
-                )
-            )
+        optimizers = self._make_optimizers(estimators, joint_optimizer)
 
         if self.use_scheduler_:
             scheduler_ = set_module.set_scheduler(
@@ -409,15 +591,38 @@ class VotingRegressor(BaseRegressor):
         # Utils
         best_loss = float("inf")
 
-        # Internal helper function on pesudo forward
-        def _forward(estimators, *x):
-            outputs = [estimator(*x) for estimator in estimators]
-            pred = op.average(outputs)
-
-            return pred
-
-        # Maintain a pool of workers
-        with Parallel(n_jobs=self.n_jobs) as parallel:
+        # Each data batch is shared among all base estimators in lockstep
+        if lockstep:
+            trainer = LockstepTrainer(
+                _parallel_fit_per_batch,
+                estimators,
+                optimizers,
+                [train_loader],
+                n_jobs=self.n_jobs,
+                backend_args={"joint_optimizer": joint_optimizer},
+                criterion=self._criterion,
+                log_interval=log_interval,
+                device=self.device,
+                is_classification=False,
+                precision=self.precision_,
+            )
+        else:
+            # Maintain a pool of workers
+            trainer = get_trainer(
+                self.parallel_backend_,
+                _parallel_fit_per_epoch,
+                estimators,
+                optimizers,
+                [train_loader] * self.n_estimators,
+                n_jobs=self.n_jobs,
+                backend_args=self.parallel_backend_args_,
+                criterion=self._criterion,
+                log_interval=log_interval,
+                device=self.device,
+                is_classification=False,
+                precision=self.precision_,
+            )
+        with trainer, io.CheckpointWriter(self.logger) as writer:
 
             # Training loop
             for epoch in range(epochs):
@@ -432,48 +637,27 @@ class VotingRegressor(BaseRegressor):
                     msg = "Parallelization on the training epoch: {:03d}"
                     self.logger.info(msg.format(epoch))
 
-                rets = parallel(
-                    delayed(_parallel_fit_per_epoch)(
-                        train_loader,
-                        estimator,
-                        cur_lr,
-                        optimizer,
-                        self._criterion,
-                        idx,
-                        epoch,
-                        log_interval,
-                        self.device,
-                        False,
-                    )
-                    for idx, (estimator, optimizer) in enumerate(
-                        zip(estimators, optimizers)
-                    )
-                )
-
-                estimators, optimizers = [], []
-                for estimator, optimizer in rets:
-                    estimators.append(estimator)
-                    optimizers.append(optimizer)
+                trainer.fit_per_epoch(epoch, cur_lr)
+                self._clear_caches()
+                estimators = trainer.estimators
 
                 # Validation
                 if test_loader:
                     self.eval()
                     with torch.no_grad():
-                        val_loss = 0.0
-                        for _, elem in enumerate(test_loader):
-                            data, target = io.split_data_target(
-                                elem, self.device
-                            )
-                            output = _forward(estimators, *data)
-                            val_loss += self._criterion(output, target)
-                        val_loss /= len(test_loader)
+                        batches = self._collect_outputs(
+                            estimators, test_loader
+                        )
+                        val_loss = self._evaluate_outputs(batches)
 
                         if val_loss < best_loss:
                             best_loss = val_loss
                             self.estimators_ = nn.ModuleList()
                             self.estimators_.extend(estimators)
                             if save_model:
-                                io.save(self, save_dir, self.logger)
+                                writer.save(
+                                    self, save_dir, copy=trainer.in_place
+                                )
 
                         msg = (
                             "Epoch: {:03d} | Validation Loss:"
@@ -499,13 +683,19 @@ class VotingRegressor(BaseRegressor):
         if save_model and not test_loader:
             io.save(self, save_dir, self.logger)
 
+    def _aggregate_outputs(self, outputs):
+        """Average over predictions from all base estimators."""
+        return outputs.mean(0)
+
     @torchensemble_model_doc(item="regressor_evaluate")
     def evaluate(self, test_loader):
-        return super().evaluate(test_loader)
+        self.eval()
+        batches = self._collect_outputs(self.estimators_, test_loader)
+        return self._evaluate_outputs(batches)
 
     @torchensemble_model_doc(item="predict")
-    def predict(self, *x):
-        return super().predict(*x)
+    def predict(self, *x, batch_size=None, out=None):
+        return super().predict(*x, batch_size=batch_size, out=out)
 
 
 @torchensemble_model_doc(
@@ -518,6 +708,9 @@ class NeuralForestRegressor(BaseTreeEnsemble, VotingRegressor):
     )
     def forward(self, *x):
         # Average over class distributions from all base estimators.
+        if self._use_stacked_forward():
+            return self._aggregate_outputs(self._stacked_forward(*x))
+
         outputs = [
             F.softmax(estimator(*x), dim=1) for estimator in self.estimators_
         ]
@@ -525,6 +718,10 @@ class NeuralForestRegressor(BaseTreeEnsemble, VotingRegressor):
 
         return proba
 
+    def _aggregate_outputs(self, outputs):
+        """Average over class distributions from all base estimators."""
+        return F.softmax(outputs, dim=2).mean(0)
+
     @torchensemble_model_doc(
         """Set the attributes on optimizer for NeuralForestRegressor.""",
         "set_optimizer",
@@ -546,7 +743,7 @@ class NeuralForestRegressor(BaseTreeEnsemble, VotingRegressor):
     def set_criterion(self, criterion):
         super().set_criterion(criterion)
 
-    @torchensemble_model_doc(
+    @_voting_model_doc(
         """Implementation on the training stage of NeuralForestRegressor.""",
         "fit",
     )
@@ -558,6 +755,8 @@ class NeuralForestRegressor(BaseTreeEnsemble, VotingRegressor):
         test_loader=None,
         save_model=True,
         save_dir=None,
+        lockstep=False,
+        joint_optimizer=False,
     ):
         self.n_inputs = self._decidce_n_inputs(train_loader)
         super().fit(
@@ -567,4 +766,6 @@ class NeuralForestRegressor(BaseTreeEnsemble, VotingRegressor):
             test_loader=test_loader,
             save_model=save_model,
             save_dir=save_dir,
+            lockstep=lockstep,
+            joint_optimizer=joint_optimizer,
         )